@@ -0,0 +1,4 @@
+"""
+🌐 API HTTP (ASGI) de génération et d'exécution SQL
+Pour les outils internes qui n'utilisent pas l'interface Streamlit
+"""
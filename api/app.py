@@ -0,0 +1,225 @@
+"""
+Application ASGI (Starlette) : /generate, /execute et /health
+Les services du registre (caches, client LLM, pool de connexions) sont
+construits une fois par processus et partagés entre toutes les requêtes
+"""
+import asyncio
+import contextlib
+import hmac
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+from infrastructure.columnar import ColumnarResult
+from infrastructure.query_guard import GuardResult, QueryRejectedError
+from infrastructure.registry import get_services, registry
+from infrastructure.metrics_export import CONTENT_TYPE as OPENMETRICS, metrics_registry
+from infrastructure.tracing import tracer
+from streamlit_app.services.sql_service import SQLService
+
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+
+class APIError(Exception):
+    """Erreur renvoyée au client avec son code HTTP"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class JSONSafeResponse(JSONResponse):
+    """Réponse JSON acceptant les types des pilotes (Decimal, dates)"""
+
+    def render(self, content: Any) -> bytes:
+        return json.dumps(content, ensure_ascii=False, default=str).encode("utf-8")
+
+
+async def _json_body(request: Request) -> Dict[str, Any]:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise APIError(400, "Corps JSON invalide")
+    if not isinstance(body, dict):
+        raise APIError(400, "Objet JSON attendu")
+    return body
+
+
+def _parse_questions(body: Dict[str, Any]) -> Tuple[List[Dict[str, Optional[str]]], bool]:
+    """Questions d'une requête unique ({"question"}) ou groupée ({"questions": [...]})"""
+    single = "questions" not in body
+    entries = [body] if single else body["questions"]
+    if not isinstance(entries, list) or not entries:
+        raise APIError(400, "Liste de questions vide")
+    if len(entries) > settings.api_max_batch_size:
+        raise APIError(413, f"Au plus {settings.api_max_batch_size} questions par requête")
+
+    items = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {"question": entry}
+        question = entry.get("question") if isinstance(entry, dict) else None
+        if not isinstance(question, str) or not question.strip():
+            raise APIError(400, "Chaque entrée doit contenir une question")
+        items.append({"question": question.strip(), "language": entry.get("language")})
+    return items, single
+
+
+async def generate(request: Request) -> Response:
+    """Génère le SQL d'une question ou d'un lot de questions"""
+    items, single = _parse_questions(await _json_body(request))
+    service: SQLService = request.app.state.sql_service
+    metrics = request.app.state.services["metrics"]
+
+    async def _one(item):
+        start = time.perf_counter()
+        # Génération bloquante hors de la boucle ; le LLM borne lui-même sa concurrence
+        response = await run_in_threadpool(
+            service.generate_sql_response, item["question"], item["language"]
+        )
+        metrics.record_request(time.perf_counter() - start, response.get("success", False))
+        return {"question": item["question"], **response}
+
+    results = await asyncio.gather(*(_one(item) for item in items))
+    if single:
+        return JSONSafeResponse(results[0])
+    return JSONSafeResponse({"results": results})
+
+
+def _require_api_key(request: Request):
+    """Jeton de l'en-tête Authorization (Bearer) ou X-API-Key, comparé à API_KEY"""
+    if not settings.api_key:
+        raise APIError(403, "/execute désactivé : définir API_KEY pour l'activer")
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer":
+        token = request.headers.get("x-api-key", "")
+    if not hmac.compare_digest(token.strip().encode(), settings.api_key.encode()):
+        raise APIError(401, "Jeton d'API manquant ou invalide")
+
+
+def _run_query(executor, cache, sql: str, max_rows: int) -> Tuple[ColumnarResult, GuardResult, bool]:
+    """Lit au plus max_rows lignes puis libère le curseur ; met en cache un résultat complet"""
+    with tracer.span("query_execution", max_rows=max_rows) as span:
+        cursor = executor.execute(sql)
+        try:
+            data = ColumnarResult()
+            # Une ligne de plus : distingue un résultat de max_rows lignes d'un résultat tronqué
+            for batch in cursor.fetch(max_rows + 1):
+                data.append_rows(batch, cursor.columns)
+            data.columns = data.columns or list(cursor.columns)
+            exhausted = cursor.exhausted
+        finally:
+            cursor.close()
+        span.set_attribute("rows", data.num_rows)
+        if exhausted and cache:
+            cache.cache_sql_result(sql, data)
+        return data, cursor.guard, data.num_rows > max_rows
+
+
+async def execute(request: Request) -> Response:
+    """Exécute un SELECT ; JSON par défaut, flux Arrow si demandé (Accept)"""
+    _require_api_key(request)
+    body = await _json_body(request)
+    sql = body.get("sql")
+    if not isinstance(sql, str) or not sql.strip():
+        raise APIError(400, "Requête SQL manquante")
+    try:
+        max_rows = int(body.get("max_rows") or settings.query_page_size)
+    except (TypeError, ValueError):
+        raise APIError(400, "max_rows doit être un entier")
+    max_rows = max(1, min(max_rows, settings.query_max_rows))
+
+    services = request.app.state.services
+    cache = services["cache"] if settings.result_cache_enabled else None
+    data = cache.get_cached_sql_result(sql) if cache else None
+    guard, truncated = None, False
+    if data is None:
+        try:
+            data, guard, truncated = await run_in_threadpool(
+                _run_query, services["query_executor"], cache, sql, max_rows
+            )
+        except QueryRejectedError as e:
+            raise APIError(422, str(e))
+        except ConnectionError as e:
+            # Préchauffage en cours ou base injoignable : le client peut réessayer
+            raise APIError(503, str(e))
+        except ValueError as e:
+            raise APIError(400, str(e))
+    table = data.table
+    if table.num_rows > max_rows:
+        table, truncated = table.slice(0, max_rows), True
+
+    if ARROW_STREAM in request.headers.get("accept", ""):
+        return Response(data.to_ipc_bytes(max_rows), media_type=ARROW_STREAM,
+                        headers={"X-Truncated": str(truncated).lower()})
+
+    return JSONSafeResponse({
+        "columns": table.column_names,
+        "rows": [list(row) for row in zip(*(column.to_pylist() for column in table.columns))],
+        "row_count": table.num_rows,
+        "truncated": truncated,
+        "from_cache": guard is None,
+        "limit_applied": guard.limit_applied if guard else None,
+        "warnings": guard.warnings if guard else [],
+    })
+
+
+async def health(request: Request) -> Response:
+    """État de santé (mémoire, CPU, erreurs, base) ; 503 si le service est hors d'usage"""
+    services = request.app.state.services
+    report = services["metrics"].health_check(database=services["database"])
+    return JSONSafeResponse(report, status_code=503 if report["status"] == "unhealthy" else 200)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Exposition OpenMetrics du worker (à scraper par worker ou via le serveur annexe)"""
+    body = await run_in_threadpool(metrics_registry.render)
+    return Response(body, media_type=OPENMETRICS)
+
+
+async def _api_error(request: Request, exc: APIError) -> Response:
+    return JSONSafeResponse({"success": False, "error": str(exc)}, status_code=exc.status_code)
+
+
+async def _unexpected_error(request: Request, exc: Exception) -> Response:
+    logger.error("API request failed", path=request.url.path, error=str(exc))
+    return JSONSafeResponse({"success": False, "error": str(exc)}, status_code=500)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette):
+    """Services construits au démarrage de chaque worker, arrêtés à sa fin"""
+    services = await run_in_threadpool(get_services)
+    app.state.services = services
+    # Pas de SQL simulé : un client API doit voir les erreurs du LLM
+    app.state.sql_service = SQLService(services, mock_fallback=False)
+    logger.info("API started")
+    yield
+    await run_in_threadpool(registry.shutdown)
+
+
+def create_app() -> Starlette:
+    """Application ASGI"""
+    return Starlette(
+        routes=[
+            Route("/generate", generate, methods=["POST"]),
+            Route("/execute", execute, methods=["POST"]),
+            Route("/health", health, methods=["GET"]),
+            Route("/metrics", metrics_endpoint, methods=["GET"]),
+        ],
+        exception_handlers={APIError: _api_error, Exception: _unexpected_error},
+        lifespan=lifespan,
+    )
+
+
+# Instance globale (uvicorn api.app:app)
+app = create_app()
@@ -0,0 +1,17 @@
+"""
+🌐 Point d'entrée de l'API HTTP (sans interface Streamlit)
+Chaque worker uvicorn est un processus avec ses propres services
+"""
+
+import uvicorn
+
+from infrastructure.settings import settings
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "api.app:app",
+        host=settings.api_host,
+        port=settings.api_port,
+        workers=settings.api_workers,
+        log_level=settings.log_level.lower(),
+    )
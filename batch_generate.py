@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Génération SQL en lot, sans interface : questions lues en JSONL ou CSV
+Pool de workers borné, débit LLM limité, résultats écrits en JSONL au fil
+de l'eau ; le fichier de sortie sert de point de reprise (--resume)
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, Set, Tuple
+
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+from infrastructure.rate_limiter import RateLimiter, is_rate_limit_error
+from infrastructure.registry import get_services, registry
+from streamlit_app.services.sql_service import SQLService
+
+# Attente maximale après un quota dépassé (secondes)
+MAX_BACKOFF = 60.0
+
+
+def read_questions(path: str) -> Iterator[Dict[str, Any]]:
+    """Questions d'un fichier JSONL ({"question", "id"?, "language"?}) ou CSV (colonne question)"""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for number, row in enumerate(rows, 1):
+            if isinstance(row, str):
+                row = {"question": row}
+            question = (row.get("question") or "").strip()
+            if not question:
+                logger.warning("Batch row without question", row=number)
+                continue
+            yield {
+                "id": str(row.get("id") or number),
+                "question": question,
+                "language": row.get("language") or None,
+            }
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    """Identifiants déjà traités avec succès dans un fichier de sortie existant"""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Dernière ligne tronquée par une interruption
+            if record.get("success"):
+                done.add(str(record.get("id")))
+    return done
+
+
+class BatchGenerator:
+    """Génère le SQL d'une question, en respectant le débit autorisé"""
+
+    def __init__(self, service: SQLService, limiter: RateLimiter, max_retries: int):
+        self.service = service
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    def process(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            response = self.service.generate_sql_response(item["question"], item["language"])
+            error = response.get("error")
+            if response.get("success") or not is_rate_limit_error(error) or attempt == self.max_retries:
+                break
+            # Quota dépassé : tous les workers attendent avant de réessayer
+            delay = min(MAX_BACKOFF, 2.0 ** attempt)
+            logger.warning("Rate limited, backing off", id=item["id"], delay=delay, attempt=attempt + 1)
+            self.limiter.pause(delay)
+
+        return {
+            "id": item["id"],
+            "question": item["question"],
+            "success": bool(response.get("success")),
+            "sql": response.get("sql"),
+            "error": error,
+            "validation_error": response.get("validation_error"),
+            "cached": bool(response.get("cached")),
+            "attempts": attempt + 1,
+            "duration": round(time.perf_counter() - start, 3),
+        }
+
+
+def run(args) -> Tuple[Dict[str, int], float]:
+    """Traite le fichier d'entrée ; retourne les compteurs du lot et sa durée"""
+    done = load_checkpoint(args.output) if args.resume else set()
+    services = get_services()
+    if args.no_cache:
+        services = dict(services, cache=None, semantic_cache=None)
+    generator = BatchGenerator(
+        SQLService(services, mock_fallback=False),
+        RateLimiter(args.rate, burst=args.workers),
+        args.max_retries,
+    )
+
+    counts = {"succeeded": 0, "failed": 0, "skipped": 0}
+    start = time.perf_counter()
+    mode = "a" if args.resume else "w"
+    with open(args.output, mode, encoding="utf-8") as output, \
+            ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="batch") as pool:
+        pending: Set[Future] = set()
+
+        def drain(return_when):
+            nonlocal pending
+            completed, pending = wait(pending, return_when=return_when)
+            for future in completed:
+                record = future.result()
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                counts["succeeded" if record["success"] else "failed"] += 1
+
+        try:
+            for item in read_questions(args.input):
+                if item["id"] in done:
+                    counts["skipped"] += 1
+                    continue
+                # Lecture paresseuse de l'entrée : au plus deux questions en attente par worker
+                if len(pending) >= args.workers * 2:
+                    drain(FIRST_COMPLETED)
+                pending.add(pool.submit(generator.process, item))
+            drain(ALL_COMPLETED)
+        except KeyboardInterrupt:
+            # Les résultats déjà écrits servent de point de reprise
+            for future in pending:
+                future.cancel()
+            print("⏹️  Interrompu : relancer avec --resume pour continuer", file=sys.stderr)
+    return counts, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="Questions (.jsonl ou .csv)")
+    parser.add_argument("output", help="Résultats (.jsonl)")
+    parser.add_argument("--workers", type=int, default=settings.batch_workers)
+    parser.add_argument("--rate", type=float, default=settings.batch_rate_per_minute,
+                        help="Appels LLM par minute (0 = illimité)")
+    parser.add_argument("--max-retries", type=int, default=settings.batch_max_retries)
+    parser.add_argument("--resume", action="store_true",
+                        help="Ignore les questions déjà réussies dans le fichier de sortie")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Régénère sans consulter les caches de réponses")
+    args = parser.parse_args()
+
+    try:
+        counts, elapsed = run(args)
+    finally:
+        registry.shutdown()
+
+    processed = counts["succeeded"] + counts["failed"]
+    throughput = processed / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"✅ {counts['succeeded']} réussies  ❌ {counts['failed']} en échec  "
+          f"⏭️  {counts['skipped']} déjà traitées")
+    print(f"⏱️  {elapsed:.1f} s  →  {throughput:.1f} questions/minute")
+    sys.exit(1 if counts["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark : chemin ligne→dict→DataFrame vs chemin colonnaire Arrow
+Mesure le temps de construction, la mémoire et la préparation de l'affichage
+Streamlit (sérialisation Arrow) sur un résultat simulé de 100k lignes
+"""
+
+import argparse
+import datetime
+import gc
+import time
+import tracemalloc
+from decimal import Decimal
+
+import pandas as pd
+import pyarrow as pa
+from streamlit import dataframe_util
+
+from infrastructure.columnar import ColumnarResult
+
+COLUMNS = ["id", "user_id", "amount", "order_date", "status", "payment_method",
+           "quantity", "price", "created_at", "email", "category", "discount"]
+
+
+def generate_batches(rows: int, batch_size: int):
+    """Lots de tuples tels que renvoyés par fetchmany()"""
+    base_date = datetime.date(2024, 1, 1)
+    base_time = datetime.datetime(2024, 1, 1, 12, 0, 0)
+    for start in range(0, rows, batch_size):
+        yield [
+            (i, i % 5000, Decimal(i % 997) / 7, base_date + datetime.timedelta(days=i % 365),
+             "completed" if i % 3 else "pending", "card" if i % 2 else "paypal",
+             i % 17, float(i % 251) + 0.99, base_time + datetime.timedelta(seconds=i),
+             f"user{i % 5000}@example.com", f"cat{i % 40}", None if i % 4 else 0.1)
+            for i in range(start, min(rows, start + batch_size))
+        ]
+
+
+def run_row_dict_path(batches):
+    """Chemin historique : un dict par ligne puis DataFrame"""
+    records = []
+    for batch in batches:
+        records.extend(dict(zip(COLUMNS, row)) for row in batch)
+    df = pd.DataFrame(records)
+    render_bytes = dataframe_util.convert_anything_to_arrow_bytes(df)
+    return df, render_bytes
+
+
+def run_columnar_path(batches):
+    """Chemin colonnaire : lots Arrow, table transmise telle quelle"""
+    result = ColumnarResult(COLUMNS)
+    for batch in batches:
+        result.append_rows(batch)
+    render_bytes = dataframe_util.convert_anything_to_arrow_bytes(result.table)
+    return result, render_bytes
+
+
+def measure(name: str, fn, batches):
+    gc.collect()
+    arrow_before = pa.total_allocated_bytes()
+    tracemalloc.start()
+    start = time.perf_counter()
+    output, render_bytes = fn(batches)
+    elapsed = time.perf_counter() - start
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    arrow_bytes = pa.total_allocated_bytes() - arrow_before
+    print(f"{name:<12} {elapsed * 1000:>9.0f} ms  "
+          f"pic Python {python_peak / 2**20:>7.1f} Mo  "
+          f"Arrow {arrow_bytes / 2**20:>6.1f} Mo  "
+          f"affichage {len(render_bytes) / 2**20:>6.1f} Mo")
+    del output, render_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    batches = list(generate_batches(args.rows, args.batch_size))
+    print(f"🧪 {args.rows} lignes × {len(COLUMNS)} colonnes, lots de {args.batch_size}")
+    measure("row-dict", run_row_dict_path, batches)
+    measure("columnar", run_columnar_path, batches)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Boucle asyncio partagée du processus
+Permet au code synchrone (scripts Streamlit, threads) d'exécuter des coroutines
+sur une boucle unique, avec des clients réseau réutilisés entre les appels
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+from infrastructure.logging import logger
+
+
+class AsyncRuntime:
+    """Boucle d'événements dédiée, exécutée dans un thread démon"""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Retourne la boucle partagée (démarrée au premier accès)"""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._thread = threading.Thread(
+                        target=loop.run_forever, name="async-runtime", daemon=True
+                    )
+                    self._thread.start()
+                    self._loop = loop
+                    logger.info("Shared event loop started")
+        return self._loop
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Planifie une coroutine sur la boucle partagée"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Exécute une coroutine et attend son résultat (appel bloquant)"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout=timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def close(self):
+        """Arrête la boucle partagée"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            if self._thread:
+                self._thread.join(timeout=5)
+            self._loop = None
+
+
+# Instance globale
+async_runtime = AsyncRuntime()
@@ -1,59 +1,340 @@
 """
 Cache manager pour optimiser les performances (Version mémoire gratuite)
+Cache borné (nombre d'entrées et octets) avec politique d'éviction
+configurable et expiration en arrière-plan via un tas de TTL
 """
 import json
+import heapq
 import hashlib
+import sys
+import threading
 import time
-from typing import Optional, Any, Dict
+from typing import Optional, Any, Dict, Iterable, List, Set, Tuple
 from infrastructure.settings import settings
 from infrastructure.logging import logger
+from infrastructure.monitoring import metrics
+from infrastructure.metrics_export import MetricFamily, counter, gauge, metrics_registry
+from infrastructure.eviction import create_policy
+from infrastructure.persistent_cache import PersistentCache
+from infrastructure.normalization import NORMALIZATION_VERSION, normalize_question
+from infrastructure.sql_analysis import canonicalize_sql, extract_tables
 
 class CacheManager:
-    def __init__(self):
+    def __init__(self, max_entries: int = None, max_bytes: int = None,
+                 policy: str = None, metrics=None, persistent=None):
         # Cache mémoire gratuit au lieu de Redis
         self.memory_cache: Dict[str, Dict] = {}
-        logger.info("In-memory cache initialized (FREE)")
-    
+        self.max_entries = max_entries or settings.cache_max_entries
+        self.max_bytes = max_bytes or settings.cache_max_bytes
+        self.policy_name = policy or settings.cache_eviction_policy
+        self.policy = create_policy(self.policy_name, self.max_entries)
+        self.metrics = metrics
+        # Second niveau optionnel (disque, partagé entre processus)
+        self.persistent = persistent
+
+        # Comptabilité de taille et compteurs
+        self.current_bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        # Étiquettes (tables lues) pour l'invalidation ciblée
+        self._tag_index: Dict[str, Set[str]] = {}
+        self._key_tags: Dict[str, Tuple[str, ...]] = {}
+
+        # Tas (expires_at, key) pour l'expiration en arrière-plan
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._expiry_thread: Optional[threading.Thread] = None
+        self._start_expiry_thread()
+
+        logger.info("In-memory cache initialized (FREE)",
+                   max_entries=self.max_entries,
+                   max_bytes=self.max_bytes,
+                   policy=self.policy_name)
+
     def _is_expired(self, cache_item: Dict) -> bool:
         """Vérifie si l'item de cache a expiré"""
         return time.time() > cache_item.get("expires_at", 0)
-    
+
     def _generate_key(self, prefix: str, data: str) -> str:
         """Génère une clé de cache basée sur le hash du contenu"""
         hash_object = hashlib.md5(data.encode())
         return f"{prefix}:{hash_object.hexdigest()}"
-    
+
+    def question_key(self, question: str, language: str = None,
+                     schema_version: str = "", model_name: str = "") -> str:
+        """
+        Clé canonique d'une question : forme normalisée + version du schéma
+        + modèle, pour qu'un changement de schéma ou de modèle invalide le cache
+        """
+        canonical = normalize_question(question, language)
+        return self._generate_key(
+            "question", f"{NORMALIZATION_VERSION}|{schema_version}|{model_name}|{canonical}"
+        )
+
+    def sql_key(self, query: str) -> str:
+        """Clé d'un résultat de requête : forme canonique du SQL"""
+        return self._generate_key("sql", canonicalize_sql(query))
+
+    @staticmethod
+    def _estimate_size(key: str, value: Any) -> int:
+        """Estime la taille en octets d'une entrée"""
+        try:
+            payload = len(json.dumps(value, default=str, ensure_ascii=False).encode())
+        except (TypeError, ValueError):
+            payload = sys.getsizeof(value)
+        return payload + len(key)
+
     def get(self, key: str) -> Optional[Any]:
-        """Récupère une valeur du cache mémoire"""
-        if key in self.memory_cache:
-            cache_item = self.memory_cache[key]
-            if not self._is_expired(cache_item):
-                return cache_item["value"]
-            else:
-                # Supprime l'item expiré
-                del self.memory_cache[key]
+        """Récupère une valeur du cache mémoire, puis du cache persistant"""
+        value = self._get_memory(key)
+        if value is not None:
+            return value
+
+        if self.persistent:
+            entry = self.persistent.get_entry(key)
+            if entry is not None:
+                value, expires_at = entry
+                # Promotion en mémoire avec le TTL restant
+                self._store(key, value, expires_at)
+                return value
+        return None
+
+    def _get_memory(self, key: str) -> Optional[Any]:
+        """Récupère une valeur du cache mémoire uniquement"""
+        with self._lock:
+            if key in self.memory_cache:
+                cache_item = self.memory_cache[key]
+                if not self._is_expired(cache_item):
+                    self.policy.on_access(key)
+                    return cache_item["value"]
+                else:
+                    # Supprime l'item expiré
+                    self._remove(key)
+                    self.expirations += 1
+            self.policy.on_miss(key)
         return None
 
     def set(self, key: str, value: Any, ttl: int = None) -> bool:
-        """Stocke une valeur dans le cache mémoire"""
+        """Stocke une valeur dans le cache mémoire (et le cache persistant)"""
         ttl = ttl or settings.cache_ttl
-        expires_at = time.time() + ttl
-        
-        self.memory_cache[key] = {
-            "value": value,
-            "expires_at": expires_at
-        }
+        stored = self._store(key, value, time.time() + ttl)
+        if stored and self.persistent:
+            self.persistent.set(key, value, ttl)
+        return stored
+
+    def _store(self, key: str, value: Any, expires_at: float,
+               size: int = None, tags: Iterable[str] = ()) -> bool:
+        """Insère une entrée en mémoire et applique les limites"""
+        if size is None:
+            size = self._estimate_size(key, value)
+
+        # Une entrée plus grosse que le budget total n'est jamais mise en cache
+        if size > self.max_bytes:
+            logger.warning("Cache entry too large, skipped", key=key, size=size)
+            return False
+
+        with self._lock:
+            if key in self.memory_cache:
+                self.current_bytes -= self.memory_cache[key]["size"]
+                self.policy.on_access(key)
+            else:
+                self.policy.on_insert(key)
+
+            self.memory_cache[key] = {
+                "value": value,
+                "expires_at": expires_at,
+                "size": size
+            }
+            self.current_bytes += size
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+            self._tag(key, tuple(tags))
+
+            self._enforce_limits()
+        self._publish_stats()
+        return True
+
+    def delete(self, key: str) -> bool:
+        """Supprime une entrée du cache (tous niveaux)"""
+        if self.persistent:
+            self.persistent.delete(key)
+        with self._lock:
+            if key not in self.memory_cache:
+                return False
+            self._remove(key)
+        self._publish_stats()
         return True
-    
-    def cache_sql_result(self, query: str, result: Any) -> bool:
-        """Cache le résultat d'une requête SQL"""
-        key = self._generate_key("sql", query)
-        return self.set(key, result)
-    
+
+    def _remove(self, key: str):
+        """Retire une entrée (appelant détenant le verrou)"""
+        cache_item = self.memory_cache.pop(key)
+        self.current_bytes -= cache_item["size"]
+        self.policy.on_remove(key)
+        self._tag(key, ())
+
+    def _tag(self, key: str, tags: Tuple[str, ...]):
+        """Remplace les étiquettes d'une entrée (verrou détenu)"""
+        for tag in self._key_tags.pop(key, ()):
+            keys = self._tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_index[tag]
+        if tags:
+            self._key_tags[key] = tags
+            for tag in tags:
+                self._tag_index.setdefault(tag, set()).add(key)
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """Supprime les résultats en cache qui lisent l'une des tables"""
+        tables = [table.lower() for table in tables]
+        with self._lock:
+            keys = set()
+            for table in tables:
+                keys |= self._tag_index.get(table, set())
+            for key in keys:
+                if key in self.memory_cache:
+                    self._remove(key)
+        if keys:
+            logger.info("Cached results invalidated", tables=tables, entries=len(keys))
+            self._publish_stats()
+        return len(keys)
+
+    def _enforce_limits(self):
+        """Évince des entrées tant que les limites sont dépassées (verrou détenu)"""
+        evicted = 0
+        while self.memory_cache and (
+            len(self.memory_cache) > self.max_entries or self.current_bytes > self.max_bytes
+        ):
+            victim = self.policy.victim()
+            if victim is None or victim not in self.memory_cache:
+                break
+            self._remove(victim)
+            evicted += 1
+
+        if evicted:
+            self.evictions += evicted
+            if self.metrics:
+                self.metrics.record_cache_eviction(evicted)
+
+    def purge_expired(self) -> int:
+        """Supprime les entrées expirées en dépilant le tas de TTL"""
+        now = time.time()
+        purged = 0
+        with self._lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now:
+                expires_at, key = heapq.heappop(self._expiry_heap)
+                cache_item = self.memory_cache.get(key)
+                # Ignore les entrées obsolètes du tas (clé réécrite ou évincée)
+                if cache_item is not None and cache_item["expires_at"] == expires_at:
+                    self._remove(key)
+                    purged += 1
+
+            # Le tas garde des références obsolètes : on le compacte s'il grossit trop
+            if len(self._expiry_heap) > 2 * len(self.memory_cache) + 1024:
+                self._expiry_heap = [
+                    (item["expires_at"], key) for key, item in self.memory_cache.items()
+                ]
+                heapq.heapify(self._expiry_heap)
+
+            self.expirations += purged
+
+        if purged:
+            self._publish_stats()
+        return purged
+
+    def _start_expiry_thread(self):
+        """Démarre le thread d'expiration en arrière-plan"""
+        interval = settings.cache_expiry_interval
+        if interval <= 0:
+            return
+
+        def _run():
+            while not self._stop_event.wait(interval):
+                try:
+                    self.purge_expired()
+                except Exception as e:
+                    logger.error("Cache expiry sweep failed", error=str(e))
+
+        self._expiry_thread = threading.Thread(
+            target=_run, name="cache-expiry", daemon=True
+        )
+        self._expiry_thread.start()
+
+    def _publish_stats(self):
+        """Publie la taille courante du cache vers le collecteur de métriques"""
+        if self.metrics:
+            self.metrics.set_cache_size(len(self.memory_cache), self.current_bytes)
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistiques du cache"""
+        with self._lock:
+            stats = {
+                "policy": self.policy_name,
+                "entries": len(self.memory_cache),
+                "bytes": self.current_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "tagged_tables": len(self._tag_index)
+            }
+        if self.persistent:
+            stats["persistent"] = self.persistent.stats()
+        return stats
+
+    def openmetrics_families(self) -> List[MetricFamily]:
+        """Limites et expirations du cache (tailles et hits : collecteur principal)"""
+        return [
+            counter("cache_expirations", "Answer cache entries expired by TTL", self.expirations),
+            gauge("cache_max_bytes", "Answer cache byte budget", self.max_bytes),
+            gauge("cache_max_entries", "Answer cache entry budget", self.max_entries),
+            gauge("result_cache_tagged_tables", "Tables referenced by cached query results", len(self._tag_index)),
+        ]
+
+    def close(self):
+        """Arrête le thread d'expiration et vide le cache persistant"""
+        self._stop_event.set()
+        if self.persistent:
+            self.persistent.close()
+
+    def cache_sql_result(self, query: str, result: Any, size: int = None) -> bool:
+        """
+        Cache le résultat d'une requête SQL, étiqueté par les tables lues
+        (mémoire uniquement : les résultats Arrow ne passent pas par le disque)
+        """
+        key = self.sql_key(query)
+        if size is None:
+            size = getattr(result, "nbytes", None)
+        if size is None:
+            size = self._estimate_size(key, result)
+        if size > settings.result_cache_max_entry_bytes:
+            logger.info("Query result too large for cache, skipped", size=size)
+            return False
+        expires_at = time.time() + settings.result_cache_ttl
+        return self._store(key, result, expires_at, size=size, tags=extract_tables(query))
+
     def get_cached_sql_result(self, query: str) -> Optional[Any]:
         """Récupère le résultat d'une requête SQL du cache"""
-        key = self._generate_key("sql", query)
-        return self.get(key)
+        result = self._get_memory(self.sql_key(query))
+        if self.metrics:
+            if result is not None:
+                self.metrics.record_result_cache_hit()
+            else:
+                self.metrics.record_result_cache_miss()
+        return result
+
+def _create_persistent_cache() -> Optional[PersistentCache]:
+    """Crée le cache disque s'il est activé (désactivé en cas d'erreur)"""
+    if not settings.cache_persistent_enabled:
+        return None
+    try:
+        return PersistentCache()
+    except Exception as e:
+        logger.error("Persistent cache unavailable", error=str(e))
+        return None
 
 # Instance globale
-cache_manager = CacheManager()
+cache_manager = CacheManager(metrics=metrics, persistent=_create_persistent_cache())
+metrics_registry.register("cache", cache_manager.openmetrics_families)
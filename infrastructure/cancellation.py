@@ -0,0 +1,150 @@
+"""
+Annulation coopérative des opérations longues (appels LLM, requêtes SQL)
+Chaque opération reçoit une poignée ; l'annuler interrompt le travail en
+cours côté serveur (futures LLM, annulation psycopg2 de la requête)
+"""
+import contextvars
+import threading
+import time
+import uuid
+from concurrent.futures import (
+    CancelledError, Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+)
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from infrastructure.logging import logger
+
+# Intervalle d'attente entre deux vérifications (et rappels on_poll)
+POLL_INTERVAL = 0.2
+
+
+class OperationCancelledError(Exception):
+    """Opération interrompue par une annulation"""
+
+
+class CancellationHandle:
+    """Poignée d'annulation d'une opération en cours"""
+
+    def __init__(self, kind: str = "operation"):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.started_at = time.time()
+        self._cancelled = threading.Event()
+        self._callbacks: List[Callable[[], Any]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def add_callback(self, callback: Callable[[], Any]):
+        """Enregistre une action d'annulation (exécutée tout de suite si déjà annulé)"""
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return
+        self._run(callback)
+
+    def cancel(self) -> bool:
+        """Annule l'opération ; retourne False si elle l'était déjà"""
+        with self._lock:
+            if self.cancelled:
+                return False
+            self._cancelled.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._run(callback)
+        logger.info("Operation cancelled", operation=self.kind, operation_id=self.id)
+        return True
+
+    def _run(self, callback: Callable[[], Any]):
+        try:
+            callback()
+        except Exception as e:
+            logger.warning("Cancellation callback failed", operation=self.kind, error=str(e))
+
+    def raise_if_cancelled(self):
+        """Lève OperationCancelledError si l'opération a été annulée"""
+        if self.cancelled:
+            raise OperationCancelledError(f"Opération {self.kind} annulée")
+
+
+def wait_for(future: Future, handle: Optional[CancellationHandle] = None,
+             timeout: Optional[float] = None,
+             on_poll: Optional[Callable[[], Any]] = None) -> Any:
+    """
+    Attend le résultat d'un future par petites tranches, en vérifiant
+    l'annulation et en appelant on_poll entre deux tranches
+
+    Raises:
+        OperationCancelledError: La poignée a été annulée pendant l'attente
+        TimeoutError: Délai dépassé
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    if handle is not None:
+        handle.add_callback(future.cancel)
+    while True:
+        if handle is not None:
+            handle.raise_if_cancelled()
+        wait = POLL_INTERVAL
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                future.cancel()
+                raise TimeoutError(f"Opération interrompue après {timeout}s")
+            wait = min(wait, remaining)
+        try:
+            return future.result(timeout=wait)
+        except FutureTimeoutError:
+            if on_poll:
+                on_poll()
+        except CancelledError:
+            raise OperationCancelledError("Opération annulée")
+
+
+# Threads d'exécution des appels bloquants (pilotes de base de données)
+_worker_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="cancellable")
+
+
+def run_cancellable(fn: Callable[[], Any], handle: Optional[CancellationHandle] = None,
+                    on_poll: Optional[Callable[[], Any]] = None) -> Any:
+    """Exécute un appel bloquant dans un thread de travail, l'appelant restant interruptible"""
+    # Le contexte (span courant) suit l'appel dans le thread de travail
+    return wait_for(_worker_pool.submit(contextvars.copy_context().run, fn), handle, on_poll=on_poll)
+
+
+class SessionOperations:
+    """Opérations en cours d'une session utilisateur"""
+
+    def __init__(self):
+        self._handles: Dict[str, CancellationHandle] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self, kind: str) -> Iterator[CancellationHandle]:
+        """
+        Suit une opération le temps du bloc ; une sortie par exception
+        (y compris l'interruption du script Streamlit) l'annule
+        """
+        handle = CancellationHandle(kind)
+        with self._lock:
+            self._handles[handle.id] = handle
+        try:
+            yield handle
+        except BaseException:
+            handle.cancel()
+            raise
+        finally:
+            with self._lock:
+                self._handles.pop(handle.id, None)
+
+    def active(self) -> List[CancellationHandle]:
+        """Opérations encore en cours"""
+        with self._lock:
+            return list(self._handles.values())
+
+    def cancel_all(self) -> int:
+        """Annule toutes les opérations en cours de la session"""
+        with self._lock:
+            handles = list(self._handles.values())
+        return sum(1 for handle in handles if handle.cancel())
@@ -0,0 +1,72 @@
+"""
+Résultats de requêtes au format colonnaire (Arrow)
+Les lots du curseur sont convertis directement en RecordBatch, sans
+dictionnaire par ligne ; la table Arrow est transmise telle quelle à
+Streamlit et aux téléchargements CSV/Parquet
+"""
+from typing import List, Optional, Sequence
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+
+class ColumnarResult:
+    """Résultat accumulé sous forme de lots Arrow"""
+
+    def __init__(self, columns: Optional[Sequence[str]] = None):
+        self.columns: List[str] = list(columns or [])
+        self._batches: List[pa.RecordBatch] = []
+        self._table: Optional[pa.Table] = None
+        self.num_rows = 0
+
+    def append_rows(self, rows: Sequence[tuple], columns: Optional[Sequence[str]] = None):
+        """Ajoute un lot de lignes (tuples du curseur), transposé en colonnes"""
+        if columns and not self.columns:
+            self.columns = list(columns)
+        if not rows:
+            return
+        arrays = [pa.array(values) for values in zip(*rows)]
+        self._batches.append(pa.RecordBatch.from_arrays(arrays, names=self.columns))
+        self.num_rows += len(rows)
+        self._table = None
+
+    @property
+    def table(self) -> pa.Table:
+        """Table Arrow de toutes les lignes lues (les lots ne sont pas recopiés)"""
+        if self._table is None:
+            if not self._batches:
+                self._table = pa.table({name: pa.array([], pa.null()) for name in self.columns})
+            else:
+                # Types inférés par lot (ex. NULL puis entier) : promotion à la concaténation
+                tables = [pa.Table.from_batches([batch]) for batch in self._batches]
+                self._table = pa.concat_tables(tables, promote_options="permissive")
+        return self._table
+
+    @property
+    def nbytes(self) -> int:
+        """Taille mémoire des données Arrow"""
+        return sum(batch.nbytes for batch in self._batches)
+
+    def to_pandas(self):
+        """DataFrame pandas (conversion colonne par colonne)"""
+        return self.table.to_pandas()
+
+    def to_csv_bytes(self) -> bytes:
+        """Export CSV écrit directement depuis les colonnes Arrow"""
+        sink = pa.BufferOutputStream()
+        pa_csv.write_csv(self.table, sink)
+        return sink.getvalue().to_pybytes()
+
+    def to_parquet_bytes(self) -> bytes:
+        """Export Parquet (compressé, types conservés)"""
+        sink = pa.BufferOutputStream()
+        pq.write_table(self.table, sink)
+        return sink.getvalue().to_pybytes()
+
+    def to_ipc_bytes(self, max_rows: Optional[int] = None) -> bytes:
+        """Flux Arrow IPC (échange sans conversion avec d'autres outils)"""
+        table = self.table if max_rows is None else self.table.slice(0, max_rows)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
@@ -1,27 +1,131 @@
 """
 Gestion robuste des connexions Redshift avec retry et pooling
+La connexion est établie paresseusement (ou par un préchauffage en arrière-plan)
+pour ne jamais bloquer le démarrage de l'application
 """
 from sqlalchemy.engine import create_engine
 from sqlalchemy.pool import QueuePool
-from sqlalchemy import inspect
+from sqlalchemy import inspect, text
 from langchain_community.utilities import SQLDatabase
 from tenacity import retry, stop_after_attempt, wait_exponential
 from infrastructure.settings import settings
 from infrastructure.logging import logger
+from infrastructure.metrics_export import MetricFamily, gauge, metrics_registry
+from infrastructure.schema_index import TableInfo, ColumnInfo
+from typing import Any, Dict, List, Optional
+import hashlib
+import threading
 import time
 
+# États de la connexion
+STATE_IDLE = "idle"
+STATE_CONNECTING = "connecting"
+STATE_READY = "ready"
+STATE_FAILED = "failed"
+
+# Politique de reconnexion de _connect (préchauffage en arrière-plan)
+CONNECT_ATTEMPTS = 3
+CONNECT_BACKOFF_MIN = 4
+CONNECT_BACKOFF_MAX = 10
+
 class DatabaseManager:
     def __init__(self):
         self.engine = None
         self.db = None
-        self._connect()
+        self.state = STATE_IDLE
+        self.last_error: Optional[str] = None
+        self.connect_time: Optional[float] = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        # Fin d'une tentative de connexion, réussie ou non (réveille les attentes)
+        self._settled = threading.Event()
+    
+    @property
+    def is_ready(self) -> bool:
+        """Le pool est connecté et utilisable"""
+        return self._ready.is_set()
+    
+    def status(self) -> Dict[str, Any]:
+        """État de préparation (interrogé par l'UI et les health checks)"""
+        return {
+            "state": self.state,
+            "ready": self.is_ready,
+            "error": self.last_error,
+            "connect_time": self.connect_time
+        }
+    
+    def start_warmup(self) -> "DatabaseManager":
+        """Lance la connexion dans un thread d'arrière-plan (non bloquant)"""
+        with self._lock:
+            if self.state in (STATE_CONNECTING, STATE_READY):
+                return self
+            self.state = STATE_CONNECTING
+            self._settled.clear()
+        
+        def _warmup():
+            try:
+                self._establish()
+            except Exception:
+                pass  # Déjà journalisé, l'état passe à "failed"
+        
+        threading.Thread(target=_warmup, name="db-warmup", daemon=True).start()
+        return self
+    
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Attend la fin du préchauffage (True si la connexion est prête)"""
+        return self._ready.wait(timeout)
+    
+    def _establish(self):
+        """Établit la connexion et met à jour l'état de préparation"""
+        start_time = time.perf_counter()
+        try:
+            self._connect()
+        except Exception as e:
+            self.state = STATE_FAILED
+            self.last_error = str(e)
+            self._settled.set()
+            raise
+        self.connect_time = time.perf_counter() - start_time
+        self.last_error = None
+        self.state = STATE_READY
+        self._ready.set()
+        self._settled.set()
+    
+    def _ensure_connected(self):
+        """
+        Connexion à la demande sans bloquer la requête : le préchauffage est
+        (re)lancé en arrière-plan et attendu au plus db_ready_wait secondes
+
+        Raises:
+            ConnectionError: Connexion en cours ou dernier essai en échec
+        """
+        if self._ready.is_set():
+            return
+        
+        with self._lock:
+            failed = self.state == STATE_FAILED
+            last_error = self.last_error
+        # Sans effet si un préchauffage est déjà en cours
+        self.start_warmup()
+        if failed:
+            # Nouvelle tentative en arrière-plan ; la requête échoue tout de suite
+            raise ConnectionError(f"Connexion à la base de données impossible : {last_error}")
+        
+        self._settled.wait(settings.db_ready_wait)
+        if self._ready.is_set():
+            return
+        if self.state == STATE_FAILED:
+            raise ConnectionError(f"Connexion à la base de données impossible : {self.last_error}")
+        raise ConnectionError("Connexion à la base de données en cours")
     
     @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10)
+        stop=stop_after_attempt(CONNECT_ATTEMPTS),
+        wait=wait_exponential(multiplier=1, min=CONNECT_BACKOFF_MIN, max=CONNECT_BACKOFF_MAX),
+        reraise=True
     )
     def _connect(self):
         """Connexion avec retry automatique"""
+        engine = None
         try:
             logger.info("Connecting to Redshift", 
                        host=settings.redshift_host, 
@@ -29,7 +133,7 @@ class DatabaseManager:
                        schema=settings.redshift_schema)
             
             # Engine avec pooling robuste
-            self.engine = create_engine(
+            engine = create_engine(
                 settings.redshift_dsn,
                 poolclass=QueuePool,
                 pool_size=settings.db_pool_size,
@@ -37,15 +141,16 @@ class DatabaseManager:
                 pool_timeout=settings.db_pool_timeout,
                 pool_pre_ping=True,  # Vérifie la connexion avant utilisation
                 pool_recycle=3600,   # Renouvelle les connexions toutes les heures
-                echo=settings.debug  # Log SQL en mode debug
+                echo=settings.debug,  # Log SQL en mode debug
+                connect_args={"connect_timeout": settings.db_connect_timeout}
             )
             
             # Test de connexion
-            with self.engine.connect() as conn:
-                conn.execute("SELECT 1")
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
             
             # Introspection du schéma
-            inspector = inspect(self.engine)
+            inspector = inspect(engine)
             tables = inspector.get_table_names(schema=settings.redshift_schema)
             
             logger.info("Database connection successful", 
@@ -53,42 +158,140 @@ class DatabaseManager:
                        tables=tables[:5])  # Log les 5 premières tables
             
             # Création de l'objet SQLDatabase pour LangChain
+            # (réflexion paresseuse : seules les tables utilisées sont inspectées)
             self.db = SQLDatabase(
-                self.engine, 
+                engine, 
                 schema=settings.redshift_schema, 
-                include_tables=tables
+                include_tables=tables,
+                lazy_table_reflection=True
             )
+            self.engine = engine
             
         except Exception as e:
             logger.error("Database connection failed", 
                         error=str(e),
                         host=settings.redshift_host)
+            # Chaque tentative crée son engine : le pool d'un essai manqué est libéré
+            if engine is not None:
+                engine.dispose()
             raise
     
     def get_db(self) -> SQLDatabase:
         """Retourne l'instance SQLDatabase"""
-        if self.db is None:
-            self._connect()
+        self._ensure_connected()
         return self.db
     
+    def get_schema_metadata(self, table_names: Optional[List[str]] = None) -> List[TableInfo]:
+        """Introspecte tables, colonnes et commentaires (toutes ou une sélection)"""
+        self._ensure_connected()
+        
+        inspector = inspect(self.engine)
+        schema = settings.redshift_schema
+        if table_names is None:
+            table_names = inspector.get_table_names(schema=schema)
+        
+        tables = []
+        for table_name in table_names:
+            try:
+                comment = inspector.get_table_comment(table_name, schema=schema).get("text") or ""
+            except NotImplementedError:
+                comment = ""
+            columns = [
+                ColumnInfo(
+                    name=column["name"],
+                    type=str(column["type"]),
+                    comment=column.get("comment") or ""
+                )
+                for column in inspector.get_columns(table_name, schema=schema)
+            ]
+            tables.append(TableInfo(table_name, columns, comment))
+        
+        logger.info("Schema metadata introspected", tables_count=len(tables))
+        return tables
+    
+    def get_catalog_signatures(self) -> Dict[str, str]:
+        """
+        Empreinte (colonnes et types) de chaque table, lue en une seule requête
+        sur le catalogue pg_class/pg_attribute, sans inspection table par table
+        """
+        self._ensure_connected()
+        
+        query = text("""
+            SELECT c.relname AS table_name,
+                   a.attname AS column_name,
+                   pg_catalog.format_type(a.atttypid, a.atttypmod) AS data_type
+            FROM pg_catalog.pg_class c
+            JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+            JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid
+            WHERE n.nspname = :schema
+              AND c.relkind IN ('r', 'v')
+              AND a.attnum > 0
+              AND NOT a.attisdropped
+            ORDER BY c.relname, a.attnum
+        """)
+        
+        columns_by_table: Dict[str, List[str]] = {}
+        with self.engine.connect() as conn:
+            for table_name, column_name, data_type in conn.execute(query, {"schema": settings.redshift_schema}):
+                columns_by_table.setdefault(table_name, []).append(f"{column_name}:{data_type}")
+        
+        return {
+            table_name: hashlib.sha1("|".join(columns).encode()).hexdigest()
+            for table_name, columns in columns_by_table.items()
+        }
+    
+    def get_table_change_signatures(self) -> Dict[str, str]:
+        """
+        Empreinte du contenu de chaque table (lignes et blocs) d'après
+        svv_table_info : elle change après un chargement ou une modification
+        """
+        self._ensure_connected()
+        
+        query = text("""
+            SELECT "table", tbl_rows, size
+            FROM svv_table_info
+            WHERE "schema" = :schema
+        """)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query, {"schema": settings.redshift_schema})
+            return {table_name: f"{tbl_rows}:{size}" for table_name, tbl_rows, size in rows}
+    
     def health_check(self) -> bool:
-        """Vérifie la santé de la connexion"""
+        """Vérifie la santé de la connexion (sans attendre un préchauffage en cours)"""
+        if not self.is_ready:
+            return False
         try:
             with self.engine.connect() as conn:
-                conn.execute("SELECT 1")
+                conn.execute(text("SELECT 1"))
             return True
         except Exception as e:
             logger.error("Database health check failed", error=str(e))
             return False
     
+    def openmetrics_families(self) -> List[MetricFamily]:
+        """État de la connexion et occupation du pool"""
+        families = [gauge("database_ready", "Database pool connected and usable", int(self.is_ready))]
+        pool = self.engine.pool if self.engine is not None else None
+        if isinstance(pool, QueuePool):
+            families += [
+                gauge("db_pool_size", "Configured pool size", pool.size()),
+                gauge("db_pool_checked_out", "Connections in use", pool.checkedout()),
+                gauge("db_pool_checked_in", "Idle connections in the pool", pool.checkedin()),
+                gauge("db_pool_overflow", "Connections above the pool size", max(pool.overflow(), 0)),
+            ]
+        return families
+
     def close(self):
         """Ferme proprement les connexions"""
         if self.engine:
             self.engine.dispose()
             logger.info("Database connections closed")
+        self._ready.clear()
+        self.state = STATE_IDLE
 
-# Instance globale
+# Instance globale (aucune connexion à l'import)
 db_manager = DatabaseManager()
+metrics_registry.register("database", db_manager.openmetrics_families)
 
 def connect_to_redshift() -> SQLDatabase:
     """Interface publique pour la connexion Redshift"""
@@ -0,0 +1,221 @@
+"""
+Politiques d'éviction pour le cache mémoire borné (LRU, LFU, W-TinyLFU)
+Les politiques ne suivent que les clés ; les valeurs restent dans CacheManager
+"""
+import zlib
+from collections import OrderedDict, defaultdict
+from typing import Dict, Hashable, List, Optional
+
+
+class EvictionPolicy:
+    """Interface commune des politiques d'éviction"""
+
+    def on_insert(self, key: Hashable):
+        """Appelé lors de l'insertion d'une nouvelle clé"""
+        raise NotImplementedError
+
+    def on_access(self, key: Hashable):
+        """Appelé lors d'un accès (lecture ou mise à jour) à une clé existante"""
+        raise NotImplementedError
+
+    def on_remove(self, key: Hashable):
+        """Appelé quand une clé quitte le cache (expiration, suppression)"""
+        raise NotImplementedError
+
+    def on_miss(self, key: Hashable):
+        """Appelé lors d'une lecture d'une clé absente"""
+
+    def victim(self) -> Optional[Hashable]:
+        """Retourne la prochaine clé à évincer"""
+        raise NotImplementedError
+
+
+class LRUPolicy(EvictionPolicy):
+    """Least Recently Used"""
+
+    def __init__(self):
+        self._order: "OrderedDict[Hashable, None]" = OrderedDict()
+
+    def on_insert(self, key):
+        self._order[key] = None
+
+    def on_access(self, key):
+        if key in self._order:
+            self._order.move_to_end(key)
+
+    def on_remove(self, key):
+        self._order.pop(key, None)
+
+    def victim(self):
+        return next(iter(self._order), None)
+
+
+class LFUPolicy(EvictionPolicy):
+    """Least Frequently Used en O(1) (LRU entre clés de même fréquence)"""
+
+    def __init__(self):
+        self._freq: Dict[Hashable, int] = {}
+        self._buckets: Dict[int, "OrderedDict[Hashable, None]"] = defaultdict(OrderedDict)
+        self._min_freq = 0
+
+    def on_insert(self, key):
+        self._freq[key] = 1
+        self._buckets[1][key] = None
+        self._min_freq = 1
+
+    def on_access(self, key):
+        freq = self._freq.get(key)
+        if freq is None:
+            return
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = freq + 1
+        self._freq[key] = freq + 1
+        self._buckets[freq + 1][key] = None
+
+    def on_remove(self, key):
+        freq = self._freq.pop(key, None)
+        if freq is None:
+            return
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = min(self._buckets) if self._buckets else 0
+
+    def victim(self):
+        if not self._freq:
+            return None
+        if self._min_freq not in self._buckets:
+            self._min_freq = min(self._buckets)
+        return next(iter(self._buckets[self._min_freq]))
+
+
+class CountMinSketch:
+    """Estimateur de fréquence compact avec vieillissement périodique"""
+
+    def __init__(self, width: int, depth: int = 4):
+        self.width = max(16, width)
+        self.depth = depth
+        self._rows = [[0] * self.width for _ in range(depth)]
+        self._additions = 0
+        self._reset_at = self.width * 10
+
+    def _indexes(self, key: Hashable) -> List[int]:
+        # Double hachage (Kirsch-Mitzenmacher) à partir de deux sommes indépendantes
+        data = repr(key).encode()
+        h1 = zlib.crc32(data)
+        h2 = zlib.adler32(data) | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def increment(self, key: Hashable):
+        for row, idx in zip(self._rows, self._indexes(key)):
+            if row[idx] < 15:  # compteurs 4 bits comme dans TinyLFU
+                row[idx] += 1
+        self._additions += 1
+        if self._additions >= self._reset_at:
+            self._age()
+
+    def estimate(self, key: Hashable) -> int:
+        return min(row[idx] for row, idx in zip(self._rows, self._indexes(key)))
+
+    def _age(self):
+        """Divise tous les compteurs par deux pour oublier l'historique ancien"""
+        for row in self._rows:
+            for i, value in enumerate(row):
+                row[i] = value >> 1
+        self._additions //= 2
+
+
+class WTinyLFUPolicy(EvictionPolicy):
+    """
+    W-TinyLFU : petite fenêtre LRU (~1%) devant un cache principal SLRU,
+    l'admission dans le principal étant décidée par un CountMinSketch
+    """
+
+    def __init__(self, capacity: int):
+        capacity = max(2, capacity)
+        self._capacity = capacity
+        self._window_capacity = max(1, capacity // 100)
+        main_capacity = capacity - self._window_capacity
+        self._protected_capacity = max(1, int(main_capacity * 0.8))
+        self._window: "OrderedDict[Hashable, None]" = OrderedDict()
+        self._probation: "OrderedDict[Hashable, None]" = OrderedDict()
+        self._protected: "OrderedDict[Hashable, None]" = OrderedDict()
+        self._candidates: "OrderedDict[Hashable, None]" = OrderedDict()
+        self._sketch = CountMinSketch(width=capacity * 4)
+
+    def on_miss(self, key):
+        self._sketch.increment(key)
+
+    def on_insert(self, key):
+        self._window[key] = None
+        # Le débordement de la fenêtre passe dans le principal ; une fois le cache
+        # plein, il n'y reste que s'il gagne le duel d'admission (voir victim)
+        while len(self._window) > self._window_capacity:
+            candidate, _ = self._window.popitem(last=False)
+            self._probation[candidate] = None
+            if self._size() > self._capacity:
+                self._candidates[candidate] = None
+
+    def on_access(self, key):
+        self._sketch.increment(key)
+        if key in self._window:
+            self._window.move_to_end(key)
+        elif key in self._probation:
+            # Promotion vers le segment protégé
+            del self._probation[key]
+            self._candidates.pop(key, None)
+            self._protected[key] = None
+            if len(self._protected) > self._protected_capacity:
+                demoted, _ = self._protected.popitem(last=False)
+                self._probation[demoted] = None
+        elif key in self._protected:
+            self._protected.move_to_end(key)
+
+    def _size(self) -> int:
+        return len(self._window) + len(self._probation) + len(self._protected)
+
+    def on_remove(self, key):
+        self._window.pop(key, None)
+        self._probation.pop(key, None)
+        self._protected.pop(key, None)
+        self._candidates.pop(key, None)
+
+    def victim(self):
+        # Le plus ancien candidat affronte la victime du principal : le moins fréquent perd
+        while self._candidates:
+            candidate = next(iter(self._candidates))
+            del self._candidates[candidate]
+            if candidate not in self._probation:
+                continue
+            main_victim = next(
+                (key for key in self._probation if key not in self._candidates and key != candidate),
+                None
+            )
+            if main_victim is None:
+                return candidate
+            if self._sketch.estimate(candidate) > self._sketch.estimate(main_victim):
+                return main_victim
+            return candidate
+
+        for segment in (self._probation, self._protected, self._window):
+            if segment:
+                return next(iter(segment))
+        return None
+
+
+def create_policy(name: str, capacity: int) -> EvictionPolicy:
+    """Instancie une politique d'éviction à partir de son nom"""
+    name = name.lower()
+    if name == "lru":
+        return LRUPolicy()
+    if name == "lfu":
+        return LFUPolicy()
+    if name in ("tinylfu", "w-tinylfu", "wtinylfu"):
+        return WTinyLFUPolicy(capacity)
+    raise ValueError(f"Politique d'éviction inconnue : {name}")
@@ -0,0 +1,179 @@
+"""
+Exemples few-shot : paires question → SQL validées lors des générations
+Stockées dans SQLite ; les k plus proches d'une nouvelle question sont
+retrouvés en une multiplication matricielle sur leurs vecteurs (hachage).
+Chaque exemple appartient à l'espace de noms (version du schéma | modèle)
+qui l'a produit, comme les entrées de cache
+"""
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+from infrastructure.normalization import normalize_question
+from infrastructure.semantic_cache import HashingVectorizer
+
+
+@dataclass
+class Example:
+    """Paire question → SQL validée"""
+    question: str
+    sql: str
+    similarity: float = 0.0
+
+    def render(self) -> str:
+        """Forme de l'exemple dans le prompt"""
+        return f"Question : {self.question}\nSQL : {self.sql}"
+
+
+class ExampleStore:
+    """Exemples persistants, vectorisés dans une matrice NumPy de taille fixe"""
+
+    # Table v2 : exemples par espace de noms (ceux de l'ancienne table, non
+    # rattachés à un schéma ni à un modèle, ne sont plus proposés)
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS examples_v2 (
+            namespace TEXT NOT NULL,
+            normalized TEXT NOT NULL,
+            question TEXT NOT NULL,
+            sql TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (namespace, normalized)
+        )
+    """
+
+    def __init__(self, path: str = None, max_examples: int = None, dim: int = None,
+                 min_similarity: float = None):
+        self.path = path or settings.example_store_path
+        self.max_examples = max_examples or settings.example_store_max_examples
+        self.min_similarity = (
+            min_similarity if min_similarity is not None else settings.example_min_similarity
+        )
+        self.vectorizer = HashingVectorizer(dim or settings.example_store_dim)
+
+        # Matrice préallouée ; une fois pleine, l'exemple le plus ancien est remplacé
+        self._matrix = np.zeros((self.max_examples, self.vectorizer.dim), dtype=np.float32)
+        self._namespaces = np.zeros(self.max_examples, dtype=np.int64)
+        self._examples: List[Optional[Example]] = [None] * self.max_examples
+        self._keys: List[Optional[Tuple[str, str]]] = [None] * self.max_examples
+        self._index: Dict[Tuple[str, str], int] = {}
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with closing(self._connection()) as conn, conn:
+            conn.execute(self._SCHEMA)
+        self._load()
+
+        logger.info("Example store initialized", path=self.path, examples=self._size)
+
+    @staticmethod
+    def _namespace_id(namespace: str) -> int:
+        return zlib.crc32(namespace.encode())
+
+    def _connection(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    def _load(self):
+        """Recharge les exemples les plus récents et recalcule leurs vecteurs"""
+        with closing(self._connection()) as conn:
+            rows = conn.execute(
+                "SELECT namespace, normalized, question, sql FROM examples_v2 "
+                "ORDER BY created_at DESC LIMIT ?",
+                (self.max_examples,)
+            ).fetchall()
+        for namespace, normalized, question, sql in reversed(rows):
+            self._put((namespace, normalized), Example(question, sql))
+
+    def _put(self, key: Tuple[str, str], example: Example) -> Optional[Tuple[str, str]]:
+        """Place un exemple dans la matrice ; retourne la clé (espace de noms, question) évincée"""
+        evicted = None
+        index = self._index.get(key)
+        if index is None:
+            index = self._next
+            evicted = self._keys[index]
+            if evicted is not None:
+                del self._index[evicted]
+            self._keys[index] = key
+            self._next = (self._next + 1) % self.max_examples
+            self._size = min(self._size + 1, self.max_examples)
+            self._index[key] = index
+        namespace, normalized = key
+        self._matrix[index] = self.vectorizer.transform(normalized)
+        self._namespaces[index] = self._namespace_id(namespace)
+        self._examples[index] = example
+        return evicted
+
+    def add(self, question: str, sql: str, language: str = None, namespace: str = ""):
+        """Enregistre une paire validée (remplace celle d'une question identique du même espace de noms)"""
+        normalized = normalize_question(question, language)
+        if not normalized or not sql:
+            return
+        example = Example(question.strip(), sql.strip())
+
+        with self._lock:
+            evicted = self._put((namespace, normalized), example)
+            try:
+                with closing(self._connection()) as conn, conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO examples_v2 (namespace, normalized, question, sql, created_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (namespace, normalized, example.question, example.sql, time.time())
+                    )
+                    if evicted:
+                        conn.execute("DELETE FROM examples_v2 WHERE namespace = ? AND normalized = ?", evicted)
+            except sqlite3.Error as e:
+                logger.warning("Example store write failed", error=str(e))
+
+    def select(self, question: str, k: int = None, language: str = None,
+               namespace: str = "") -> List[Example]:
+        """Les k exemples les plus proches de la question (au-dessus du seuil, même espace de noms)"""
+        k = k or settings.example_top_k
+        normalized = normalize_question(question, language)
+        if not normalized:
+            return []
+        query = self.vectorizer.transform(normalized)
+
+        with self._lock:
+            if self._size == 0:
+                return []
+            scores = self._matrix[:self._size] @ query
+            # Exemples d'un autre schéma ou d'un autre modèle : écartés
+            scores[self._namespaces[:self._size] != self._namespace_id(namespace)] = -1.0
+            # La question elle-même n'est pas un exemple utile
+            same = self._index.get((namespace, normalized))
+            if same is not None:
+                scores[same] = -1.0
+            count = min(k, self._size)
+            best = np.argpartition(-scores, count - 1)[:count]
+            best = best[np.argsort(-scores[best])]
+            return [
+                Example(self._examples[i].question, self._examples[i].sql, float(scores[i]))
+                for i in best if scores[i] >= self.min_similarity
+            ]
+
+    def stats(self) -> Dict[str, int]:
+        """Statistiques du magasin d'exemples"""
+        return {
+            "examples": self._size,
+            "max_examples": self.max_examples,
+            "matrix_bytes": int(self._matrix.nbytes)
+        }
+
+
+def create_example_store() -> Optional[ExampleStore]:
+    """Magasin d'exemples configuré (None si désactivé ou inaccessible)"""
+    if not settings.example_store_enabled:
+        return None
+    try:
+        return ExampleStore()
+    except (OSError, sqlite3.Error) as e:
+        logger.warning("Example store unavailable", error=str(e))
+        return None
@@ -0,0 +1,139 @@
+"""
+Histogrammes de latence à mémoire fixe (seaux logarithmiques)
+Fenêtres glissantes découpées en tranches de temps ; l'enregistrement est
+un simple incrément, le verrou n'est pris qu'au changement de tranche.
+Des seaux cumulés à bornes fixes servent à l'export (histogramme
+OpenMetrics agrégeable entre processus)
+"""
+import bisect
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Percentiles publiés
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99, "p999": 0.999}
+
+# Bornes (le) des seaux exportés, identiques pour tous les processus
+EXPORT_BOUNDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class LatencyHistogram:
+    """Histogramme de durées sur fenêtres glissantes (précision relative fixe)"""
+
+    def __init__(self, min_value: float = 1e-5, max_value: float = 600.0,
+                 buckets_per_decade: int = 40, slot_seconds: float = 10.0,
+                 windows: Sequence[int] = (60, 300)):
+        self.min_value = min_value
+        self.buckets_per_decade = buckets_per_decade
+        # Seau 0 : sous min_value ; dernier seau : au-delà de max_value
+        self.bucket_count = math.ceil(math.log10(max_value / min_value) * buckets_per_decade) + 2
+        self.slot_seconds = slot_seconds
+        self.windows = {f"{seconds // 60}m" if seconds % 60 == 0 else f"{seconds}s": seconds
+                        for seconds in windows}
+        self.slot_count = math.ceil(max(windows) / slot_seconds)
+
+        self._slots: List[List[int]] = [[0] * self.bucket_count for _ in range(self.slot_count)]
+        self._slot_ids: List[int] = [-1] * self.slot_count
+        self._max: List[float] = [0.0] * self.slot_count
+        self._total_count = 0
+        self._total_sum = 0.0
+        # Depuis le démarrage, un compteur par borne exportée (+ dernier : +Inf)
+        self._export_counts: List[int] = [0] * (len(EXPORT_BOUNDS) + 1)
+        self._lock = threading.Lock()
+        self._log_min = math.log10(min_value)
+
+    def _bucket(self, value: float) -> int:
+        if value < self.min_value:
+            return 0
+        index = int((math.log10(value) - self._log_min) * self.buckets_per_decade) + 1
+        return min(index, self.bucket_count - 1)
+
+    def _bucket_value(self, index: int) -> float:
+        """Valeur représentative d'un seau (milieu géométrique)"""
+        if index == 0:
+            return self.min_value
+        return 10 ** (self._log_min + (index - 0.5) / self.buckets_per_decade)
+
+    def _current_slot(self, now: float) -> int:
+        slot_id = int(now // self.slot_seconds)
+        position = slot_id % self.slot_count
+        if self._slot_ids[position] != slot_id:
+            with self._lock:
+                # Tranche expirée : remise à zéro avant réutilisation
+                if self._slot_ids[position] != slot_id:
+                    self._slots[position] = [0] * self.bucket_count
+                    self._max[position] = 0.0
+                    self._slot_ids[position] = slot_id
+        return position
+
+    def record(self, seconds: float):
+        """Enregistre une durée (un incrément, sans verrou hors rotation)"""
+        position = self._current_slot(time.monotonic())
+        self._slots[position][self._bucket(seconds)] += 1
+        if seconds > self._max[position]:
+            self._max[position] = seconds
+        self._total_count += 1
+        self._total_sum += seconds
+        self._export_counts[bisect.bisect_left(EXPORT_BOUNDS, seconds)] += 1
+
+    @property
+    def total_count(self) -> int:
+        """Nombre de mesures depuis le démarrage"""
+        return self._total_count
+
+    @property
+    def total_sum(self) -> float:
+        """Somme des mesures depuis le démarrage (secondes)"""
+        return self._total_sum
+
+    def buckets(self) -> List[Tuple[float, int]]:
+        """Seaux cumulés (borne le, nombre de mesures <= le) depuis le démarrage, +Inf en dernier"""
+        cumulative = 0
+        buckets = []
+        for bound, count in zip(EXPORT_BOUNDS + (math.inf,), list(self._export_counts)):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return buckets
+
+    def _merge(self, seconds: int, now: float) -> Tuple[List[int], float]:
+        newest = int(now // self.slot_seconds)
+        oldest = newest - math.ceil(seconds / self.slot_seconds) + 1
+        merged = [0] * self.bucket_count
+        maximum = 0.0
+        for position in range(self.slot_count):
+            if oldest <= self._slot_ids[position] <= newest:
+                for index, count in enumerate(self._slots[position]):
+                    if count:
+                        merged[index] += count
+                maximum = max(maximum, self._max[position])
+        return merged, maximum
+
+    def percentiles(self, seconds: Optional[int] = None) -> Dict[str, float]:
+        """Nombre, percentiles et maximum sur la fenêtre (la plus longue par défaut)"""
+        counts, maximum = self._merge(seconds or max(self.windows.values()), time.monotonic())
+        total = sum(counts)
+        summary: Dict[str, float] = {"count": total}
+        targets = [(name, q * total) for name, q in PERCENTILES.items()]
+        cumulative = 0
+        pending = iter(targets)
+        name, threshold = next(pending)
+        for index, count in enumerate(counts):
+            cumulative += count
+            while total and cumulative >= threshold:
+                # La valeur estimée ne dépasse jamais le maximum observé
+                summary[name] = min(self._bucket_value(index), maximum)
+                name, threshold = next(pending, (None, math.inf))
+            if name is None:
+                break
+        for name, _ in targets:
+            summary.setdefault(name, 0.0)
+        summary["max"] = maximum
+        return summary
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Percentiles de chaque fenêtre glissante"""
+        summary = {label: self.percentiles(seconds) for label, seconds in self.windows.items()}
+        summary["total_count"] = self._total_count
+        summary["total_sum"] = self._total_sum
+        return summary
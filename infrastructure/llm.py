@@ -1,58 +1,244 @@
+import asyncio
+import queue
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, Sequence
+from langchain_core.messages.ai import add_usage
 from langchain_google_genai import ChatGoogleGenerativeAI
 from infrastructure.settings import settings
 from infrastructure.logging import logger
+from infrastructure.async_runtime import async_runtime
+from infrastructure.prompt_builder import PromptBuilder
+from infrastructure.tracing import current_span, tracer
+from infrastructure.cancellation import (
+    CancellationHandle, OperationCancelledError, POLL_INTERVAL, wait_for
+)
+
+# Réponse du LLM factice (tests, démonstrations hors ligne)
+FAKE_SQL_RESPONSE = "SELECT COUNT(*) AS total_users\nFROM users\nWHERE status = 'active';"
 
 class LLMManager:
     """Gestionnaire pour les interactions avec le modèle LLM"""
-    
-    def __init__(self):
-        """Initialise le gestionnaire LLM"""
-        self.llm = None
-        self._initialize_llm()
-    
+
+    def __init__(self, llm=None, metrics=None):
+        """Initialise le gestionnaire LLM (un client injecté remplace Gemini)"""
+        self.llm = llm
+        self.metrics = metrics
+        self.model_name = settings.llm_model if llm is None else type(llm).__name__
+        self.max_concurrency = settings.llm_max_concurrency
+        self.timeout = settings.llm_timeout
+        # Un sémaphore par boucle d'événements (asyncio les lie à leur boucle)
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._semaphores_lock = threading.Lock()
+        self.prompt_builder = PromptBuilder()
+        if self.llm is None:
+            self._initialize_llm()
+
     def _initialize_llm(self):
         """Initialise le modèle LLM avec gestion d'erreur"""
         try:
-            self.llm = ChatGoogleGenerativeAI(
-                model="gemini-1.5-flash",
-                temperature=0,
-                google_api_key=settings.google_api_key
-            )
-            logger.info("LLM initialisé avec succès", model="gemini-1.5-flash")
+            if settings.llm_provider == "fake":
+                self.llm = create_fake_llm()
+                self.model_name = "fake"
+            else:
+                self.llm = ChatGoogleGenerativeAI(
+                    model=self.model_name,
+                    temperature=0,
+                    google_api_key=settings.google_api_key
+                )
+            logger.info("LLM initialisé avec succès", model=self.model_name)
         except Exception as e:
             logger.error("Erreur lors de l'initialisation du LLM", error=str(e))
             self.llm = None
-    
-    def generate_sql(self, question: str, schema_info: str = "") -> str:
-        """Génère une requête SQL à partir d'une question en langage naturel"""
+
+    def _build_prompt(self, question: str, schema_info: str = "",
+                      examples: Sequence[str] = ()) -> str:
+        """Construit le prompt de génération SQL dans le budget de tokens"""
+        start_time = time.perf_counter()
+        with tracer.span("prompt_build") as span:
+            prompt = self.prompt_builder.build(question, schema_info, examples)
+            span.set_attribute("tokens", prompt.tokens)
+            span.set_attribute("truncated", prompt.truncated)
+        if self.metrics:
+            self.metrics.record_latency("prompt_build", time.perf_counter() - start_time)
+            self.metrics.record_prompt(prompt.tokens, prompt.truncated)
+        logger.debug("Prompt built",
+                     tokens=prompt.tokens,
+                     question_tokens=prompt.question_tokens,
+                     schema_tokens=prompt.schema_tokens,
+                     example_tokens=prompt.example_tokens,
+                     dropped_schema=prompt.dropped_schema,
+                     dropped_examples=prompt.dropped_examples)
+        return prompt.text
+
+    def _record_usage(self, usage: Optional[dict]):
+        """Tokens d'entrée et de sortie renvoyés par le fournisseur (absents du LLM factice)"""
+        if not usage:
+            return
+        input_tokens, output_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        span = current_span()
+        if span is not None:
+            span.set_attribute("input_tokens", input_tokens)
+            span.set_attribute("output_tokens", output_tokens)
+        if self.metrics:
+            self.metrics.record_llm_tokens(input_tokens, output_tokens)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """Sémaphore de concurrence de la boucle courante"""
+        loop = asyncio.get_running_loop()
+        with self._semaphores_lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._semaphores[loop] = semaphore
+            return semaphore
+
+    async def agenerate_sql(self, question: str, schema_info: str = "",
+                            examples: Sequence[str] = ()) -> str:
+        """Génère une requête SQL (asynchrone, concurrence bornée, avec délai max)"""
         if not self.llm:
             raise ValueError("LLM non initialisé")
-        
-        prompt = f"""
-        Convertis cette question en requête SQL valide.
-        
-        Question: {question}
-        
-        Schéma de base de données: {schema_info}
-        
-        Réponds uniquement avec la requête SQL, sans explication.
-        """
-        
+
+        prompt = self._build_prompt(question, schema_info, examples)
+
         try:
-            response = self.llm.invoke(prompt)
+            async with self._get_semaphore():
+                with tracer.span("llm_call", model=self.model_name):
+                    start_time = time.perf_counter()
+                    response = await asyncio.wait_for(self.llm.ainvoke(prompt), timeout=self.timeout)
+                    if self.metrics:
+                        self.metrics.record_llm_generation(time.perf_counter() - start_time)
+                    self._record_usage(response.usage_metadata)
             return response.content.strip()
+        except asyncio.TimeoutError:
+            logger.error("Délai dépassé lors de la génération SQL", timeout=self.timeout, question=question)
+            raise TimeoutError(f"Génération SQL interrompue après {self.timeout}s")
         except Exception as e:
             logger.error("Erreur lors de la génération SQL", error=str(e), question=question)
             raise
-    
+
+    def generate_sql(self, question: str, schema_info: str = "",
+                     cancel_handle: Optional[CancellationHandle] = None,
+                     on_poll: Optional[Callable[[], Any]] = None,
+                     examples: Sequence[str] = ()) -> str:
+        """Génère une requête SQL à partir d'une question en langage naturel"""
+        if not self.llm:
+            raise ValueError("LLM non initialisé")
+
+        # Exécution sur la boucle partagée : client et limite de concurrence communs
+        if cancel_handle is None and on_poll is None:
+            return async_runtime.run(self.agenerate_sql(question, schema_info, examples))
+        future = async_runtime.submit(self.agenerate_sql(question, schema_info, examples))
+        try:
+            return wait_for(future, cancel_handle, on_poll=on_poll)
+        except BaseException:
+            future.cancel()
+            raise
+
+    async def astream_sql(self, question: str, schema_info: str = "",
+                          examples: Sequence[str] = ()) -> AsyncIterator[str]:
+        """Génère une requête SQL en flux (fragments de texte au fil de l'eau)"""
+        if not self.llm:
+            raise ValueError("LLM non initialisé")
+
+        prompt = self._build_prompt(question, schema_info, examples)
+
+        async with self._get_semaphore():
+            with tracer.span("llm_call", model=self.model_name, streaming=True) as span:
+                start_time = time.perf_counter()
+                deadline = start_time + self.timeout
+                first_token_time = None
+                usage = None
+                stream = self.llm.astream(prompt).__aiter__()
+                try:
+                    while True:
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0:
+                            raise asyncio.TimeoutError
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), timeout=remaining)
+                        except StopAsyncIteration:
+                            break
+                        # Usage réparti entre les fragments : cumulé sur le flux
+                        usage = add_usage(usage, chunk.usage_metadata) if chunk.usage_metadata else usage
+                        if not chunk.content:
+                            continue
+                        if first_token_time is None:
+                            first_token_time = time.perf_counter() - start_time
+                        yield chunk.content
+                except asyncio.TimeoutError:
+                    logger.error("Délai dépassé lors de la génération SQL", timeout=self.timeout, question=question)
+                    raise TimeoutError(f"Génération SQL interrompue après {self.timeout}s")
+                finally:
+                    await stream.aclose()
+
+                if first_token_time is not None:
+                    span.set_attribute("time_to_first_token_ms", first_token_time * 1000)
+                if self.metrics:
+                    self.metrics.record_llm_generation(time.perf_counter() - start_time, first_token_time)
+                self._record_usage(usage)
+
+    def stream_sql(self, question: str, schema_info: str = "",
+                   cancel_handle: Optional[CancellationHandle] = None,
+                   on_poll: Optional[Callable[[], Any]] = None,
+                   examples: Sequence[str] = ()) -> Iterator[str]:
+        """Version synchrone de astream_sql, alimentée par la boucle partagée"""
+        chunks: "queue.Queue" = queue.Queue()
+        done = object()
+
+        async def _pump():
+            try:
+                async for chunk in self.astream_sql(question, schema_info, examples):
+                    chunks.put(chunk)
+            except BaseException as e:
+                chunks.put(e)
+                raise
+            finally:
+                chunks.put(done)
+
+        future = async_runtime.submit(_pump())
+        if cancel_handle is not None:
+            cancel_handle.add_callback(future.cancel)
+        deadline = time.monotonic() + self.timeout
+        try:
+            while True:
+                # Attente par tranches : annulation et rappel on_poll entre deux fragments
+                try:
+                    item = chunks.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    if cancel_handle is not None:
+                        cancel_handle.raise_if_cancelled()
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"Génération SQL interrompue après {self.timeout}s")
+                    if on_poll:
+                        on_poll()
+                    continue
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    if cancel_handle is not None and cancel_handle.cancelled:
+                        raise OperationCancelledError("Génération SQL annulée")
+                    raise item
+                yield item
+        finally:
+            # Consommateur interrompu : on arrête la génération côté boucle
+            if not future.done():
+                future.cancel()
+
     def is_available(self) -> bool:
         """Vérifie si le LLM est disponible"""
         return self.llm is not None
 
+def create_fake_llm(responses=None, sleep: float = None):
+    """LLM factice en processus, compatible avec l'interface LangChain"""
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    return FakeListChatModel(responses=responses or [FAKE_SQL_RESPONSE], sleep=sleep)
+
 def init_llm():
     """Fonction legacy pour compatibilité"""
     return ChatGoogleGenerativeAI(
-        model="gemini-1.5-flash",
+        model=settings.llm_model,
         temperature=0,
         google_api_key=settings.google_api_key
     )
@@ -1,40 +1,170 @@
 """
 Logging structuré pour la production
+Les événements sont préparés sur le thread appelant (niveau, horodatage,
+contexte de trace) puis mis en file ; un thread d'écriture les rend en
+JSON et les écrit par lots, hors du chemin des requêtes
 """
 import structlog
+import atexit
 import logging
+import logging.handlers
+import queue
+import random
 import sys
+import threading
 from infrastructure.settings import settings
 
+_STOP = object()
+
+
+class EventSampler:
+    """Processeur structlog : ne conserve qu'une fraction des événements fréquents"""
+
+    def __init__(self, rate: float, events):
+        self.rate = rate
+        self.events = frozenset(events)
+
+    def __call__(self, logger, method_name, event_dict):
+        if method_name not in ("debug", "info") or event_dict.get("event") not in self.events:
+            return event_dict
+        # Décision par trace : les logs d'une même requête sont gardés ou écartés ensemble
+        trace_id = event_dict.get("trace_id")
+        draw = int(trace_id[:8], 16) / 0x100000000 if trace_id else random.random()
+        if draw >= self.rate:
+            raise structlog.DropEvent
+        return event_dict
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """Mise en file sans formatage (le rendu se fait dans le thread d'écriture)"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record)  # Avertissements et erreurs ne sont jamais perdus
+            else:
+                self.dropped += 1
+
+
+class LogWriter:
+    """Thread d'écriture : rend les événements en attente et les écrit en une fois"""
+
+    def __init__(self, handler: AsyncQueueHandler, formatter: logging.Formatter,
+                 stream, batch_size: int):
+        self.handler = handler
+        self.formatter = formatter
+        self.stream = stream
+        self.batch_size = batch_size
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+
+    def start(self) -> "LogWriter":
+        self._thread.start()
+        return self
+
+    def _run(self):
+        log_queue = self.handler.queue
+        while True:
+            batch = [log_queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(record is _STOP for record in batch)
+            self._write([record for record in batch if record is not _STOP])
+            if stop:
+                return
+
+    def _write(self, records):
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception:
+                self.handler.handleError(record)
+        if self.handler.dropped:
+            dropped, self.handler.dropped = self.handler.dropped, 0
+            lines.append(self.formatter.format(logging.LogRecord(
+                __name__, logging.WARNING, __file__, 0,
+                "Log queue full, %d events dropped", (dropped,), None
+            )))
+        if lines:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+
+    def stop(self, timeout: float = 2.0):
+        """Écrit les événements restants puis arrête le thread (sortie du processus)"""
+        self.handler.queue.put(_STOP)
+        self._thread.join(timeout)
+
+
 def setup_logging():
     """Configure structured logging"""
-    
+
+    renderer = structlog.processors.JSONRenderer() if settings.log_format == "json" else structlog.dev.ConsoleRenderer()
+
+    # Traitements sur le thread appelant : légers ou dépendants du contexte
+    processors = [
+        structlog.contextvars.merge_contextvars,  # trace_id / span_id du span courant
+        structlog.stdlib.filter_by_level,
+    ]
+    if settings.log_sample_rate < 1:
+        sampled = [event.strip() for event in settings.log_sampled_events.split(",") if event.strip()]
+        processors.append(EventSampler(settings.log_sample_rate, sampled))
+    processors += [
+        structlog.stdlib.add_logger_name,
+        structlog.stdlib.add_log_level,
+        structlog.stdlib.PositionalArgumentsFormatter(),
+        structlog.processors.TimeStamper(fmt="iso"),
+        structlog.processors.StackInfoRenderer(),
+        structlog.processors.format_exc_info,  # L'exception courante n'existe que sur ce thread
+        structlog.stdlib.ProcessorFormatter.wrap_for_formatter,
+    ]
+
     # Configuration de structlog
     structlog.configure(
+        processors=processors,
+        context_class=dict,
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+
+    # Rendu (thread d'écriture), aussi pour les logs des bibliothèques
+    formatter = structlog.stdlib.ProcessorFormatter(
         processors=[
-            structlog.stdlib.filter_by_level,
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            structlog.processors.UnicodeDecoder(),
+            renderer,
+        ],
+        foreign_pre_chain=[
             structlog.stdlib.add_logger_name,
             structlog.stdlib.add_log_level,
-            structlog.stdlib.PositionalArgumentsFormatter(),
             structlog.processors.TimeStamper(fmt="iso"),
-            structlog.processors.StackInfoRenderer(),
-            structlog.processors.format_exc_info,
-            structlog.processors.UnicodeDecoder(),
-            structlog.processors.JSONRenderer() if settings.log_format == "json" else structlog.dev.ConsoleRenderer()
         ],
-        context_class=dict,
-        logger_factory=structlog.stdlib.LoggerFactory(),
-        wrapper_class=structlog.stdlib.BoundLogger,
-        cache_logger_on_first_use=True,
     )
-    
+
     # Configuration du logging standard
-    logging.basicConfig(
-        format="%(message)s",
-        stream=sys.stdout,
-        level=getattr(logging, settings.log_level)
-    )
-    
+    if settings.log_async:
+        handler = AsyncQueueHandler(queue.Queue(maxsize=settings.log_queue_size))
+        writer = LogWriter(handler, formatter, sys.stdout, settings.log_batch_size).start()
+        atexit.register(writer.stop)
+    else:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(formatter)
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, settings.log_level))
+
     return structlog.get_logger()
 
 # Logger global
@@ -0,0 +1,195 @@
+"""
+Export des métriques au format OpenMetrics (Prometheus)
+Registre de collecteurs alimenté par les modules d'infrastructure, exposé
+par un petit serveur HTTP annexe et/ou un fichier réécrit périodiquement
+"""
+import os
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PREFIX = "texttosql_"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+@dataclass
+class MetricFamily:
+    """Famille de métriques OpenMetrics (counter, gauge, histogram, info...)"""
+    name: str
+    type: str
+    help: str = ""
+    unit: str = ""
+    samples: List[Tuple[str, Dict[str, str], float]] = field(default_factory=list)
+
+    def add(self, value: float, suffix: str = "", **labels) -> "MetricFamily":
+        """Ajoute un échantillon (suffixe _total, _count, _sum... selon le type)"""
+        self.samples.append((suffix, labels, value))
+        return self
+
+    def add_histogram(self, buckets: Iterable[Tuple[float, int]], total: float, **labels) -> "MetricFamily":
+        """Échantillons d'un histogramme : _bucket{le=...} cumulés, _count et _sum"""
+        count = 0
+        for bound, count in buckets:
+            self.add(count, "_bucket", **labels, le=_format_value(float(bound)))
+        self.add(count, "_count", **labels)
+        return self.add(total, "_sum", **labels)
+
+    def render(self) -> str:
+        name = PREFIX + self.name
+        lines = [f"# TYPE {name} {self.type}"]
+        if self.unit:
+            lines.append(f"# UNIT {name} {self.unit}")
+        if self.help:
+            lines.append(f"# HELP {name} {_escape(self.help)}")
+        for suffix, labels, value in self.samples:
+            label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            label_text = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{name}{suffix}{label_text} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+def counter(name: str, help: str, value: float, **labels) -> MetricFamily:
+    """Compteur monotone (échantillon <name>_total)"""
+    return MetricFamily(name, "counter", help).add(value, "_total", **labels)
+
+
+def gauge(name: str, help: str, value: float, **labels) -> MetricFamily:
+    """Valeur instantanée"""
+    return MetricFamily(name, "gauge", help).add(value, **labels)
+
+
+Collector = Callable[[], Iterable[MetricFamily]]
+
+
+class MetricsRegistry:
+    """Collecteurs nommés, interrogés à chaque export"""
+
+    def __init__(self):
+        self._collectors: Dict[str, Collector] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, collector: Collector):
+        """Enregistre (ou remplace) un collecteur"""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def unregister(self, name: str):
+        with self._lock:
+            self._collectors.pop(name, None)
+
+    def collect(self) -> List[MetricFamily]:
+        """Familles de tous les collecteurs (un collecteur en erreur est ignoré)"""
+        with self._lock:
+            collectors = list(self._collectors.items())
+        families: List[MetricFamily] = []
+        for name, collector in collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                logger.warning("Metrics collector failed", collector=name, error=str(e))
+        return families
+
+    def render(self) -> str:
+        """Exposition OpenMetrics complète"""
+        body = "\n".join(family.render() for family in self.collect())
+        return f"{body}\n# EOF\n" if body else "# EOF\n"
+
+
+class MetricsExporter:
+    """Serveur HTTP annexe (GET /metrics) et/ou fichier texte réécrit périodiquement"""
+
+    def __init__(self, registry: "MetricsRegistry" = None, port: int = None,
+                 host: str = None, dump_path: str = None, dump_interval: float = None):
+        self.registry = registry or metrics_registry
+        self.port = port if port is not None else settings.metrics_port
+        self.host = host or settings.metrics_host
+        self.dump_path = dump_path if dump_path is not None else settings.metrics_dump_path
+        self.dump_interval = dump_interval or settings.metrics_dump_interval
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._stop_event = threading.Event()
+
+    def start(self) -> "MetricsExporter":
+        """Démarre le serveur et l'écriture du fichier (selon la configuration)"""
+        if self.port:
+            self._start_server()
+        if self.dump_path:
+            threading.Thread(target=self._run_dump, name="metrics-dump", daemon=True).start()
+        return self
+
+    def _start_server(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Pas de journal par requête de scraping
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            # Port déjà pris (autre worker du même hôte) : export par fichier ou API seulement
+            logger.warning("Metrics listener unavailable", port=self.port, error=str(e))
+            return
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info("Metrics listener started", host=self.host, port=self.port)
+
+    def dump(self):
+        """Écrit l'exposition dans le fichier (remplacement atomique)"""
+        directory = os.path.dirname(os.path.abspath(self.dump_path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.dump_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.registry.render())
+        os.replace(tmp_path, self.dump_path)
+
+    def _run_dump(self):
+        while not self._stop_event.wait(self.dump_interval):
+            try:
+                self.dump()
+            except Exception as e:
+                logger.error("Metrics dump failed", path=self.dump_path, error=str(e))
+
+    def close(self):
+        """Arrête le serveur et l'écriture périodique"""
+        self._stop_event.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+# Instance globale : les modules y enregistrent leurs collecteurs
+metrics_registry = MetricsRegistry()
+
+
+def create_metrics_exporter() -> Optional[MetricsExporter]:
+    """Exportateur configuré (None si ni port ni fichier)"""
+    if not settings.metrics_port and not settings.metrics_dump_path:
+        return None
+    return MetricsExporter().start()
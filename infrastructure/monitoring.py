@@ -2,27 +2,80 @@
 Monitoring et métriques pour la production
 """
 import time
-import psutil
-from typing import Dict, Any
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List
 from infrastructure.logging import logger
 from infrastructure.settings import settings
+from infrastructure.latency import LatencyHistogram
+from infrastructure.metrics_export import MetricFamily, counter, gauge, metrics_registry
+from infrastructure.system_sampler import SystemSampler, system_sampler
+
+# Étapes suivies par un histogramme de latence
+LATENCY_STAGES = (
+    "request", "cache_lookup", "schema_retrieval", "prompt_build",
+    "llm", "validation", "execution",
+)
 
 class MetricsCollector:
     """Collecteur de métriques pour le monitoring"""
     
-    def __init__(self):
+    def __init__(self, sampler: SystemSampler = None):
         self.start_time = time.time()
+        self.system = sampler or system_sampler
         self.request_count = 0
         self.error_count = 0
         self.total_response_time = 0.0
         self.sql_generation_count = 0
         self.cache_hits = 0
         self.cache_misses = 0
+        self.cache_evictions = 0
+        self.cache_entries = 0
+        self.cache_bytes = 0
+        self.semantic_hits = 0
+        self.semantic_misses = 0
+        self.semantic_similarity_total = 0.0
+        self.semantic_similarity_last = 0.0
+        self.coalesced_requests = 0
+        self.llm_generation_count = 0
+        self.llm_generation_time = 0.0
+        self.llm_streamed_count = 0
+        self.llm_time_to_first_token = 0.0
+        self.prompt_count = 0
+        self.prompt_tokens = 0
+        self.prompt_tokens_max = 0
+        self.prompt_tokens_last = 0
+        self.prompt_truncated_count = 0
+        self.llm_input_tokens = 0
+        self.llm_output_tokens = 0
+        self.query_count = 0
+        self.query_rows = 0
+        self.query_time_to_first_batch = 0.0
+        self.query_completed_count = 0
+        self.result_cache_hits = 0
+        self.result_cache_misses = 0
+        self.latency = {stage: LatencyHistogram() for stage in LATENCY_STAGES}
+    
+    def record_latency(self, stage: str, seconds: float):
+        """Enregistre la durée d'une étape dans son histogramme"""
+        histogram = self.latency.get(stage)
+        if histogram is None:
+            histogram = self.latency.setdefault(stage, LatencyHistogram())
+        histogram.record(seconds)
+    
+    @contextmanager
+    def time_stage(self, stage: str) -> Iterator[None]:
+        """Mesure la durée du bloc pour l'étape donnée"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_latency(stage, time.perf_counter() - start)
     
     def record_request(self, response_time: float, success: bool = True):
         """Enregistre une requête"""
         self.request_count += 1
         self.total_response_time += response_time
+        self.record_latency("request", response_time)
         
         if not success:
             self.error_count += 1
@@ -44,17 +97,82 @@ class MetricsCollector:
         """Enregistre un miss cache"""
         self.cache_misses += 1
     
+    def record_cache_eviction(self, count: int = 1):
+        """Enregistre des évictions du cache"""
+        self.cache_evictions += count
+    
+    def set_cache_size(self, entries: int, size_bytes: int):
+        """Met à jour la taille courante du cache"""
+        self.cache_entries = entries
+        self.cache_bytes = size_bytes
+    
+    def record_semantic_hit(self, similarity: float):
+        """Enregistre un hit du cache sémantique avec sa similarité"""
+        self.semantic_hits += 1
+        self.semantic_similarity_total += similarity
+        self.semantic_similarity_last = similarity
+    
+    def record_semantic_miss(self, best_similarity: float):
+        """Enregistre un miss du cache sémantique (meilleure similarité trouvée)"""
+        self.semantic_misses += 1
+        self.semantic_similarity_total += best_similarity
+        self.semantic_similarity_last = best_similarity
+    
+    def record_coalesced_request(self):
+        """Enregistre une requête servie par un appel LLM déjà en cours"""
+        self.coalesced_requests += 1
+    
+    def record_llm_generation(self, total_time: float, time_to_first_token: float = None):
+        """Enregistre la durée d'un appel LLM (et le délai du premier token en streaming)"""
+        self.llm_generation_count += 1
+        self.llm_generation_time += total_time
+        self.record_latency("llm", total_time)
+        if time_to_first_token is not None:
+            self.llm_streamed_count += 1
+            self.llm_time_to_first_token += time_to_first_token
+    
+    def record_prompt(self, tokens: int, truncated: bool = False):
+        """Enregistre la taille (tokens estimés) d'un prompt envoyé au LLM"""
+        self.prompt_count += 1
+        self.prompt_tokens += tokens
+        self.prompt_tokens_last = tokens
+        self.prompt_tokens_max = max(self.prompt_tokens_max, tokens)
+        if truncated:
+            self.prompt_truncated_count += 1
+    
+    def record_llm_tokens(self, input_tokens: int, output_tokens: int):
+        """Enregistre les tokens facturés d'un appel LLM (usage renvoyé par le fournisseur)"""
+        self.llm_input_tokens += input_tokens
+        self.llm_output_tokens += output_tokens
+    
+    def record_query(self):
+        """Enregistre l'exécution d'une requête (curseur ouvert)"""
+        self.query_count += 1
+    
+    def record_query_rows(self, rows: int, time_to_first_batch: float = None):
+        """Enregistre les lignes lues par un curseur fermé et le délai du premier lot"""
+        self.query_completed_count += 1
+        self.query_rows += rows
+        if time_to_first_batch is not None:
+            self.query_time_to_first_batch += time_to_first_batch
+            self.record_latency("execution", time_to_first_batch)
+    
+    def record_result_cache_hit(self):
+        """Enregistre un résultat de requête servi par le cache"""
+        self.result_cache_hits += 1
+    
+    def record_result_cache_miss(self):
+        """Enregistre un résultat de requête absent du cache"""
+        self.result_cache_misses += 1
+    
     def get_metrics(self) -> Dict[str, Any]:
         """Retourne les métriques actuelles"""
         uptime = time.time() - self.start_time
         avg_response_time = self.total_response_time / self.request_count if self.request_count > 0 else 0
         
-        # Métriques système
-        memory_usage = psutil.virtual_memory()
-        cpu_usage = psutil.cpu_percent()
-        
         # Métriques cache
         cache_hit_rate = self.cache_hits / (self.cache_hits + self.cache_misses) if (self.cache_hits + self.cache_misses) > 0 else 0
+        semantic_lookups = self.semantic_hits + self.semantic_misses
         
         return {
             "uptime_seconds": uptime,
@@ -63,79 +181,176 @@ class MetricsCollector:
             "error_rate": self.error_count / self.request_count if self.request_count > 0 else 0,
             "avg_response_time": avg_response_time,
             "sql_generations_total": self.sql_generation_count,
+            "coalesced_requests_total": self.coalesced_requests,
+            "llm": {
+                "generations_total": self.llm_generation_count,
+                "avg_generation_time": self.llm_generation_time / self.llm_generation_count if self.llm_generation_count > 0 else 0,
+                "avg_time_to_first_token": self.llm_time_to_first_token / self.llm_streamed_count if self.llm_streamed_count > 0 else 0,
+                "input_tokens_total": self.llm_input_tokens,
+                "output_tokens_total": self.llm_output_tokens
+            },
+            "prompts": {
+                "built_total": self.prompt_count,
+                "avg_tokens": self.prompt_tokens / self.prompt_count if self.prompt_count > 0 else 0,
+                "max_tokens": self.prompt_tokens_max,
+                "last_tokens": self.prompt_tokens_last,
+                "truncated_total": self.prompt_truncated_count
+            },
+            "queries": {
+                "executed_total": self.query_count,
+                "rows_fetched_total": self.query_rows,
+                "avg_time_to_first_batch": self.query_time_to_first_batch / self.query_completed_count if self.query_completed_count > 0 else 0,
+                "result_cache_hits": self.result_cache_hits,
+                "result_cache_misses": self.result_cache_misses
+            },
             "cache_hits": self.cache_hits,
             "cache_misses": self.cache_misses,
             "cache_hit_rate": cache_hit_rate,
-            "system": {
-                "memory_usage_percent": memory_usage.percent,
-                "memory_available_mb": memory_usage.available / (1024 * 1024),
-                "cpu_usage_percent": cpu_usage
-            }
+            "cache_evictions": self.cache_evictions,
+            "cache_entries": self.cache_entries,
+            "cache_bytes": self.cache_bytes,
+            "semantic_cache": {
+                "hits": self.semantic_hits,
+                "misses": self.semantic_misses,
+                "hit_rate": self.semantic_hits / semantic_lookups if semantic_lookups > 0 else 0,
+                "avg_similarity": self.semantic_similarity_total / semantic_lookups if semantic_lookups > 0 else 0,
+                "last_similarity": self.semantic_similarity_last
+            },
+            "latency": {stage: histogram.snapshot() for stage, histogram in self.latency.items()},
+            "system": self._system_metrics()
         }
     
-    def health_check(self) -> Dict[str, Any]:
+    def _system_metrics(self) -> Dict[str, Any]:
+        """Dernier relevé système (échantillonné en arrière-plan)"""
+        current = self.system.latest()
+        if current is None:
+            return {}
+        return {
+            "memory_usage_percent": current.memory_percent,
+            "memory_available_mb": current.memory_available_mb,
+            "cpu_usage_percent": current.cpu_percent,
+            "sampled_at": current.timestamp
+        }
+    
+    def openmetrics_families(self) -> List[MetricFamily]:
+        """Compteurs, jauges et latences au format OpenMetrics"""
+        families = [
+            gauge("uptime_seconds", "Process uptime", time.time() - self.start_time),
+            counter("requests", "Handled requests", self.request_count),
+            counter("request_errors", "Failed requests", self.error_count),
+            counter("sql_generations", "SQL generations sent to the LLM", self.sql_generation_count),
+            counter("coalesced_requests", "Requests served by an in-flight LLM call", self.coalesced_requests),
+            counter("cache_hits", "Answer cache hits", self.cache_hits),
+            counter("cache_misses", "Answer cache misses", self.cache_misses),
+            counter("cache_evictions", "Answer cache evictions", self.cache_evictions),
+            gauge("cache_entries", "Answer cache entries", self.cache_entries),
+            gauge("cache_bytes", "Answer cache size in bytes", self.cache_bytes),
+            counter("semantic_cache_hits", "Semantic cache hits", self.semantic_hits),
+            counter("semantic_cache_misses", "Semantic cache misses", self.semantic_misses),
+            counter("llm_generations", "LLM calls", self.llm_generation_count),
+            counter("llm_generation_seconds", "Time spent in LLM calls", self.llm_generation_time),
+            counter("prompts", "Prompts built", self.prompt_count),
+            counter("prompt_tokens", "Estimated prompt tokens", self.prompt_tokens),
+            counter("prompts_truncated", "Prompts truncated to fit the token budget", self.prompt_truncated_count),
+            MetricFamily("llm_tokens", "counter", "Tokens reported by the LLM provider")
+                .add(self.llm_input_tokens, "_total", direction="input")
+                .add(self.llm_output_tokens, "_total", direction="output"),
+            counter("queries", "Query cursors opened", self.query_count),
+            counter("query_rows", "Rows fetched from query cursors", self.query_rows),
+            counter("result_cache_hits", "Query result cache hits", self.result_cache_hits),
+            counter("result_cache_misses", "Query result cache misses", self.result_cache_misses),
+        ]
+        
+        # Latences : seaux cumulés à bornes fixes (agrégeables entre workers et instances)
+        latency = MetricFamily("stage_latency_seconds", "histogram", "Latency per stage", unit="seconds")
+        for stage, histogram in self.latency.items():
+            latency.add_histogram(histogram.buckets(), histogram.total_sum, stage=stage)
+        families.append(latency)
+        return families
+    
+    def health_check(self, database=None) -> Dict[str, Any]:
         """Retourne l'état de santé du système avec statut global"""
-        memory = psutil.virtual_memory()
-        cpu_percent = psutil.cpu_percent()
+        current = self.system.latest()
+        trend = self.system.rolling()
+        
+        # CPU : moyenne glissante (un pic isolé ne dégrade pas le service) ;
+        # mémoire : dernier relevé. Avant le premier relevé, pas de verdict
+        memory_percent = current.memory_percent if current is not None else 0.0
+        cpu_percent = trend.get("cpu_avg", current.cpu_percent if current is not None else 0.0)
         
         # Détermine le statut global
-        memory_healthy = memory.percent < 80
+        memory_healthy = memory_percent < 80
         cpu_healthy = cpu_percent < 80
         error_rate = self.error_count / self.request_count if self.request_count > 0 else 0
         error_rate_healthy = error_rate < 0.1  # Moins de 10% d'erreurs
         
-        overall_healthy = memory_healthy and cpu_healthy and error_rate_healthy
+        # Base en cours de connexion ou indisponible : service dégradé
+        database_status = database.status() if database is not None else None
+        database_healthy = database_status is None or database_status["ready"]
+        
+        overall_healthy = memory_healthy and cpu_healthy and error_rate_healthy and database_healthy
         
         if overall_healthy:
             status = "healthy"
-        elif memory.percent > 90 or cpu_percent > 90 or error_rate > 0.2:
+        elif memory_percent > 90 or cpu_percent > 90 or error_rate > 0.2:
             status = "unhealthy"
         else:
             status = "degraded"
         
+        checks = {
+            "memory": {
+                "healthy": memory_healthy,
+                "usage_percent": memory_percent,
+                "trend_percent": trend.get("memory_trend", 0.0)
+            },
+            "cpu": {
+                "healthy": cpu_healthy,
+                "usage_percent": current.cpu_percent if current is not None else 0.0,
+                "avg_percent": cpu_percent,
+                "max_percent": trend.get("cpu_max", 0.0)
+            },
+            "error_rate": {
+                "healthy": error_rate_healthy,
+                "rate": error_rate
+            }
+        }
+        if current is None:
+            checks["memory"]["pending"] = checks["cpu"]["pending"] = True
+        if database_status is not None:
+            checks["database"] = {"healthy": database_healthy, **database_status}
+        
         return {
             "status": status,
-            "checks": {
-                "memory": {
-                    "healthy": memory_healthy,
-                    "usage_percent": memory.percent
-                },
-                "cpu": {
-                    "healthy": cpu_healthy,
-                    "usage_percent": cpu_percent
-                },
-                "error_rate": {
-                    "healthy": error_rate_healthy,
-                    "rate": error_rate
-                }
-            },
+            "checks": checks,
             "uptime_seconds": time.time() - self.start_time
         }
 
 # Instance globale
 metrics = MetricsCollector()
+metrics_registry.register("app", metrics.openmetrics_families)
 
 def get_system_health() -> Dict[str, Any]:
-    """Retourne l'état de santé du système"""
-    memory = psutil.virtual_memory()
-    disk = psutil.disk_usage('/')
+    """Retourne l'état de santé du système (dernier relevé en arrière-plan)"""
+    current = system_sampler.latest()
+    if current is None:
+        return {"healthy": True, "checks": {}, "pending": True}
     
     return {
         "healthy": True,
         "checks": {
             "memory": {
-                "status": "healthy" if memory.percent < 80 else "warning",
-                "usage_percent": memory.percent,
-                "available_mb": memory.available / (1024 * 1024)
+                "status": "healthy" if current.memory_percent < 80 else "warning",
+                "usage_percent": current.memory_percent,
+                "available_mb": current.memory_available_mb
             },
             "disk": {
-                "status": "healthy" if disk.percent < 80 else "warning",
-                "usage_percent": disk.percent,
-                "free_gb": disk.free / (1024 * 1024 * 1024)
+                "status": "healthy" if current.disk_percent < 80 else "warning",
+                "usage_percent": current.disk_percent,
+                "free_gb": current.disk_free_gb
             },
             "cpu": {
                 "status": "healthy",
-                "usage_percent": psutil.cpu_percent()
+                "usage_percent": current.cpu_percent
             }
         }
     }
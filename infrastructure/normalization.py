@@ -0,0 +1,114 @@
+"""
+Normalisation des questions en langage naturel
+Produit une forme canonique utilisée pour les clés de cache
+"""
+import re
+import unicodedata
+from typing import Optional, FrozenSet, Dict
+
+# Mots vides par langue : on ne retire que des mots sans impact sur le sens
+# de la requête (pas de négations, quantificateurs ni prépositions de filtre)
+STOPWORDS: Dict[str, FrozenSet[str]] = {
+    'fr': frozenset({
+        'le', 'la', 'les', 'l', 'un', 'une', 'des', 'du', 'de', 'd',
+        'nous', 'on', 'vous', 'je', 'j', 'il', 'elle', 'ils', 'elles',
+        'est', 'sont', 'ce', 'c', 'ça', 'qu', 'que',
+        'avons', 'avez', 'ont', 'a', 'y', 'moi', 'me', 'm',
+        'donne', 'donner', 'montre', 'montrer', 'affiche', 'afficher',
+        'quel', 'quelle', 'quels', 'quelles', 'svp', 'stp',
+    }),
+    'en': frozenset({
+        'the', 'a', 'an', 'do', 'does', 'did', 'we', 'you', 'i', 'is',
+        'are', 'was', 'were', 'have', 'has', 'of', 'me', 'us', 'our', 's',
+        'please', 'show', 'give', 'list', 'what', 'which', 'there',
+    }),
+    # Le japonais ne sépare pas les mots : on ne retire que les terminaisons
+    # de politesse et particules interrogatives en fin de phrase
+    'ja': frozenset({
+        'ですか', 'ますか', 'でしょうか', 'ください', 'を教えて', '教えて',
+        'は', 'か', 'です',
+    }),
+}
+
+# Incrémentée à chaque changement de la forme canonique (clés de cache persistées)
+NORMALIZATION_VERSION = 2
+
+_APOSTROPHES = re.compile(r"[’‘ʼ`´]")
+# Ponctuation de phrase seulement (le point décimal est conservé) : les
+# opérateurs et signes (<, >, =, !=, -, +, %) portent le sens du filtre
+_PUNCTUATION = re.compile(r"[?¿,;:\"«»“”„「」『』()\[\]{}…、。・]|!(?!=)|(?<!\d)\.|\.(?!\d)")
+_SYMBOLS = re.compile(r"[<>=!]+|[^\w\s'.]")
+_WHITESPACE = re.compile(r"\s+")
+_JAPANESE = re.compile(r"[぀-ヿ一-鿿]")
+
+
+_FRENCH_MARKERS = frozenset({
+    'le', 'la', 'les', 'des', 'du', 'de', 'un', 'une', 'et', 'ce', 'cette',
+    'ces', 'par', 'pour', 'sur', 'avec', 'dans', 'combien', 'quel', 'quelle',
+    'quels', 'quelles', 'sont', 'est', 'nous', 'avons', 'mois', 'année',
+})
+_ENGLISH_MARKERS = frozenset({
+    'the', 'of', 'and', 'this', 'that', 'by', 'for', 'with', 'in', 'how',
+    'many', 'what', 'which', 'are', 'is', 'we', 'do', 'month', 'year', 'week',
+})
+
+
+def detect_language(text: str) -> str:
+    """Détection grossière de la langue (fr, en, ja) par mots marqueurs"""
+    if _JAPANESE.search(text):
+        return 'ja'
+    if re.search(r"[àâçéèêëîïôûùüÿœ]", text):
+        return 'fr'
+    words = re.findall(r"\w+", text.casefold())
+    french = sum(word in _FRENCH_MARKERS for word in words)
+    english = sum(word in _ENGLISH_MARKERS for word in words)
+    return 'fr' if french > english else 'en'
+
+
+def _strip_japanese_suffixes(text: str) -> str:
+    """Retire les terminaisons de politesse japonaises en fin de phrase"""
+    suffixes = sorted(STOPWORDS['ja'], key=len, reverse=True)
+    changed = True
+    while changed and text:
+        changed = False
+        for suffix in suffixes:
+            if text.endswith(suffix) and len(text) > len(suffix):
+                text = text[:-len(suffix)].rstrip()
+                changed = True
+                break
+    return text
+
+
+def normalize_question(question: str, language: Optional[str] = None) -> str:
+    """
+    Normalise une question pour la mise en cache
+
+    Args:
+        question: Question brute saisie par l'utilisateur
+        language: Code de langue ('fr', 'en', 'ja'), détecté si absent
+
+    Returns:
+        Forme canonique (NFKC, casefold, ponctuation de phrase retirée,
+        opérateurs et signes isolés en mots, espaces réduits, mots vides retirés)
+    """
+    text = unicodedata.normalize("NFKC", question or "").casefold()
+    text = _APOSTROPHES.sub("'", text)
+    text = _PUNCTUATION.sub(" ", text)
+    text = _SYMBOLS.sub(r" \g<0> ", text)
+    text = _WHITESPACE.sub(" ", text).strip()
+
+    if not text:
+        return ""
+
+    language = language if language in STOPWORDS else detect_language(text)
+
+    if language == 'ja':
+        return _strip_japanese_suffixes(text.replace(" ", ""))
+
+    # Élisions françaises (d'utilisateurs -> d utilisateurs) et possessifs anglais
+    tokens = text.replace("'", " ").split()
+    stopwords = STOPWORDS[language]
+    kept = [token for token in tokens if token not in stopwords]
+
+    # On ne vide jamais complètement une question
+    return " ".join(kept or tokens)
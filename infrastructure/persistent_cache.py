@@ -0,0 +1,222 @@
+"""
+Cache persistant sur disque (SQLite) partagé entre processus
+Survit aux redémarrages ; écritures différées et groupées (write-behind)
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+
+
+class PersistentCache:
+    """Second niveau de cache (SQLite en mode WAL) avec la même API get/set"""
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cache_entries (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """
+
+    def __init__(self, path: str = None, flush_interval: float = None,
+                 batch_size: int = None):
+        self.path = path or settings.cache_persistent_path
+        self.flush_interval = flush_interval or settings.cache_write_behind_interval
+        self.batch_size = batch_size or settings.cache_write_behind_batch_size
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        # Écritures en attente : la dernière valeur d'une clé l'emporte
+        self._pending: Dict[str, Tuple[str, float]] = {}
+        self._pending_lock = threading.Lock()
+        # Tenu pendant l'écriture d'un lot : une suppression attend la fin
+        # du lot en cours plutôt que d'être écrasée par lui
+        self._flush_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._local = threading.local()
+        # Connexions ouvertes par thread (fermées à la sortie du thread ou à l'arrêt)
+        self._connections: Dict[threading.Thread, sqlite3.Connection] = {}
+        self._connections_lock = threading.Lock()
+        self._last_purge = 0.0
+
+        with self._connection() as conn:
+            conn.execute(self._SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache_entries (expires_at)")
+
+        self._writer = threading.Thread(target=self._run_writer, name="cache-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+        logger.info("Persistent cache initialized", path=self.path)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connexion SQLite propre au thread courant"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Utilisée par ce seul thread, mais fermée par close() ou par un autre thread
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            # WAL : lecteurs et écrivain de plusieurs processus sans blocage mutuel
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._close_connections(dead_only=True)
+                self._connections[threading.current_thread()] = conn
+        return conn
+
+    def _close_connections(self, dead_only: bool = False):
+        """Ferme les connexions des threads terminés (ou toutes) ; verrou détenu"""
+        for thread, conn in list(self._connections.items()):
+            if dead_only and thread.is_alive():
+                continue
+            del self._connections[thread]
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logger.debug("Persistent cache connection close failed", error=str(e))
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Retourne (valeur, expires_at) ou None si absente ou expirée"""
+        now = time.time()
+
+        with self._pending_lock:
+            pending = self._pending.get(key)
+        if pending is not None:
+            payload, expires_at = pending
+        else:
+            try:
+                row = self._connection().execute(
+                    "SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.error("Persistent cache read failed", error=str(e))
+                return None
+            if row is None:
+                return None
+            payload, expires_at = row
+
+        if expires_at <= now:
+            return None
+        return json.loads(payload), expires_at
+
+    def get(self, key: str) -> Optional[Any]:
+        """Récupère une valeur du cache persistant"""
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def set(self, key: str, value: Any, ttl: int = None) -> bool:
+        """Planifie l'écriture d'une valeur (sérialisable en JSON)"""
+        ttl = ttl or settings.cache_ttl
+        try:
+            payload = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError):
+            logger.debug("Value not JSON serializable, not persisted", key=key)
+            return False
+
+        with self._pending_lock:
+            self._pending[key] = (payload, time.time() + ttl)
+            if len(self._pending) >= self.batch_size:
+                self._flush_event.set()
+        return True
+
+    def delete(self, key: str) -> bool:
+        """Supprime une entrée (écriture immédiate, après le lot en cours d'écriture)"""
+        with self._flush_lock:
+            with self._pending_lock:
+                self._pending.pop(key, None)
+            try:
+                self._connection().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                return True
+            except sqlite3.Error as e:
+                logger.error("Persistent cache delete failed", error=str(e))
+                return False
+
+    def flush(self) -> int:
+        """Écrit les entrées en attente en une seule transaction"""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        """Écriture d'un lot (verrou d'écriture détenu)"""
+        with self._pending_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+
+        rows = [(key, payload, expires_at) for key, (payload, expires_at) in batch.items()]
+        conn = self._connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+                rows
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            # Remet le lot en attente sans écraser des valeurs plus récentes
+            with self._pending_lock:
+                for key, value in batch.items():
+                    self._pending.setdefault(key, value)
+            logger.error("Persistent cache flush failed", error=str(e), batch=len(rows))
+            return 0
+        return len(rows)
+
+    def purge_expired(self) -> int:
+        """Supprime les entrées expirées du disque"""
+        try:
+            cursor = self._connection().execute(
+                "DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),)
+            )
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            logger.error("Persistent cache purge failed", error=str(e))
+            return 0
+
+    def _run_writer(self):
+        """Boucle du thread d'écriture différée"""
+        while not self._stop_event.is_set():
+            self._flush_event.wait(self.flush_interval)
+            self._flush_event.clear()
+            try:
+                self.flush()
+                with self._connections_lock:
+                    self._close_connections(dead_only=True)
+                if time.time() - self._last_purge > settings.cache_expiry_interval:
+                    self.purge_expired()
+                    self._last_purge = time.time()
+            except Exception as e:
+                logger.error("Persistent cache writer failed", error=str(e))
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistiques du cache persistant"""
+        with self._pending_lock:
+            pending = len(self._pending)
+        try:
+            entries = self._connection().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        return {"path": self.path, "entries": entries, "pending_writes": pending}
+
+    def close(self):
+        """Vide le tampon d'écriture et arrête le thread"""
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        self._flush_event.set()
+        self._writer.join(timeout=5)
+        self.flush()
+        with self._flush_lock, self._connections_lock:
+            self._close_connections()
+        # Un accès tardif (atexit) rouvre une connexion neuve
+        self._local = threading.local()
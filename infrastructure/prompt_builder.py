@@ -0,0 +1,170 @@
+"""
+Construction des prompts de génération SQL avec budget de tokens
+Les parties fixes du gabarit sont comptées une seule fois ; question,
+schéma et exemples se partagent le reste du budget, par ordre de priorité
+"""
+import math
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Sequence, Tuple, Union
+from infrastructure.settings import settings
+
+# Découpage proche d'un tokenizer sous-mots (SentencePiece) : idéogrammes,
+# suites de lettres, groupes de chiffres, ponctuation
+_CJK = "぀-ヿ㐀-鿿가-힯"
+_PIECE = re.compile(rf"[{_CJK}]|[^\W\d_{_CJK}]+|\d{{1,3}}|[^\w\s]|_")
+# Caractères latins par token pour un mot (moyenne observée, identifiants compris)
+_CHARS_PER_TOKEN = 4
+_ELLIPSIS = " …"
+
+
+def _piece_tokens(piece: str) -> int:
+    if piece[0].isalpha() and len(piece) > _CHARS_PER_TOKEN:
+        return math.ceil(len(piece) / _CHARS_PER_TOKEN)
+    return 1
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """Estimation du nombre de tokens d'un texte (sans appel au modèle)"""
+    return sum(_piece_tokens(match.group()) for match in _PIECE.finditer(text or ""))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Coupe un texte au dernier fragment qui tient dans max_tokens (points de suspension compris)"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    used = 0
+    end = 0
+    for match in _PIECE.finditer(text):
+        used += _piece_tokens(match.group())
+        if used > max_tokens - 1:
+            break
+        end = match.end()
+    return text[:end].rstrip() + _ELLIPSIS
+
+
+class PromptTemplate:
+    """Gabarit de prompt dont les parties fixes sont comptées une fois pour toutes"""
+
+    def __init__(self, instructions: str, question_label: str, schema_label: str,
+                 examples_label: str, footer: str):
+        self.instructions = instructions
+        self.question_label = question_label
+        self.schema_label = schema_label
+        self.examples_label = examples_label
+        self.footer = footer
+        self.fixed_tokens = sum(
+            count_tokens(part) for part in (instructions, question_label, schema_label, footer)
+        )
+        self.examples_label_tokens = count_tokens(examples_label)
+
+    def render(self, question: str, schema: Sequence[str], examples: Sequence[str]) -> str:
+        """Assemble le prompt (sections déjà retenues par le budget)"""
+        parts = [self.instructions, "", f"{self.question_label} {question}", "",
+                 self.schema_label, *schema]
+        if examples:
+            parts += ["", self.examples_label, *examples]
+        parts += ["", self.footer]
+        return "\n".join(parts)
+
+
+SQL_TEMPLATE = PromptTemplate(
+    instructions="Convertis cette question en requête SQL valide.",
+    question_label="Question :",
+    schema_label="Schéma de base de données (tables les plus pertinentes d'abord) :",
+    examples_label="Exemples de questions et de requêtes SQL :",
+    footer="Réponds uniquement avec la requête SQL, sans explication.",
+)
+
+
+@dataclass
+class Prompt:
+    """Prompt construit et répartition de son budget"""
+    text: str
+    tokens: int
+    question_tokens: int
+    schema_tokens: int
+    example_tokens: int
+    dropped_schema: int = 0
+    dropped_examples: int = 0
+    question_truncated: bool = False
+
+    @property
+    def truncated(self) -> bool:
+        return bool(self.dropped_schema or self.dropped_examples or self.question_truncated)
+
+
+def _fit(sections: Sequence[str], budget: int, truncate_first: bool = False) -> Tuple[List[str], int]:
+    """Sections retenues dans l'ordre de priorité jusqu'à épuisement du budget"""
+    kept: List[str] = []
+    used = 0
+    for section in sections:
+        tokens = count_tokens(section)
+        if used + tokens > budget:
+            # La section la plus pertinente est tronquée plutôt qu'omise
+            if not kept and truncate_first and budget > 0:
+                section = truncate_to_tokens(section, budget)
+                kept.append(section)
+                used = count_tokens(section)
+            break
+        kept.append(section)
+        used += tokens
+    return kept, used
+
+
+class PromptBuilder:
+    """Construit des prompts sous un plafond de tokens configurable"""
+
+    def __init__(self, template: PromptTemplate = SQL_TEMPLATE, max_tokens: int = None,
+                 question_max_tokens: int = None, examples_max_tokens: int = None):
+        self.template = template
+        self.max_tokens = max_tokens or settings.prompt_max_tokens
+        self.question_max_tokens = question_max_tokens or settings.prompt_question_max_tokens
+        self.examples_max_tokens = examples_max_tokens or settings.prompt_examples_max_tokens
+
+    def build(self, question: str, schema: Union[str, Sequence[str]] = "",
+              examples: Sequence[str] = ()) -> Prompt:
+        """
+        Construit le prompt : question (plafonnée), puis tables du schéma par
+        pertinence, puis exemples dans leur part réservée et le budget restant
+        """
+        available = max(self.max_tokens - self.template.fixed_tokens, 0)
+        # La question n'occupe jamais plus de la moitié du budget disponible
+        question_limit = min(self.question_max_tokens, available // 2)
+        question = (question or "").strip()
+        question_tokens = count_tokens(question)
+        question_truncated = question_tokens > question_limit
+        if question_truncated:
+            question = truncate_to_tokens(question, question_limit)
+            question_tokens = count_tokens(question)
+
+        # Schéma en texte : une ligne par table, déjà triées par pertinence
+        sections = schema.splitlines() if isinstance(schema, str) else list(schema)
+        sections = [section.rstrip() for section in sections if section.strip()]
+        examples = [example.strip() for example in examples if example and example.strip()]
+
+        budget = available - question_tokens
+        reserved = 0
+        if examples:
+            wanted = self.template.examples_label_tokens + sum(count_tokens(e) for e in examples)
+            reserved = min(self.examples_max_tokens, wanted, budget // 2)
+
+        kept_schema, schema_tokens = _fit(sections, budget - reserved, truncate_first=True)
+        example_budget = budget - schema_tokens - self.template.examples_label_tokens
+        kept_examples, example_tokens = _fit(examples, min(example_budget, self.examples_max_tokens))
+        if kept_examples:
+            example_tokens += self.template.examples_label_tokens
+
+        text = self.template.render(question, kept_schema, kept_examples)
+        return Prompt(
+            text=text,
+            tokens=self.template.fixed_tokens + question_tokens + schema_tokens + example_tokens,
+            question_tokens=question_tokens,
+            schema_tokens=schema_tokens,
+            example_tokens=example_tokens,
+            dropped_schema=len(sections) - len(kept_schema),
+            dropped_examples=len(examples) - len(kept_examples),
+            question_truncated=question_truncated,
+        )
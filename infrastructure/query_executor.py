@@ -0,0 +1,236 @@
+"""
+Exécution des requêtes SELECT validées avec curseurs serveur
+Les lignes sont lues par lots (curseurs nommés psycopg2) : seule la page
+affichée est rapatriée, « charger plus » reprend sur le même curseur
+"""
+import threading
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+from infrastructure.monitoring import metrics
+from infrastructure.metrics_export import MetricFamily, gauge, metrics_registry
+from infrastructure.sql_analysis import validate_select
+from infrastructure.query_guard import GuardResult, QueryGuard
+from infrastructure.cancellation import CancellationHandle
+from infrastructure.tracing import tracer
+
+
+class QueryCursor:
+    """Curseur serveur ouvert sur une requête, lu par lots"""
+
+    def __init__(self, connection, sql: str, batch_size: int, on_close=None,
+                 guard: Optional[GuardResult] = None):
+        self.id = uuid.uuid4().hex
+        self.sql = sql
+        self.guard = guard
+        self.batch_size = batch_size
+        self.columns: List[str] = []
+        self.rows_fetched = 0
+        self.exhausted = False
+        self.closed = False
+        self.started_at = time.perf_counter()
+        self.time_to_first_batch: Optional[float] = None
+        self.last_used = time.monotonic()
+        self._connection = connection
+        self._on_close = on_close
+        self._lock = threading.Lock()
+
+        # Curseur nommé : DECLARE ... CURSOR côté serveur, rien n'est rapatrié ici
+        self._cursor = connection.cursor(name=f"texttosql_{self.id}")
+        self._cursor.itersize = batch_size
+        self._cursor.execute(sql)
+
+    @property
+    def has_more(self) -> bool:
+        """Des lignes restent à lire (curseur ni épuisé ni fermé)"""
+        return not self.exhausted and not self.closed
+
+    def _fetch_batch(self, size: int) -> List[tuple]:
+        with self._lock:
+            if self.exhausted or self.closed:
+                return []
+            with tracer.span("db_fetch", cursor_id=self.id) as span:
+                rows = self._cursor.fetchmany(size)
+                span.set_attribute("rows", len(rows))
+            if not self.columns and self._cursor.description:
+                self.columns = [column[0] for column in self._cursor.description]
+            if self.time_to_first_batch is None:
+                self.time_to_first_batch = time.perf_counter() - self.started_at
+            self.rows_fetched += len(rows)
+            self.last_used = time.monotonic()
+            if len(rows) < size:
+                self.exhausted = True
+            return rows
+
+    def fetch(self, max_rows: Optional[int] = None) -> Iterator[List[tuple]]:
+        """
+        Lit au plus max_rows lignes, lot par lot
+
+        Args:
+            max_rows: Nombre de lignes de la page (None = jusqu'à la fin)
+
+        Yields:
+            Lots de lignes (tuples), au plus batch_size par lot
+        """
+        remaining = max_rows
+        try:
+            while self.has_more and (remaining is None or remaining > 0):
+                size = self.batch_size if remaining is None else min(self.batch_size, remaining)
+                rows = self._fetch_batch(size)
+                if rows:
+                    yield rows
+                if remaining is not None:
+                    remaining -= len(rows)
+        finally:
+            # Résultat entièrement lu : la connexion retourne au pool
+            if self.exhausted:
+                self.close()
+
+    def cancel(self):
+        """Interrompt la requête en cours côté serveur puis libère la connexion"""
+        if self.closed:
+            return
+        _cancel_backend(self._connection)
+        self.close()
+
+    def close(self):
+        """Ferme le curseur et rend la connexion au pool"""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            try:
+                self._cursor.close()
+                self._connection.rollback()
+            except Exception as e:
+                logger.warning("Query cursor close failed", cursor_id=self.id, error=str(e))
+            finally:
+                self._connection.close()
+        if self._on_close:
+            self._on_close(self)
+
+
+def _cancel_backend(connection):
+    """Annulation psycopg2 de la requête en cours sur une connexion (pg_cancel_backend)"""
+    dbapi_connection = getattr(connection, "dbapi_connection", connection)
+    try:
+        dbapi_connection.cancel()
+    except Exception as e:
+        logger.warning("Query cancel request failed", error=str(e))
+
+
+class QueryExecutor:
+    """Exécute les SELECT validés et suit les curseurs ouverts"""
+
+    def __init__(self, db_manager=None, metrics=None, guard: QueryGuard = None):
+        self._db_manager = db_manager
+        self.metrics = metrics
+        self.guard = guard or QueryGuard()
+        self._cursors: Dict[str, QueryCursor] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def db_manager(self):
+        if self._db_manager is None:
+            from infrastructure.database import db_manager
+            self._db_manager = db_manager
+        return self._db_manager
+
+    def execute(self, sql: str, batch_size: int = None,
+                cancel_handle: Optional[CancellationHandle] = None) -> QueryCursor:
+        """
+        Ouvre un curseur serveur sur une requête SELECT
+        (une poignée d'annulation interrompt la requête et libère la connexion)
+
+        Raises:
+            ValueError: Requête invalide ou non autorisée
+            QueryRejectedError: Plan estimé au-delà des seuils
+        """
+        error = validate_select(sql)
+        if error:
+            raise ValueError(error)
+
+        self.purge_idle()
+        with self._lock:
+            if len(self._cursors) >= settings.query_max_open_cursors:
+                oldest = min(self._cursors.values(), key=lambda c: c.last_used)
+            else:
+                oldest = None
+        if oldest is not None:
+            logger.info("Closing least recently used query cursor", cursor_id=oldest.id)
+            oldest.close()
+
+        with tracer.span("db_execute") as span:
+            self.db_manager.get_db()  # Connexion à la demande si le préchauffage n'est pas fini
+            connection = self.db_manager.engine.raw_connection()
+            if cancel_handle is not None:
+                cancel_handle.add_callback(lambda: _cancel_backend(connection))
+            try:
+                # LIMIT, statement_timeout et EXPLAIN dans la transaction du curseur
+                guard_result = self.guard.prepare(connection, sql)
+                cursor = QueryCursor(
+                    connection, guard_result.sql,
+                    batch_size or settings.query_batch_size,
+                    on_close=self._forget,
+                    guard=guard_result
+                )
+            except Exception:
+                connection.close()
+                raise
+            span.set_attribute("cursor_id", cursor.id)
+            if guard_result.limit_applied:
+                span.set_attribute("limit_applied", guard_result.limit_applied)
+
+        with self._lock:
+            self._cursors[cursor.id] = cursor
+        if cancel_handle is not None:
+            cancel_handle.add_callback(cursor.cancel)
+        if self.metrics:
+            self.metrics.record_query()
+        logger.info("Query cursor opened", cursor_id=cursor.id)
+        return cursor
+
+    def get_cursor(self, cursor_id: str) -> Optional[QueryCursor]:
+        """Retourne un curseur encore ouvert"""
+        with self._lock:
+            return self._cursors.get(cursor_id)
+
+    def _forget(self, cursor: QueryCursor):
+        with self._lock:
+            self._cursors.pop(cursor.id, None)
+        if self.metrics:
+            self.metrics.record_query_rows(cursor.rows_fetched, cursor.time_to_first_batch)
+
+    def purge_idle(self, max_idle: float = None) -> int:
+        """Ferme les curseurs inactifs (sessions abandonnées)"""
+        max_idle = max_idle if max_idle is not None else settings.query_cursor_idle_timeout
+        now = time.monotonic()
+        with self._lock:
+            idle = [c for c in self._cursors.values() if now - c.last_used > max_idle]
+        for cursor in idle:
+            cursor.close()
+        if idle:
+            logger.info("Idle query cursors closed", count=len(idle))
+        return len(idle)
+
+    def open_cursors(self) -> int:
+        """Nombre de curseurs ouverts"""
+        with self._lock:
+            return len(self._cursors)
+
+    def openmetrics_families(self) -> List[MetricFamily]:
+        return [gauge("query_open_cursors", "Open server-side query cursors", self.open_cursors())]
+
+    def close(self):
+        """Ferme tous les curseurs ouverts"""
+        with self._lock:
+            cursors = list(self._cursors.values())
+        for cursor in cursors:
+            cursor.close()
+
+
+# Instance globale
+query_executor = QueryExecutor(metrics=metrics)
+metrics_registry.register("query_executor", query_executor.openmetrics_families)
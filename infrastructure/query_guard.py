@@ -0,0 +1,152 @@
+"""
+Garde-fous avant exécution des requêtes générées
+Transaction en lecture seule, LIMIT injecté ou plafonné, statement_timeout
+par requête et contrôle du plan (EXPLAIN) pour protéger le cluster Redshift
+partagé
+"""
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+import sqlparse
+from sqlparse import tokens as T
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+
+_PLAN_ESTIMATE = re.compile(r"cost=([\d.]+)\.\.([\d.]+)\s+rows=(\d+)")
+# SELECT [ALL|DISTINCT] TOP n [PERCENT] (sqlparse ne regroupe pas TOP de façon fiable)
+_TOP = re.compile(
+    r"SELECT\s+(?:(?:ALL|DISTINCT)\s+)?TOP\b\s*\(?\s*(?P<rows>\d+)\s*\)?(?P<percent>\s*PERCENT\b)?",
+    re.IGNORECASE
+)
+
+
+class QueryRejectedError(ValueError):
+    """Requête refusée par le garde-fou (plan trop coûteux)"""
+
+
+@dataclass
+class GuardResult:
+    """Requête effectivement exécutée et diagnostics du garde-fou"""
+    sql: str
+    limit_applied: Optional[int] = None
+    plan_cost: Optional[float] = None
+    plan_rows: Optional[int] = None
+    warnings: List[str] = field(default_factory=list)
+
+
+def apply_limit(sql: str, max_rows: int) -> Tuple[str, Optional[int]]:
+    """
+    Ajoute un LIMIT de premier niveau ou plafonne celui présent
+    (de même pour TOP n et FETCH FIRST/NEXT n ROWS ONLY)
+
+    Returns:
+        (requête, limite appliquée ou None si la requête est inchangée)
+    """
+    statement = sqlparse.parse(sql.strip().rstrip(";").strip())[0]
+    tokens = list(statement.tokens)
+    text = str(statement)
+
+    selects = []  # Position des SELECT de premier niveau (plusieurs : UNION, EXCEPT...)
+    position = 0
+    for index, token in enumerate(tokens):
+        # Seul le niveau supérieur compte : les sous-requêtes sont groupées
+        if token.ttype is T.Keyword.DML and token.normalized.upper() == "SELECT":
+            selects.append(position)
+        elif token.ttype is T.Keyword and token.normalized.upper() in ("LIMIT", "FETCH"):
+            value_index = _next_token(tokens, index)
+            if value_index is not None and token.normalized.upper() == "FETCH":
+                # FETCH FIRST|NEXT [n] ROW[S] ONLY : sans n, une seule ligne
+                value_index = _next_token(tokens, value_index)
+                if value_index is not None and tokens[value_index].normalized.upper() in ("ROW", "ROWS"):
+                    return text, None
+            if value_index is None:
+                break
+            value = tokens[value_index]
+            if value.ttype in T.Number.Integer and int(value.value) <= max_rows:
+                return text, None
+            tokens[value_index] = sqlparse.sql.Token(T.Number.Integer, str(max_rows))
+            return "".join(str(t) for t in tokens), max_rows
+        position += len(str(token))
+
+    tops = [match for match in (_TOP.match(text, start) for start in selects) if match]
+    if not tops:
+        return f"{text}\nLIMIT {max_rows}", max_rows
+    if len(selects) > 1 or tops[0].group("percent"):
+        # TOP d'une branche d'opération ensembliste ou en pourcentage : ne borne
+        # pas le résultat, et ne se combine pas avec LIMIT au même niveau
+        return f"SELECT * FROM (\n{text}\n) AS limited_query\nLIMIT {max_rows}", max_rows
+    top = tops[0]
+    if int(top.group("rows")) <= max_rows:
+        return text, None
+    return f"{text[:top.start('rows')]}{max_rows}{text[top.end('rows'):]}", max_rows
+
+
+def _next_token(tokens, index: int) -> Optional[int]:
+    """Indice du prochain jeton significatif"""
+    return next((i for i in range(index + 1, len(tokens)) if not tokens[i].is_whitespace), None)
+
+
+class QueryGuard:
+    """Prépare une connexion et contrôle une requête avant son exécution"""
+
+    def __init__(self, max_rows: int = None, statement_timeout: float = None,
+                 max_plan_cost: float = None, max_plan_rows: int = None,
+                 mode: str = None):
+        self.max_rows = max_rows or settings.query_max_rows
+        self.statement_timeout = statement_timeout or settings.query_statement_timeout
+        self.max_plan_cost = max_plan_cost or settings.query_max_plan_cost
+        self.max_plan_rows = max_plan_rows or settings.query_max_plan_rows
+        self.mode = mode or settings.query_guard_mode
+
+    def prepare(self, connection, sql: str) -> GuardResult:
+        """
+        Ouvre la transaction en lecture seule, applique le LIMIT, fixe
+        statement_timeout pour la transaction et vérifie le plan estimé
+
+        Raises:
+            QueryRejectedError: Plan au-delà des seuils (mode "reject")
+        """
+        guarded_sql, limit_applied = apply_limit(sql, self.max_rows)
+        result = GuardResult(guarded_sql, limit_applied)
+
+        with connection.cursor() as cursor:
+            # Transaction en lecture seule : aucune écriture, même via une fonction
+            cursor.execute("SET TRANSACTION READ ONLY")
+            # SET LOCAL : limité à la transaction, la connexion du pool reste intacte
+            cursor.execute(f"SET LOCAL statement_timeout TO {int(self.statement_timeout * 1000)}")
+            if settings.query_explain_enabled:
+                cursor.execute(f"EXPLAIN {guarded_sql}")
+                plan = [row[0] for row in cursor.fetchall()]
+                self._check_plan(plan, result)
+
+        if limit_applied:
+            logger.info("Query limit applied", limit=limit_applied)
+        return result
+
+    def _check_plan(self, plan: List[str], result: GuardResult):
+        """Compare coût total et volume estimé aux seuils configurés"""
+        estimates = [_PLAN_ESTIMATE.search(line) for line in plan]
+        estimates = [match for match in estimates if match]
+        if not estimates:
+            return
+
+        # Coût du nœud racine ; volume : le plus gros nœud (parcours de table)
+        result.plan_cost = float(estimates[0].group(2))
+        result.plan_rows = max(int(match.group(3)) for match in estimates)
+
+        problems = []
+        if result.plan_cost > self.max_plan_cost:
+            problems.append(f"coût estimé {result.plan_cost:.0f} > {self.max_plan_cost:.0f}")
+        if result.plan_rows > self.max_plan_rows:
+            problems.append(f"{result.plan_rows} lignes estimées > {self.max_plan_rows}")
+        if not problems:
+            return
+
+        message = "Requête trop coûteuse : " + ", ".join(problems)
+        logger.warning("Query plan over threshold",
+                       cost=result.plan_cost,
+                       rows=result.plan_rows,
+                       mode=self.mode)
+        if self.mode == "reject":
+            raise QueryRejectedError(message)
+        result.warnings.append(message)
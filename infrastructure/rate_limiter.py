@@ -0,0 +1,54 @@
+"""
+Limitation du débit des appels au LLM (seau à jetons)
+Partagé entre threads ; une erreur de quota suspend tous les appelants
+"""
+import re
+import threading
+import time
+from typing import Optional
+
+# Messages d'erreur d'un quota dépassé (HTTP 429, ResourceExhausted de Gemini)
+_RATE_LIMIT_ERROR = re.compile(r"\b429\b|resource.?exhausted|rate.?limit|quota", re.IGNORECASE)
+
+
+def is_rate_limit_error(message: Optional[str]) -> bool:
+    """Vérifie si un message d'erreur signale un quota dépassé"""
+    return bool(message and _RATE_LIMIT_ERROR.search(message))
+
+
+class RateLimiter:
+    """Seau à jetons : au plus rate_per_minute appels, rafales de burst appels"""
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Attend qu'un appel soit autorisé"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                paused = self._paused_until - now
+                if self.rate <= 0:
+                    # Débit illimité : seule une suspension fait attendre
+                    if paused <= 0:
+                        return
+                    wait = paused
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if paused <= 0 and self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = max(paused, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Suspend tous les appels (quota dépassé côté fournisseur)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
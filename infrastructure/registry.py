@@ -0,0 +1,125 @@
+"""
+Registre des services partagés au niveau du processus
+Les services lourds (LLM, cache, métriques) sont construits une seule fois
+et partagés entre toutes les sessions Streamlit
+"""
+import threading
+from typing import Any, Callable, Dict
+from infrastructure.logging import logger
+
+
+class ServiceRegistry:
+    """Registre de services avec cycle de vie (construction paresseuse, arrêt)"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """Enregistre la fabrique d'un service (construit au premier accès)"""
+        with self._lock:
+            self._factories[name] = factory
+
+    def is_registered(self, name: str) -> bool:
+        """Vérifie si un service est enregistré"""
+        return name in self._factories
+
+    def get(self, name: str) -> Any:
+        """Retourne l'instance partagée d'un service, construite une seule fois"""
+        if name in self._instances:
+            return self._instances[name]
+
+        with self._lock:
+            # Double vérification : un autre thread a pu construire le service
+            if name in self._instances:
+                return self._instances[name]
+            if name not in self._factories:
+                raise KeyError(f"Service inconnu : {name}")
+
+            instance = self._factories[name]()
+            self._instances[name] = instance
+            logger.info("Service initialized", service=name)
+            return instance
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Construit (si nécessaire) et retourne tous les services enregistrés"""
+        return {name: self.get(name) for name in list(self._factories)}
+
+    def shutdown(self):
+        """Arrête proprement les services qui exposent close()"""
+        with self._lock:
+            for name, instance in reversed(list(self._instances.items())):
+                close = getattr(instance, "close", None)
+                if callable(close):
+                    try:
+                        close()
+                    except Exception as e:
+                        logger.error("Service shutdown failed", service=name, error=str(e))
+            self._instances.clear()
+
+
+def _register_default_services(target: ServiceRegistry):
+    """Enregistre les services applicatifs par défaut"""
+    from infrastructure.settings import settings
+    from infrastructure.llm import LLMManager
+    from infrastructure.cache import cache_manager
+    from infrastructure.semantic_cache import semantic_cache
+    from infrastructure.example_store import create_example_store
+    from infrastructure.singleflight import SingleFlight
+    from infrastructure.async_runtime import async_runtime
+    from infrastructure.schema_snapshot import create_schema_catalog
+    from infrastructure.database import db_manager
+    from infrastructure.query_executor import query_executor
+    from infrastructure.table_monitor import TableChangeMonitor
+    from infrastructure.monitoring import metrics
+    from infrastructure.metrics_export import create_metrics_exporter
+    from infrastructure.system_sampler import system_sampler
+    from infrastructure.tracing import tracer
+    from domain.sql.service import SQLGenerationService
+
+    def create_schema_index():
+        # Un changement de définition invalide les résultats qui lisent la table
+        catalog = create_schema_catalog()
+        catalog.add_listener(cache_manager.invalidate_tables)
+        return catalog
+
+    def create_table_monitor():
+        if not settings.result_cache_enabled:
+            return None
+        return TableChangeMonitor(cache_manager.invalidate_tables).start()
+
+    target.register("settings", lambda: settings)
+    target.register("logger", lambda: logger)
+    target.register("metrics", lambda: metrics)
+    target.register("metrics_exporter", create_metrics_exporter)
+    target.register("system_sampler", system_sampler.start)
+    target.register("tracer", lambda: tracer)
+    target.register("cache", lambda: cache_manager)
+    target.register("semantic_cache", lambda: semantic_cache)
+    target.register("example_store", create_example_store)
+    target.register("database", db_manager.start_warmup)
+    target.register("schema_index", create_schema_index)
+    target.register("query_executor", lambda: query_executor)
+    target.register("table_monitor", create_table_monitor)
+    target.register("async_runtime", lambda: async_runtime)
+    target.register("llm", lambda: LLMManager(metrics=metrics))
+    target.register("single_flight", lambda: SingleFlight(metrics=metrics))
+    target.register("sql_service", SQLGenerationService)
+
+
+# Instance globale (une par processus)
+registry = ServiceRegistry()
+_defaults_lock = threading.Lock()
+_defaults_registered = False
+
+
+def get_services() -> Dict[str, Any]:
+    """Interface publique : services partagés du processus"""
+    global _defaults_registered
+    if not _defaults_registered:
+        with _defaults_lock:
+            if not _defaults_registered:
+                _register_default_services(registry)
+                _defaults_registered = True
+    return registry.as_dict()
@@ -0,0 +1,189 @@
+"""
+Index de schéma pour la recherche des tables pertinentes
+Seules les k tables (et colonnes) les plus proches de la question
+sont envoyées au LLM, au lieu du schéma complet
+"""
+import hashlib
+import json
+import math
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Tuple
+from infrastructure.settings import settings
+from infrastructure.normalization import STOPWORDS, detect_language
+
+
+@dataclass
+class ColumnInfo:
+    """Métadonnées d'une colonne"""
+    name: str
+    type: str = ""
+    comment: str = ""
+
+
+@dataclass
+class TableInfo:
+    """Métadonnées d'une table"""
+    name: str
+    columns: List[ColumnInfo] = field(default_factory=list)
+    comment: str = ""
+
+    def signature(self) -> str:
+        """Empreinte stable de la définition de la table"""
+        payload = json.dumps(asdict(self), sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+
+# Schéma d'exemple utilisé tant qu'aucune introspection n'est disponible
+SAMPLE_TABLES: List[TableInfo] = [
+    TableInfo("users", [
+        ColumnInfo("id", "integer"), ColumnInfo("name", "varchar"),
+        ColumnInfo("email", "varchar"), ColumnInfo("created_at", "timestamp"),
+        ColumnInfo("last_login", "timestamp"), ColumnInfo("status", "varchar"),
+    ], "utilisateurs clients comptes ユーザー"),
+    TableInfo("orders", [
+        ColumnInfo("id", "integer"), ColumnInfo("user_id", "integer"),
+        ColumnInfo("amount", "numeric", "montant chiffre d'affaires revenus 売上"),
+        ColumnInfo("order_date", "date"), ColumnInfo("status", "varchar"),
+        ColumnInfo("payment_method", "varchar"),
+    ], "commandes ventes sales revenue 注文 売上"),
+    TableInfo("order_items", [
+        ColumnInfo("id", "integer"), ColumnInfo("order_id", "integer"),
+        ColumnInfo("product_id", "integer"), ColumnInfo("quantity", "integer"),
+        ColumnInfo("price", "numeric"),
+    ], "lignes de commande produits vendus quantités"),
+    TableInfo("products", [
+        ColumnInfo("id", "integer"), ColumnInfo("name", "varchar"),
+        ColumnInfo("price", "numeric"), ColumnInfo("category", "varchar"),
+        ColumnInfo("stock_quantity", "integer"), ColumnInfo("created_at", "timestamp"),
+    ], "produits articles catalogue 商品"),
+    TableInfo("categories", [
+        ColumnInfo("id", "integer"), ColumnInfo("name", "varchar"),
+        ColumnInfo("description", "varchar"),
+    ], "catégories de produits"),
+    TableInfo("payments", [
+        ColumnInfo("id", "integer"), ColumnInfo("order_id", "integer"),
+        ColumnInfo("amount", "numeric"), ColumnInfo("payment_date", "date"),
+        ColumnInfo("method", "varchar"), ColumnInfo("status", "varchar"),
+    ], "paiements finances encaissements"),
+]
+
+_CAMEL_CASE = re.compile(r"(?<=[a-z])(?=[A-Z])")
+_WORD = re.compile(r"\w+")
+_STOPWORDS = STOPWORDS['fr'] | STOPWORDS['en']
+
+
+def tokenize(text: str) -> List[str]:
+    """Découpe un texte ou des identifiants (éventuellement multilingues) en termes"""
+    spaced = _CAMEL_CASE.sub(" ", text or "").replace("_", " ")
+    spaced = unicodedata.normalize("NFKC", spaced).casefold()
+    terms = []
+    for token in _WORD.findall(spaced):
+        if detect_language(token) == 'ja':
+            # Pas de séparation des mots en japonais : bigrammes de caractères
+            terms.extend(token[i:i + 2] for i in range(len(token) - 1))
+            continue
+        if token in _STOPWORDS:
+            continue
+        terms.append(token)
+        # Racine grossière (pluriels) pour rapprocher user/users, vente/ventes
+        if len(token) > 3 and token.endswith("s"):
+            terms.append(token[:-1])
+    return terms
+
+
+def schema_version(tables: List[TableInfo]) -> str:
+    """Version du schéma : empreinte de l'ensemble des tables"""
+    digest = hashlib.sha1()
+    for table in sorted(tables, key=lambda t: t.name):
+        digest.update(table.signature().encode())
+    return digest.hexdigest()[:12]
+
+
+class SchemaIndex:
+    """Index BM25 sur les tables (nom, colonnes, commentaires)"""
+
+    def __init__(self, tables: List[TableInfo], k1: float = 1.5, b: float = 0.75):
+        self.tables = list(tables)
+        self.k1 = k1
+        self.b = b
+        self.version = schema_version(self.tables)
+
+        self._documents: List[Counter] = []
+        for table in self.tables:
+            terms = tokenize(table.name) * 3 + tokenize(table.comment) * 2
+            for column in table.columns:
+                terms += tokenize(column.name) + tokenize(column.comment)
+            self._documents.append(Counter(terms))
+
+        lengths = [sum(doc.values()) for doc in self._documents]
+        self._avg_length = sum(lengths) / len(lengths) if lengths else 0.0
+        self._lengths = lengths
+
+        document_frequency: Counter = Counter()
+        for doc in self._documents:
+            document_frequency.update(doc.keys())
+        count = len(self._documents)
+        self._idf: Dict[str, float] = {
+            term: math.log(1 + (count - freq + 0.5) / (freq + 0.5))
+            for term, freq in document_frequency.items()
+        }
+
+    def _score(self, index: int, query_terms: List[str]) -> float:
+        doc = self._documents[index]
+        length_norm = 1 - self.b + self.b * self._lengths[index] / (self._avg_length or 1)
+        score = 0.0
+        for term in query_terms:
+            freq = doc.get(term)
+            if freq:
+                score += self._idf[term] * freq * (self.k1 + 1) / (freq + self.k1 * length_norm)
+        return score
+
+    def search(self, question: str, k: int = None) -> List[Tuple[TableInfo, float]]:
+        """Retourne les k tables les plus pertinentes avec leur score"""
+        k = k or settings.schema_top_k
+        query_terms = list(dict.fromkeys(tokenize(question)))
+        scored = [(table, self._score(i, query_terms)) for i, table in enumerate(self.tables)]
+        scored.sort(key=lambda item: item[1], reverse=True)
+
+        relevant = [(table, score) for table, score in scored if score > 0]
+        # Aucune correspondance lexicale : on retombe sur les premières tables
+        return (relevant or scored)[:k]
+
+    def select_columns(self, table: TableInfo, question: str,
+                       max_columns: int = None) -> List[ColumnInfo]:
+        """Colonnes d'une table, les plus pertinentes (et les clés) d'abord"""
+        max_columns = max_columns or settings.schema_max_columns
+        if len(table.columns) <= max_columns:
+            return table.columns
+
+        query_terms = set(tokenize(question))
+
+        def priority(column: ColumnInfo) -> int:
+            if query_terms & set(tokenize(column.name) + tokenize(column.comment)):
+                return 0
+            if column.name == "id" or column.name.endswith("_id"):
+                return 1
+            return 2
+
+        ranked = sorted(table.columns, key=priority)[:max_columns]
+        # Conserve l'ordre d'origine des colonnes retenues
+        kept = {column.name for column in ranked}
+        return [column for column in table.columns if column.name in kept]
+
+    def render(self, question: str, k: int = None) -> str:
+        """Schéma compact des tables pertinentes pour le prompt"""
+        lines = []
+        for table, _ in self.search(question, k):
+            columns = self.select_columns(table, question)
+            column_list = ", ".join(
+                f"{column.name} {column.type}".strip() for column in columns
+            )
+            omitted = len(table.columns) - len(columns)
+            if omitted:
+                column_list += f", ... (+{omitted} colonnes)"
+            comment = f"  -- {table.comment}" if table.comment else ""
+            lines.append(f"- {table.name}({column_list}){comment}")
+        return "\n".join(lines)
@@ -0,0 +1,277 @@
+"""
+Instantané du schéma sur disque, rafraîchi de manière incrémentale
+Le démarrage charge le fichier (quelques millisecondes) au lieu d'introspecter
+Redshift ; un thread compare ensuite les empreintes du catalogue et ne
+ré-inspecte que les tables modifiées
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+from infrastructure.schema_index import (
+    SAMPLE_TABLES, ColumnInfo, SchemaIndex, TableInfo, schema_version
+)
+
+SNAPSHOT_FORMAT = 2  # 2 : hôte et base enregistrés avec le schéma
+CONNECT_RETRY_INTERVAL = 30.0  # Secondes entre deux tentatives si le rafraîchissement est désactivé
+
+
+@dataclass
+class SchemaSnapshot:
+    """Schéma introspecté, versionné, avec empreintes par table"""
+    tables: List[TableInfo]
+    catalog_hashes: Dict[str, str] = field(default_factory=dict)
+    schema: str = ""
+    host: str = ""
+    database: str = ""
+    created_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def current(cls, tables: List[TableInfo], catalog_hashes: Dict[str, str]) -> "SchemaSnapshot":
+        """Instantané de la base configurée (hôte, base et schéma Redshift)"""
+        return cls(tables, catalog_hashes, settings.redshift_schema,
+                   settings.redshift_host, settings.redshift_db)
+
+    def source(self) -> Tuple[str, str, str]:
+        """(hôte, base, schéma) d'origine"""
+        return self.host, self.database, self.schema
+
+    @property
+    def version(self) -> str:
+        return schema_version(self.tables)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "format": SNAPSHOT_FORMAT,
+            "version": self.version,
+            "schema": self.schema,
+            "host": self.host,
+            "database": self.database,
+            "created_at": self.created_at,
+            "catalog_hashes": self.catalog_hashes,
+            "table_hashes": {table.name: table.signature() for table in self.tables},
+            "tables": [asdict(table) for table in self.tables],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SchemaSnapshot":
+        tables = [
+            TableInfo(
+                name=table["name"],
+                columns=[ColumnInfo(**column) for column in table.get("columns", [])],
+                comment=table.get("comment", "")
+            )
+            for table in data.get("tables", [])
+        ]
+        return cls(
+            tables=tables,
+            catalog_hashes=data.get("catalog_hashes", {}),
+            schema=data.get("schema", ""),
+            host=data.get("host", ""),
+            database=data.get("database", ""),
+            created_at=data.get("created_at", time.time()),
+        )
+
+
+class SchemaCatalog:
+    """Point d'accès au schéma courant (index de recherche + instantané)"""
+
+    def __init__(self, path: str = None, db_manager=None):
+        self.path = path or settings.schema_snapshot_path
+        self._db_manager = db_manager
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[List[str]], None]] = []
+        self._stop_event = threading.Event()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self.snapshot: Optional[SchemaSnapshot] = None
+        self.index = SchemaIndex(SAMPLE_TABLES)
+
+    # --- Accès à l'index (interface utilisée par SQLService) ---
+
+    @property
+    def version(self) -> str:
+        return self.index.version
+
+    @property
+    def tables(self) -> List[TableInfo]:
+        return self.index.tables
+
+    def search(self, question: str, k: int = None) -> List[Tuple[TableInfo, float]]:
+        return self.index.search(question, k)
+
+    def render(self, question: str, k: int = None) -> str:
+        return self.index.render(question, k)
+
+    def add_listener(self, callback: Callable[[List[str]], None]):
+        """Abonne un rappel appelé avec les tables modifiées après un rafraîchissement"""
+        self._listeners.append(callback)
+
+    # --- Persistance de l'instantané ---
+
+    def load_snapshot(self) -> Optional[SchemaSnapshot]:
+        """Charge l'instantané depuis le disque (None si absent ou incompatible)"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error("Schema snapshot unreadable", path=self.path, error=str(e))
+            return None
+        if data.get("format") != SNAPSHOT_FORMAT:
+            logger.warning("Schema snapshot format mismatch, ignored", path=self.path)
+            return None
+        snapshot = SchemaSnapshot.from_dict(data)
+        expected = (settings.redshift_host, settings.redshift_db, settings.redshift_schema)
+        if snapshot.source() != expected:
+            # Instantané d'un autre cluster, d'une autre base ou d'un autre schéma
+            logger.warning("Schema snapshot source mismatch, ignored", path=self.path,
+                           snapshot_source="/".join(snapshot.source()), source="/".join(expected))
+            return None
+        return snapshot
+
+    def save_snapshot(self, snapshot: SchemaSnapshot):
+        """Écrit l'instantané de manière atomique"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def _apply(self, snapshot: SchemaSnapshot):
+        """Remplace l'instantané et l'index courants"""
+        index = SchemaIndex(snapshot.tables)
+        with self._lock:
+            self.snapshot = snapshot
+            self.index = index
+
+    # --- Introspection ---
+
+    @property
+    def db_manager(self):
+        if self._db_manager is None:
+            from infrastructure.database import db_manager
+            self._db_manager = db_manager
+        return self._db_manager
+
+    def initialize(self) -> "SchemaCatalog":
+        """Charge l'instantané (sinon schéma d'exemple) sans attendre la base"""
+        if not settings.schema_introspection:
+            # Schéma d'exemple : un instantané ne serait jamais rafraîchi
+            return self
+
+        start_time = time.perf_counter()
+        snapshot = self.load_snapshot()
+        if snapshot is not None:
+            self._apply(snapshot)
+            logger.info("Schema snapshot loaded",
+                       tables=len(snapshot.tables),
+                       version=snapshot.version,
+                       load_ms=round((time.perf_counter() - start_time) * 1000, 1))
+
+        # Sans instantané, le schéma d'exemple sert jusqu'à ce que la base soit prête
+        self.start_background_refresh()
+        return self
+
+    def introspect_full(self) -> SchemaSnapshot:
+        """Introspection complète et écriture d'un nouvel instantané"""
+        catalog_hashes = self.db_manager.get_catalog_signatures()
+        tables = self.db_manager.get_schema_metadata()
+        snapshot = SchemaSnapshot.current(tables, catalog_hashes)
+        self.save_snapshot(snapshot)
+        self._apply(snapshot)
+        logger.info("Schema snapshot created", tables=len(tables), version=snapshot.version)
+        return snapshot
+
+    def refresh(self) -> List[str]:
+        """
+        Rafraîchissement incrémental : compare les empreintes du catalogue et
+        ne ré-inspecte que les tables nouvelles ou modifiées
+
+        Returns:
+            Noms des tables ajoutées, modifiées ou supprimées
+        """
+        if self.snapshot is None:
+            self.introspect_full()
+            changed = [table.name for table in self.snapshot.tables]
+            self._notify(changed)
+            return changed
+
+        catalog_hashes = self.db_manager.get_catalog_signatures()
+        previous = self.snapshot.catalog_hashes
+        modified = [name for name, digest in catalog_hashes.items() if previous.get(name) != digest]
+        removed = [name for name in previous if name not in catalog_hashes]
+        if not modified and not removed:
+            return []
+
+        tables = {table.name: table for table in self.snapshot.tables if table.name not in removed}
+        for table in self.db_manager.get_schema_metadata(modified):
+            tables[table.name] = table
+
+        snapshot = SchemaSnapshot.current(sorted(tables.values(), key=lambda t: t.name), catalog_hashes)
+        self.save_snapshot(snapshot)
+        self._apply(snapshot)
+
+        changed = modified + removed
+        logger.info("Schema snapshot refreshed",
+                   modified=modified,
+                   removed=removed,
+                   version=snapshot.version)
+        self._notify(changed)
+        return changed
+
+    def _notify(self, changed: List[str]):
+        for callback in self._listeners:
+            try:
+                callback(changed)
+            except Exception as e:
+                logger.error("Schema change listener failed", error=str(e))
+
+    def start_background_refresh(self, interval: float = None):
+        """
+        Première introspection dès que la base est prête, puis rafraîchissement
+        périodique (sauf intervalle nul)
+        """
+        interval = interval if interval is not None else settings.schema_refresh_interval
+        if self._refresh_thread is not None:
+            return
+        # Délai entre deux tentatives de connexion avant la première introspection
+        retry_interval = interval if interval > 0 else CONNECT_RETRY_INTERVAL
+
+        def _run():
+            self.db_manager.start_warmup()
+            while not self.db_manager.wait_until_ready(retry_interval):
+                if self._stop_event.is_set():
+                    return
+                self.db_manager.start_warmup()  # Nouvelle tentative après un échec
+            try:
+                # Complète sans instantané, incrémentale sur un instantané chargé
+                self.refresh()
+            except Exception as e:
+                logger.error("Schema introspection failed", error=str(e),
+                             sample_schema=self.snapshot is None)
+
+            if interval <= 0:
+                return
+            while not self._stop_event.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    logger.error("Schema refresh failed", error=str(e))
+
+        self._refresh_thread = threading.Thread(target=_run, name="schema-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def close(self):
+        """Arrête le rafraîchissement en arrière-plan"""
+        self._stop_event.set()
+
+
+def create_schema_catalog() -> SchemaCatalog:
+    """Crée et initialise le catalogue de schéma du processus"""
+    return SchemaCatalog().initialize()
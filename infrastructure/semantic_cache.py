@@ -0,0 +1,224 @@
+"""
+Cache sémantique : retrouve une réponse pour une question reformulée
+Vectorisation par hachage (CPU, sans modèle externe) et similarité cosinus
+calculée en une seule multiplication matricielle NumPy
+"""
+import re
+import threading
+import unicodedata
+import zlib
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+import numpy as np
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+from infrastructure.monitoring import metrics
+from infrastructure.normalization import normalize_question, detect_language
+
+
+# Mots qui inversent ou bornent le sens d'une question : deux questions
+# proches qui n'en contiennent pas les mêmes n'appellent pas le même SQL
+NEGATIONS = frozenset({
+    'ne', 'n', 'pas', 'non', 'sans', 'aucun', 'aucune', 'jamais', 'sauf', 'hors', 'excepté',
+    'not', 'no', 'without', 'never', 'except', 'excluding', 'none', 'nor',
+})
+POLAR_WORDS = frozenset({
+    'plus', 'moins', 'max', 'min', 'maximum', 'minimum', 'premier', 'premiers', 'première',
+    'premières', 'dernier', 'derniers', 'dernière', 'dernières', 'avant', 'après',
+    'croissant', 'décroissant', 'haut', 'bas', 'meilleur', 'meilleurs', 'pire', 'pires',
+    'supérieur', 'inférieur', 'asc', 'desc', 'top', 'flop',
+    'more', 'less', 'most', 'least', 'first', 'last', 'before', 'after', 'highest',
+    'lowest', 'best', 'worst', 'top', 'bottom', 'above', 'below', 'over', 'under',
+    'ascending', 'descending', 'greater', 'fewer', 'oldest', 'newest', 'earliest', 'latest',
+})
+JAPANESE_NEGATIONS = ('ない', 'なし', '以外', '除く', '未')
+# Préfixes privatifs : actifs / inactifs, paid / unpaid, livré / non-livré
+NEGATING_PREFIXES = ('in', 'im', 'il', 'ir', 'un', 'non', 'dé', 'dés', 'dis')
+
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+_QUOTED = re.compile(r"""(?:(?<=[\s=(,])|^)'([^']+)'|"([^"]+)"|«\s*([^»]+?)\s*»|「([^」]+)」""")
+_WORD = re.compile(r"\w+")
+
+
+def literal_signature(question: str) -> Tuple[Tuple[str, ...], Tuple[str, ...], FrozenSet[str]]:
+    """Nombres, littéraux entre guillemets et mots de négation/polarité de la question brute"""
+    text = unicodedata.normalize("NFKC", question or "").casefold()
+    numbers = tuple(sorted(number.replace(",", ".") for number in _NUMBER.findall(text)))
+    quoted = tuple(sorted(next(group for group in match if group).strip()
+                          for match in _QUOTED.findall(text)))
+    words = set(_WORD.findall(text))
+    markers = (words & NEGATIONS) | (words & POLAR_WORDS)
+    markers |= {marker for marker in JAPANESE_NEGATIONS if marker in text}
+    return numbers, quoted, frozenset(markers)
+
+
+def _has_negated_variant(words: FrozenSet[str], others: FrozenSet[str]) -> bool:
+    """Un mot d'un côté est la forme privative d'un mot de l'autre (actifs / inactifs)"""
+    for word in words:
+        for prefix in NEGATING_PREFIXES:
+            if word.startswith(prefix) and len(word) - len(prefix) >= 3:
+                stem = word[len(prefix):].lstrip("-")
+                if stem in others:
+                    return True
+    return False
+
+
+def literals_compatible(question: str, candidate: str) -> bool:
+    """Deux questions ne partagent une réponse que si leurs littéraux et négations coïncident"""
+    if literal_signature(question) != literal_signature(candidate):
+        return False
+    left = frozenset(_WORD.findall(normalize_question(question)))
+    right = frozenset(_WORD.findall(normalize_question(candidate)))
+    return not (_has_negated_variant(left - right, right - left)
+                or _has_negated_variant(right - left, left - right))
+
+
+class HashingVectorizer:
+    """Vectorisation par hachage de mots, bigrammes et n-grammes de caractères"""
+
+    def __init__(self, dim: int = 1024, char_ngram: int = 3):
+        self.dim = dim
+        self.char_ngram = char_ngram
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        """Extrait les caractéristiques pondérées d'un texte normalisé"""
+        features: List[Tuple[str, float]] = []
+        n = self.char_ngram
+
+        if detect_language(text) == 'ja':
+            # Pas d'espaces en japonais : bigrammes et trigrammes de caractères
+            for size in (2, 3):
+                features.extend((f"c:{text[i:i + size]}", 1.0) for i in range(len(text) - size + 1))
+            return features or [(f"c:{text}", 1.0)]
+
+        words = text.split()
+        features.extend((f"w:{word}", 2.0) for word in words)
+        features.extend((f"b:{a}_{b}", 1.0) for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f"<{word}>"
+            features.extend((f"c:{padded[i:i + n]}", 0.5) for i in range(len(padded) - n + 1))
+        return features
+
+    def transform(self, text: str) -> np.ndarray:
+        """Retourne le vecteur L2-normalisé d'un texte déjà normalisé"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            h = zlib.crc32(feature.encode())
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vector[h % self.dim] += sign * weight
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+class SemanticCache:
+    """Cache par similarité, stocké dans une matrice NumPy de taille fixe"""
+
+    def __init__(self, threshold: float = None, max_entries: int = None,
+                 dim: int = None, metrics=None):
+        self.threshold = threshold if threshold is not None else settings.semantic_cache_threshold
+        self.max_entries = max_entries or settings.semantic_cache_max_entries
+        self.vectorizer = HashingVectorizer(dim or settings.semantic_cache_dim)
+        self.metrics = metrics
+
+        # Matrice préallouée + anneau de remplacement (FIFO) une fois pleine
+        self._matrix = np.zeros((self.max_entries, self.vectorizer.dim), dtype=np.float32)
+        self._namespaces = np.zeros(self.max_entries, dtype=np.int64)
+        self._values: List[Optional[Dict[str, Any]]] = [None] * self.max_entries
+        self._questions: List[str] = [""] * self.max_entries
+        self._raw_questions: List[str] = [""] * self.max_entries
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+        logger.info("Semantic cache initialized",
+                   threshold=self.threshold,
+                   max_entries=self.max_entries,
+                   dim=self.vectorizer.dim)
+
+    @staticmethod
+    def _namespace_id(namespace: str) -> int:
+        return zlib.crc32(namespace.encode())
+
+    def lookup(self, question: str, namespace: str = "",
+               language: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Cherche la question la plus proche dans le même espace de noms
+
+        Returns:
+            {"value", "similarity", "matched_question"} si la similarité dépasse
+            le seuil, sinon None
+        """
+        normalized = normalize_question(question, language)
+        if not normalized:
+            return None
+        query = self.vectorizer.transform(normalized)
+        namespace_id = self._namespace_id(namespace)
+
+        with self._lock:
+            best_score, candidates = 0.0, []
+            if self._size:
+                scores = self._matrix[:self._size] @ query
+                scores[self._namespaces[:self._size] != namespace_id] = -1.0
+                best_score = float(scores.max())
+                # Candidats au-dessus du seuil, du plus proche au moins proche
+                above = np.flatnonzero(scores >= self.threshold)
+                candidates = [
+                    (float(scores[index]), self._values[index], self._questions[index], self._raw_questions[index])
+                    for index in above[np.argsort(-scores[above])]
+                ]
+
+        # Même formulation mais autre nombre, littéral ou négation : pas la même requête
+        match = next(
+            (candidate for candidate in candidates
+             if candidate[1] is not None and literals_compatible(question, candidate[3])),
+            None
+        )
+        if match is not None:
+            best_score, value, matched_question, _ = match
+            if self.metrics:
+                self.metrics.record_semantic_hit(best_score)
+            logger.info("Semantic cache hit",
+                       similarity=round(best_score, 4),
+                       matched_question=matched_question)
+            return {
+                "value": value,
+                "similarity": best_score,
+                "matched_question": matched_question
+            }
+
+        if self.metrics:
+            self.metrics.record_semantic_miss(max(best_score, 0.0))
+        return None
+
+    def add(self, question: str, value: Dict[str, Any], namespace: str = "",
+            language: str = None):
+        """Ajoute une question et sa réponse au cache sémantique"""
+        normalized = normalize_question(question, language)
+        if not normalized:
+            return
+        vector = self.vectorizer.transform(normalized)
+
+        with self._lock:
+            index = self._next
+            self._matrix[index] = vector
+            self._namespaces[index] = self._namespace_id(namespace)
+            self._values[index] = value
+            self._questions[index] = normalized
+            self._raw_questions[index] = question
+            self._next = (self._next + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistiques du cache sémantique"""
+        return {
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "matrix_bytes": int(self._matrix.nbytes)
+        }
+
+
+# Instance globale (None si désactivé)
+semantic_cache = SemanticCache(metrics=metrics) if settings.semantic_cache_enabled else None
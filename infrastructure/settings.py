@@ -21,6 +21,12 @@ class Settings(BaseSettings):
     # API Keys
     google_api_key: str
     
+    # LLM
+    llm_provider: str = "gemini"  # gemini ou fake (LLM factice pour les tests)
+    llm_model: str = "gemini-1.5-flash"
+    llm_timeout: float = 60.0  # Délai max d'une génération (secondes)
+    llm_max_concurrency: int = 8  # Appels LLM simultanés par boucle d'événements
+    
     # Application Settings
     app_name: str = "TextToSQL ChatBot"
     app_version: str = "1.0.0"
@@ -30,6 +36,40 @@ class Settings(BaseSettings):
     db_pool_size: int = 10
     db_pool_overflow: int = 20
     db_pool_timeout: int = 30
+    db_connect_timeout: int = 10  # Délai max d'établissement d'une connexion (secondes)
+    db_ready_wait: float = 5.0  # Attente max d'une requête pendant le préchauffage (secondes)
+    
+    # Schéma envoyé au LLM
+    schema_introspection: bool = False  # Index construit depuis Redshift (sinon schéma d'exemple)
+    schema_top_k: int = 5  # Tables retenues par question
+    schema_max_columns: int = 30  # Colonnes max par table dans le prompt
+    schema_snapshot_path: str = ".cache/schema_snapshot.json"  # Instantané du schéma introspecté
+    schema_refresh_interval: int = 300  # Rafraîchissement incrémental (secondes, 0 = désactivé)
+    
+    # Budget du prompt (tokens estimés)
+    prompt_max_tokens: int = 3000  # Plafond du prompt complet
+    prompt_question_max_tokens: int = 300  # Question tronquée au-delà
+    prompt_examples_max_tokens: int = 800  # Part maximale des exemples
+    
+    # Exécution des requêtes
+    query_batch_size: int = 500  # Lignes lues par aller-retour sur le curseur serveur
+    query_page_size: int = 1000  # Lignes affichées par page (« charger plus »)
+    query_max_open_cursors: int = 20  # Curseurs ouverts simultanément (connexions du pool)
+    query_cursor_idle_timeout: int = 600  # Fermeture des curseurs inactifs (secondes)
+    
+    # Garde-fous d'exécution
+    query_max_rows: int = 10000  # LIMIT injecté ou plafonné
+    query_statement_timeout: float = 60.0  # statement_timeout par requête (secondes)
+    query_explain_enabled: bool = True  # Contrôle du plan estimé avant exécution
+    query_max_plan_cost: float = 1e10  # Coût estimé maximal (nœud racine)
+    query_max_plan_rows: int = 100_000_000  # Lignes estimées maximales (plus gros nœud)
+    query_guard_mode: str = "reject"  # reject ou warn au-delà des seuils
+    
+    # Cache des résultats de requêtes
+    result_cache_enabled: bool = True
+    result_cache_ttl: int = 900  # 15 minutes
+    result_cache_max_entry_bytes: int = 8 * 1024 * 1024  # Résultats plus gros jamais mis en cache
+    result_cache_check_interval: int = 60  # Détection des chargements de tables (secondes, 0 = désactivé)
     
     # Rate Limiting
     rate_limit_requests: int = 100
@@ -37,10 +77,67 @@ class Settings(BaseSettings):
     
     # Cache (mémoire gratuit)
     cache_ttl: int = 3600  # 1 hour
+    cache_max_entries: int = 5000
+    cache_max_bytes: int = 64 * 1024 * 1024  # 64 MB
+    cache_eviction_policy: str = "lru"  # lru, lfu ou tinylfu
+    cache_expiry_interval: int = 60  # Balayage des entrées expirées (secondes, 0 = désactivé)
+    cache_persistent_enabled: bool = True  # Second niveau SQLite partagé entre processus
+    cache_persistent_path: str = ".cache/texttosql_cache.sqlite3"
+    cache_write_behind_interval: float = 1.0  # Délai max avant écriture disque (secondes)
+    cache_write_behind_batch_size: int = 100
+    
+    # Cache sémantique (questions reformulées)
+    semantic_cache_enabled: bool = False  # Optionnel : une reformulation proche peut appeler un autre SQL
+    semantic_cache_threshold: float = 0.92  # Similarité cosinus minimale
+    semantic_cache_max_entries: int = 2000
+    semantic_cache_dim: int = 1024
+    
+    # Exemples few-shot (paires question → SQL validées)
+    example_store_enabled: bool = True
+    example_store_path: str = ".cache/examples.sqlite3"
+    example_store_max_examples: int = 5000
+    example_store_dim: int = 512
+    example_top_k: int = 3  # Exemples ajoutés au prompt
+    example_min_similarity: float = 0.3  # Similarité cosinus minimale d'un exemple
+    
+    # Génération en lot (batch_generate.py)
+    batch_workers: int = 8  # Questions traitées simultanément
+    batch_rate_per_minute: float = 60.0  # Appels LLM par minute (0 = illimité)
+    batch_max_retries: int = 5  # Nouvelles tentatives après un quota dépassé
+    
+    # API HTTP (api_main.py)
+    api_host: str = "127.0.0.1"  # Boucle locale ; 0.0.0.0 pour exposer l'API
+    api_key: str = ""  # Jeton exigé par /execute (Bearer ou X-API-Key) ; vide = /execute désactivé
+    api_port: int = 8000
+    api_workers: int = 2  # Processus uvicorn (cache disque partagé entre eux)
+    api_max_batch_size: int = 50  # Questions max par requête /generate
+    
+    # Export des métriques (OpenMetrics)
+    metrics_port: int = 0  # Serveur HTTP annexe /metrics (0 = désactivé)
+    metrics_host: str = "127.0.0.1"  # Boucle locale ; 0.0.0.0 pour un scraper distant
+    metrics_dump_path: str = ""  # Fichier réécrit périodiquement (collecteur textfile)
+    metrics_dump_interval: float = 15.0  # Secondes entre deux écritures
+    
+    # Échantillonnage système (CPU, mémoire, disque)
+    system_sample_interval: float = 5.0  # Secondes entre deux échantillons
+    system_history_size: int = 120  # Échantillons conservés (10 min à 5 s)
+    system_health_window: float = 60.0  # Fenêtre de la moyenne utilisée par le health check
+    
+    # Traçage des requêtes (spans)
+    tracing_exporter: str = "jsonl"  # jsonl, otlp ou none (identifiants dans les logs seulement)
+    tracing_path: str = ".cache/traces.jsonl"
+    tracing_max_file_mb: float = 50.0  # Au-delà, le fichier devient traces.jsonl.1
+    tracing_otlp_endpoint: str = "http://localhost:4318/v1/traces"
+    tracing_queue_size: int = 10000  # Spans en attente d'export (les suivants sont abandonnés)
     
     # Logging
     log_level: str = "INFO"
     log_format: str = "json"
+    log_async: bool = True  # Rendu et écriture dans un thread dédié (hors du chemin des requêtes)
+    log_queue_size: int = 10000  # File pleine : événements info/debug abandonnés
+    log_batch_size: int = 256  # Événements écrits par écriture sur la sortie
+    log_sample_rate: float = 1.0  # Fraction conservée des événements fréquents (1 = tous)
+    log_sampled_events: str = "Request recorded,Query cursor opened,Query limit applied,Request coalesced,Semantic cache hit"
     
     @field_validator('redshift_port')
     @classmethod
@@ -57,6 +154,38 @@ class Settings(BaseSettings):
             raise ValueError(f'Log level must be one of {valid_levels}')
         return v.upper()
     
+    @field_validator('llm_provider')
+    @classmethod
+    def validate_llm_provider(cls, v):
+        valid_providers = ['gemini', 'fake']
+        if v.lower() not in valid_providers:
+            raise ValueError(f'LLM provider must be one of {valid_providers}')
+        return v.lower()
+    
+    @field_validator('cache_eviction_policy')
+    @classmethod
+    def validate_cache_eviction_policy(cls, v):
+        valid_policies = ['lru', 'lfu', 'tinylfu']
+        if v.lower() not in valid_policies:
+            raise ValueError(f'Cache eviction policy must be one of {valid_policies}')
+        return v.lower()
+    
+    @field_validator('query_guard_mode')
+    @classmethod
+    def validate_query_guard_mode(cls, v):
+        valid_modes = ['reject', 'warn']
+        if v.lower() not in valid_modes:
+            raise ValueError(f'Query guard mode must be one of {valid_modes}')
+        return v.lower()
+    
+    @field_validator('tracing_exporter')
+    @classmethod
+    def validate_tracing_exporter(cls, v):
+        valid_exporters = ['jsonl', 'otlp', 'none']
+        if v.lower() not in valid_exporters:
+            raise ValueError(f'Tracing exporter must be one of {valid_exporters}')
+        return v.lower()
+    
     @property
     def redshift_dsn(self) -> str:
         return f"redshift+psycopg2://{self.redshift_user}:{self.redshift_password}@{self.redshift_host}:{self.redshift_port}/{self.redshift_db}"
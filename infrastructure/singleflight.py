@@ -0,0 +1,147 @@
+"""
+Dédoublonnage des appels concurrents identiques (single-flight)
+Le premier appelant lance la fonction dans un thread de travail, détachée de
+sa session ; chaque appelant attend le résultat avec sa propre poignée
+d'annulation, et l'appel n'est annulé que lorsque le dernier attendant part
+"""
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+from infrastructure.logging import logger
+from infrastructure.cancellation import CancellationHandle, wait_for
+
+
+class _Call:
+    """Appel partagé : résultat, annulation interne et progression publiée"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.handle = CancellationHandle("single_flight")
+        self.future: Optional[Future] = None
+        self.waiters = 0
+        self.progress: Optional[str] = None
+
+    def publish(self, progress: str):
+        """Progression (SQL partiel) relayée à chaque attendant dans son propre thread"""
+        self.progress = progress
+
+
+class SingleFlight:
+    """Coalescence de requêtes par clé"""
+
+    def __init__(self, metrics=None, max_workers: int = 32):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="single-flight")
+        self.metrics = metrics
+
+    def do(self, key: str, fn: Callable[[CancellationHandle, Callable[[str], None]], Any],
+           timeout: Optional[float] = None,
+           cancel_handle: Optional[CancellationHandle] = None,
+           on_poll: Optional[Callable[[], Any]] = None,
+           on_progress: Optional[Callable[[str], None]] = None) -> Tuple[Any, bool]:
+        """
+        Exécute fn une seule fois pour tous les appels concurrents sur la même clé
+
+        Args:
+            key: Clé de coalescence (clé de cache normalisée)
+            fn: Fonction partagée, appelée avec la poignée d'annulation de l'appel
+                et un rappel de progression (jamais avec ceux d'une session)
+            timeout: Attente maximale de cet appelant (secondes)
+            cancel_handle: Poignée de cet appelant ; l'annuler n'interrompt que son attente
+            on_poll: Rappel périodique pendant l'attente (thread de l'appelant)
+            on_progress: Reçoit la dernière progression publiée (thread de l'appelant)
+
+        Returns:
+            (résultat, partagé) où partagé indique un résultat reçu d'un autre appel
+
+        Raises:
+            OperationCancelledError: La poignée de cet appelant a été annulée
+            TimeoutError: Délai dépassé pour cet appelant
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call(key)
+                self._calls[key] = call
+                # Le contexte (span courant) du premier appelant suit l'appel
+                call.future = self._executor.submit(
+                    contextvars.copy_context().run, self._run, call, fn
+                )
+            call.waiters += 1
+
+        if not leader:
+            if self.metrics:
+                self.metrics.record_coalesced_request()
+            logger.info("Request coalesced", key=key)
+
+        # Future propre à l'appelant : wait_for peut l'annuler sans toucher aux autres
+        waiter: Future = Future()
+        call.future.add_done_callback(lambda shared: _copy_outcome(shared, waiter))
+
+        seen = {"progress": None}
+
+        def poll():
+            if on_progress and call.progress is not None and call.progress != seen["progress"]:
+                seen["progress"] = call.progress
+                on_progress(call.progress)
+            if on_poll:
+                on_poll()
+
+        try:
+            return wait_for(waiter, cancel_handle, timeout=timeout, on_poll=poll), not leader
+        finally:
+            self._leave(call)
+
+    def _run(self, call: _Call, fn: Callable) -> Any:
+        try:
+            return fn(call.handle, call.publish)
+        finally:
+            self._forget(call)
+
+    def _leave(self, call: _Call):
+        """Départ d'un attendant ; le dernier annule un appel encore en cours"""
+        with self._lock:
+            call.waiters -= 1
+            abandoned = call.waiters == 0 and not call.future.done()
+        if abandoned:
+            # Les appelants suivants relancent un appel neuf
+            self._forget(call)
+            call.handle.cancel()
+
+    def _forget(self, call: _Call):
+        with self._lock:
+            if self._calls.get(call.key) is call:
+                del self._calls[call.key]
+
+    def in_flight(self) -> int:
+        """Nombre de clés en cours d'exécution"""
+        with self._lock:
+            return len(self._calls)
+
+    def close(self):
+        """Annule les appels en cours et arrête les threads de travail"""
+        with self._lock:
+            calls = list(self._calls.values())
+        for call in calls:
+            call.handle.cancel()
+        self._executor.shutdown(wait=False)
+
+
+def _copy_outcome(source: Future, target: Future):
+    """Recopie le résultat (ou l'exception) du future partagé"""
+    if target.done():
+        return  # Attente abandonnée par cet appelant
+    try:
+        exception = source.exception()
+    except BaseException as e:  # Future partagé annulé
+        exception = e
+    try:
+        if exception is not None:
+            target.set_exception(exception)
+        else:
+            target.set_result(source.result())
+    except Exception:
+        pass  # Annulé entre-temps
@@ -0,0 +1,125 @@
+"""
+Analyse de requêtes SQL avec sqlparse
+Validation, forme canonique (clé de cache) et tables lues par une requête
+"""
+from typing import List, Optional, Set
+import sqlparse
+from sqlparse import sql as sql_tokens
+from sqlparse import tokens as T
+
+# Fonctions d'administration à effet de bord, hors transaction (non annulées par ROLLBACK)
+FORBIDDEN_FUNCTIONS = frozenset({
+    "pg_terminate_backend", "pg_cancel_backend", "pg_reload_conf",
+    "pg_rotate_logfile", "set_config", "pg_advisory_lock", "pg_sleep",
+})
+
+
+def _statements(sql: str) -> List[sql_tokens.Statement]:
+    """Instructions non vides d'un texte SQL"""
+    return [
+        statement for statement in sqlparse.parse(sql or "")
+        if statement.token_first(skip_cm=True) is not None
+    ]
+
+
+def validate_select(sql: str) -> Optional[str]:
+    """Vérifie qu'il s'agit d'un unique SELECT sans effet de bord ; retourne un message d'erreur ou None"""
+    statements = _statements(sql)
+    if not statements:
+        return "Requête SQL vide"
+    if len(statements) > 1:
+        return "Une seule instruction SQL est autorisée"
+    statement_type = statements[0].get_type()
+    if statement_type != "SELECT":
+        return f"Instruction {statement_type} non autorisée (SELECT attendu)"
+
+    tokens = [token for token in statements[0].flatten() if not token.is_whitespace]
+    for index, token in enumerate(tokens):
+        if token.ttype is T.Keyword and token.normalized.upper() == "INTO":
+            # SELECT ... INTO crée une table
+            return "SELECT ... INTO non autorisé"
+        if token.ttype is T.Keyword.DML and token.normalized.upper() != "SELECT":
+            # Instruction de modification dans une CTE ou une sous-requête
+            return f"Instruction {token.normalized.upper()} non autorisée (SELECT attendu)"
+        following = tokens[index + 1] if index + 1 < len(tokens) else None
+        if token.ttype in T.Name and token.value.lower() in FORBIDDEN_FUNCTIONS \
+                and following is not None and following.value == "(":
+            return f"Fonction {token.value.lower()} non autorisée"
+    return None
+
+
+def canonicalize_sql(sql: str) -> str:
+    """
+    Forme canonique d'une requête : commentaires et mise en forme ignorés,
+    mots-clés en majuscules, identifiants non quotés en minuscules ;
+    les littéraux sont conservés tels quels
+    """
+    parts = []
+    for statement in _statements(sql):
+        for token in statement.flatten():
+            if token.is_whitespace or token.ttype in T.Comment:
+                continue
+            if token.ttype is T.Punctuation and token.value == ";":
+                continue
+            if token.is_keyword:
+                parts.append(token.normalized.upper())
+            elif token.ttype in T.Name and not token.value.startswith('"'):
+                parts.append(token.value.lower())
+            else:
+                parts.append(token.value)
+    return " ".join(parts)
+
+
+def _is_table_keyword(token) -> bool:
+    if not token.is_keyword:
+        return False
+    value = token.normalized.upper()
+    return value == "FROM" or value.endswith("JOIN")
+
+
+def _collect_tables(token_list, tables: Set[str], ctes: Set[str]):
+    expect_table = False
+    expect_cte = False
+    for token in token_list.tokens:
+        if token.is_whitespace or token.ttype in T.Comment:
+            continue
+
+        if token.ttype is T.Keyword.CTE:
+            expect_cte = True
+            continue
+        if expect_cte:
+            definitions = token.get_identifiers() if isinstance(token, sql_tokens.IdentifierList) else [token]
+            for definition in definitions:
+                if isinstance(definition, sql_tokens.Identifier):
+                    ctes.add(definition.get_name().lower())
+                    _collect_tables(definition, tables, ctes)
+            expect_cte = False
+            continue
+
+        if _is_table_keyword(token):
+            expect_table = True
+            continue
+        if expect_table:
+            identifiers = token.get_identifiers() if isinstance(token, sql_tokens.IdentifierList) else [token]
+            for identifier in identifiers:
+                if isinstance(identifier, sql_tokens.Identifier) and not any(
+                    isinstance(child, sql_tokens.Parenthesis) for child in identifier.tokens
+                ):
+                    tables.add(identifier.get_real_name().lower())
+                elif identifier.is_group:
+                    # Sous-requête dans FROM
+                    _collect_tables(identifier, tables, ctes)
+            expect_table = False
+            continue
+
+        if token.is_group:
+            _collect_tables(token, tables, ctes)
+
+
+def extract_tables(sql: str) -> List[str]:
+    """Tables lues par une requête (hors CTE), sans le schéma"""
+    tables: Set[str] = set()
+    ctes: Set[str] = set()
+    for statement in _statements(sql):
+        _collect_tables(statement, tables, ctes)
+    return sorted(tables - ctes)
@@ -0,0 +1,137 @@
+"""
+Échantillonnage des ressources système en arrière-plan
+Un thread relève CPU, mémoire et disque à cadence fixe dans un tampon
+circulaire : health checks et métriques lisent le dernier échantillon
+sans appel psutil sur le chemin des requêtes
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+import psutil
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+from infrastructure.metrics_export import MetricFamily, gauge, metrics_registry
+
+BYTES_PER_MB = 1024 * 1024
+BYTES_PER_GB = 1024 * 1024 * 1024
+
+
+@dataclass
+class SystemSample:
+    """Relevé des ressources système à un instant donné"""
+    timestamp: float
+    cpu_percent: float
+    memory_percent: float
+    memory_available_mb: float
+    disk_percent: float
+    disk_free_gb: float
+
+
+class SystemSampler:
+    """Relevés périodiques conservés dans un tampon circulaire borné"""
+
+    def __init__(self, interval: float = None, history_size: int = None, disk_path: str = "/"):
+        self.interval = interval if interval is not None else settings.system_sample_interval
+        self.disk_path = disk_path
+        self._history: Deque[SystemSample] = deque(maxlen=history_size or settings.system_history_size)
+        self._latest: Optional[SystemSample] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def sample(self) -> SystemSample:
+        """Prend un relevé et l'ajoute à l'historique"""
+        # CPU moyen depuis le relevé précédent (l'appel ne bloque pas)
+        cpu_percent = psutil.cpu_percent(interval=None)
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+        current = SystemSample(
+            timestamp=time.time(),
+            cpu_percent=cpu_percent,
+            memory_percent=memory.percent,
+            memory_available_mb=memory.available / BYTES_PER_MB,
+            disk_percent=disk.percent,
+            disk_free_gb=disk.free / BYTES_PER_GB
+        )
+        self._history.append(current)
+        self._latest = current
+        return current
+
+    def start(self) -> "SystemSampler":
+        """Démarre l'échantillonnage en arrière-plan (idempotent)"""
+        with self._lock:
+            if self._thread is not None or self.interval <= 0:
+                return self
+            self._thread = threading.Thread(target=self._run, name="system-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        # Premier relevé : le CPU est mesuré sur une courte fenêtre
+        # (sans référence, cpu_percent() renverrait 0.0)
+        psutil.cpu_percent(interval=None)
+        if self._stop_event.wait(min(self.interval, 1.0)):
+            return
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error("System sampling failed", error=str(e))
+            if self._stop_event.wait(self.interval):
+                return
+
+    def latest(self) -> Optional[SystemSample]:
+        """Dernier relevé (None avant le premier) ; démarre l'échantillonnage au besoin"""
+        if self._thread is None:
+            self.start()
+        return self._latest
+
+    def history(self, seconds: Optional[float] = None) -> List[SystemSample]:
+        """Relevés des dernières secondes (tout l'historique par défaut), du plus ancien au plus récent"""
+        samples = list(self._history)
+        if seconds is None:
+            return samples
+        cutoff = time.time() - seconds
+        return [s for s in samples if s.timestamp >= cutoff]
+
+    def rolling(self, seconds: Optional[float] = None) -> Dict[str, float]:
+        """Moyennes et maxima CPU/mémoire sur la fenêtre (health check par tendance)"""
+        samples = self.history(seconds if seconds is not None else settings.system_health_window)
+        if not samples:
+            return {}
+        count = len(samples)
+        return {
+            "samples": count,
+            "cpu_avg": sum(s.cpu_percent for s in samples) / count,
+            "cpu_max": max(s.cpu_percent for s in samples),
+            "memory_avg": sum(s.memory_percent for s in samples) / count,
+            "memory_max": max(s.memory_percent for s in samples),
+            # Évolution de la mémoire sur la fenêtre (fuite, montée en charge)
+            "memory_trend": samples[-1].memory_percent - samples[0].memory_percent
+        }
+
+    def openmetrics_families(self) -> List[MetricFamily]:
+        """Dernier relevé au format OpenMetrics (rien avant le premier)"""
+        current = self._latest
+        if current is None:
+            return []
+        return [
+            gauge("system_cpu_percent", "CPU usage since the previous sample", current.cpu_percent),
+            gauge("system_memory_percent", "Memory usage", current.memory_percent),
+            gauge("system_memory_available_bytes", "Available memory",
+                  int(current.memory_available_mb * BYTES_PER_MB)),
+            gauge("system_disk_percent", "Disk usage", current.disk_percent, path=self.disk_path),
+            gauge("system_sample_age_seconds", "Age of the latest system sample",
+                  time.time() - current.timestamp),
+        ]
+
+    def close(self):
+        """Arrête l'échantillonnage"""
+        self._stop_event.set()
+
+
+# Instance globale (le thread démarre à la première lecture ou via le registre)
+system_sampler = SystemSampler()
+metrics_registry.register("system", system_sampler.openmetrics_families)
@@ -0,0 +1,68 @@
+"""
+Détection des chargements de tables pour invalider les résultats en cache
+Compare périodiquement l'empreinte de chaque table (svv_table_info)
+"""
+import threading
+from typing import Callable, Dict, List, Optional
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+
+
+class TableChangeMonitor:
+    """Surveille le contenu des tables et signale celles qui ont changé"""
+
+    def __init__(self, on_change: Callable[[List[str]], None], db_manager=None,
+                 interval: float = None):
+        self.on_change = on_change
+        self._db_manager = db_manager
+        self.interval = interval if interval is not None else settings.result_cache_check_interval
+        self._signatures: Optional[Dict[str, str]] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def db_manager(self):
+        if self._db_manager is None:
+            from infrastructure.database import db_manager
+            self._db_manager = db_manager
+        return self._db_manager
+
+    def check(self) -> List[str]:
+        """Compare les empreintes courantes aux précédentes ; retourne les tables modifiées"""
+        # Pas de connexion forcée : la surveillance attend le préchauffage
+        if not self.db_manager.is_ready:
+            return []
+
+        signatures = self.db_manager.get_table_change_signatures()
+        previous, self._signatures = self._signatures, signatures
+        if previous is None:
+            return []
+
+        changed = sorted(
+            name for name in set(previous) | set(signatures)
+            if previous.get(name) != signatures.get(name)
+        )
+        if changed:
+            logger.info("Table changes detected", tables=changed)
+            self.on_change(changed)
+        return changed
+
+    def start(self) -> "TableChangeMonitor":
+        """Démarre la surveillance en arrière-plan"""
+        if self.interval <= 0 or self._thread is not None:
+            return self
+
+        def _run():
+            while not self._stop_event.wait(self.interval):
+                try:
+                    self.check()
+                except Exception as e:
+                    logger.error("Table change check failed", error=str(e))
+
+        self._thread = threading.Thread(target=_run, name="table-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Arrête la surveillance"""
+        self._stop_event.set()
@@ -0,0 +1,264 @@
+"""
+Traçage léger des requêtes (spans imbriqués)
+Le span courant suit le contexte d'exécution (contextvars) ; les spans
+terminés sont exportés par lots en arrière-plan (fichier JSONL ou
+collecteur OTLP/HTTP) et leurs identifiants accompagnent les logs
+"""
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+import structlog
+from infrastructure.settings import settings
+from infrastructure.logging import logger
+from infrastructure.cancellation import OperationCancelledError
+
+SERVICE_NAME = "texttosql"
+EXPORT_BATCH_SIZE = 512
+EXPORT_INTERVAL = 1.0  # Secondes max avant l'export d'un lot incomplet
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+@dataclass
+class Span:
+    """Étape chronométrée d'une requête"""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_ns: int = field(default_factory=time.time_ns)
+    duration_ns: int = 0
+    status: str = "ok"
+    error: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Ligne JSONL"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_unix_ns": self.start_ns,
+            "duration_ms": self.duration_ns / 1e6,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+
+def current_span() -> Optional[Span]:
+    """Span actif dans le contexte courant"""
+    return _current_span.get()
+
+
+class JsonlSpanExporter:
+    """Un span par ligne, fichier renouvelé au-delà de max_bytes"""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def export(self, spans: List[Span]):
+        lines = "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+            size = f.tell()
+        if self.max_bytes and size > self.max_bytes:
+            os.replace(self.path, f"{self.path}.1")
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPSpanExporter:
+    """Envoi OTLP/HTTP encodé en JSON (collecteur OpenTelemetry ou équivalent)"""
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def _encode(self, spans: List[Span]) -> bytes:
+        otlp_spans = []
+        for span in spans:
+            otlp_span = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.start_ns + span.duration_ns),
+                "attributes": [{"key": key, "value": _otlp_value(value)}
+                               for key, value in span.attributes.items()],
+                # STATUS_CODE_OK = 1, STATUS_CODE_ERROR = 2
+                "status": {"code": 1} if span.status == "ok" else {"code": 2, "message": span.error or span.status}
+            }
+            if span.parent_id:
+                otlp_span["parentSpanId"] = span.parent_id
+            otlp_spans.append(otlp_span)
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}]
+        }]}
+        return json.dumps(payload, default=str).encode("utf-8")
+
+    def export(self, spans: List[Span]):
+        request = urllib.request.Request(
+            self.endpoint, data=self._encode(spans),
+            headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def create_span_exporter():
+    """Exportateur configuré (None : identifiants dans les logs seulement)"""
+    if settings.tracing_exporter == "jsonl":
+        return JsonlSpanExporter(settings.tracing_path, int(settings.tracing_max_file_mb * 1024 * 1024))
+    if settings.tracing_exporter == "otlp":
+        return OTLPSpanExporter(settings.tracing_otlp_endpoint)
+    return None
+
+
+class Tracer:
+    """Crée les spans et les exporte par lots depuis un thread dédié"""
+
+    def __init__(self, exporter=None, queue_size: int = None):
+        self._exporter = exporter
+        self._exporter_ready = exporter is not None
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=queue_size or settings.tracing_queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.dropped = 0
+
+    @property
+    def exporter(self):
+        if not self._exporter_ready:
+            self._exporter = create_span_exporter()
+            self._exporter_ready = True
+        return self._exporter
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """
+        Span enfant du span courant (nouvelle trace s'il n'y en a pas) ;
+        les logs émis dans le bloc portent trace_id et span_id
+        """
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else os.urandom(16).hex(),
+            span_id=os.urandom(8).hex(),
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes
+        )
+        token = _current_span.set(span)
+        log_tokens = structlog.contextvars.bind_contextvars(trace_id=span.trace_id, span_id=span.span_id)
+        started = time.perf_counter_ns()
+        try:
+            yield span
+        except OperationCancelledError:
+            span.status = "cancelled"
+            raise
+        except Exception as e:
+            span.status = "error"
+            span.error = str(e)
+            raise
+        except BaseException as e:
+            # Interruption du script Streamlit (rerun, arrêt) : pas une erreur
+            span.status = "interrupted"
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.duration_ns = time.perf_counter_ns() - started
+            try:
+                structlog.contextvars.reset_contextvars(**log_tokens)
+                _current_span.reset(token)
+            except ValueError:
+                pass  # Fermé depuis un autre contexte (générateur finalisé par le GC)
+            self._finish(span)
+
+    def _finish(self, span: Span):
+        """Met le span en file d'export (abandonné si la file est pleine)"""
+        if self.exporter is None:
+            return
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+
+    def _drain(self, first: Span) -> List[Span]:
+        batch = [first]
+        while len(batch) < EXPORT_BATCH_SIZE:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _export(self, batch: List[Span]):
+        try:
+            with self._export_lock:
+                self.exporter.export(batch)
+        except Exception as e:
+            logger.warning("Span export failed", spans=len(batch), error=str(e))
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                first = self._queue.get(timeout=EXPORT_INTERVAL)
+            except queue.Empty:
+                continue
+            self._export(self._drain(first))
+
+    def flush(self):
+        """Exporte immédiatement les spans en attente (appelant)"""
+        while True:
+            try:
+                first = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._export(self._drain(first))
+
+    def close(self):
+        """Arrête le thread d'export après un dernier envoi (redémarré au span suivant)"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop_event.set()
+        thread.join(EXPORT_INTERVAL * 2)
+        self._stop_event = threading.Event()
+        self.flush()
+
+
+# Instance globale
+tracer = Tracer()
@@ -18,6 +18,7 @@ from .ui.sidebar import SidebarManager
 from .ui.chat_interface import ChatInterface
 from .ui.footer import FooterManager
 from .services.sql_service import SQLService
+from infrastructure.cancellation import SessionOperations
 
 
 class TextToSQLChatBot:
@@ -37,43 +38,26 @@ class TextToSQLChatBot:
         
         # Initialiser les composants UI
         self.sidebar_manager = SidebarManager(self.services)
-        self.chat_interface = ChatInterface(self.services)
+        self.chat_interface = ChatInterface(self.services, self.sql_service)
         self.footer_manager = FooterManager()
         
         # Initialiser l'état de session
         self._init_session_state()
     
     def _init_services(self):
-        """Initialise les services de l'application"""
+        """
+        Récupère les services partagés du processus
+        Les services sont construits une seule fois (et non à chaque rerun) ;
+        l'état propre à chaque utilisateur reste dans st.session_state
+        """
         try:
             # Configuration de l'environnement
             self.config.init_environment()
             
-            # Import des services existants
-            from infrastructure.settings import settings
-            from infrastructure.llm import LLMManager
-            from infrastructure.cache import CacheManager
-            from infrastructure.monitoring import MetricsCollector
-            from infrastructure.logging import logger
-            from domain.sql.service import SQLGenerationService
-            
-            # Initialisation des services
-            llm_manager = LLMManager()
-            cache_manager = CacheManager()
-            metrics = MetricsCollector()
-            # SQLGenerationService n'a pas de constructeur - c'est une classe statique
-            sql_generation_service = SQLGenerationService()
+            from infrastructure.registry import get_services
+            self.services = get_services()
             
-            self.services = {
-                "llm": llm_manager,
-                "cache": cache_manager,
-                "metrics": metrics,
-                "sql_service": sql_generation_service,
-                "logger": logger,
-                "settings": settings
-            }
-            
-            # Service SQL modulaire
+            # Service SQL modulaire (léger, sans état de session)
             self.sql_service = SQLService(self.services)
             
         except Exception as e:
@@ -110,6 +94,10 @@ class TextToSQLChatBot:
         # Tables utilisées
         if 'used_tables' not in st.session_state:
             st.session_state.used_tables = []
+        
+        # Opérations en cours (appels LLM, requêtes), annulables
+        if 'operations' not in st.session_state:
+            st.session_state.operations = SessionOperations()
     
     def run(self):
         """
@@ -184,6 +172,8 @@ class TextToSQLChatBot:
             
             # Mettre à jour les statistiques
             self._update_stats(response_data)
+            if response_data.get("tables_used"):
+                st.session_state.used_tables = response_data["tables_used"]
             
             return formatted_response
             
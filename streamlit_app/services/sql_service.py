@@ -3,37 +3,78 @@
 Gère la communication avec l'IA et la génération de requêtes
 """
 
-import streamlit as st
+import hashlib
 import time
-from typing import Dict, Any, Optional, List
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Any, Optional, List, Tuple, Callable, Iterator
 import re
+from infrastructure.sql_analysis import validate_select
+from infrastructure.cancellation import CancellationHandle, OperationCancelledError
+from infrastructure.logging import logger
+from infrastructure.tracing import tracer
 
 
 class SQLService:
     """Service de génération de requêtes SQL"""
     
-    def __init__(self, services=None):
+    def __init__(self, services=None, mock_fallback: bool = True):
         self.services = services
+        # SQL simulé en cas d'erreur LLM (désactivé en traitement par lot)
+        self.mock_fallback = mock_fallback
         self.cache = services.get("cache") if services else None
         self.llm = services.get("llm") if services else None
         self.metrics = services.get("metrics") if services else None
+        self.semantic_cache = services.get("semantic_cache") if services else None
+        self.single_flight = services.get("single_flight") if services else None
+        self.settings = services.get("settings") if services else None
+        self.schema_index = services.get("schema_index") if services else None
+        self.example_store = services.get("example_store") if services else None
     
-    def generate_sql_response(self, question: str) -> Dict[str, Any]:
+    def generate_sql_response(self, question: str, language: Optional[str] = None,
+                              on_token: Optional[Callable[[str], None]] = None,
+                              cancel_handle: Optional[CancellationHandle] = None,
+                              on_poll: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
         """
         Génère une réponse SQL complète pour une question
         
         Args:
             question: Question en langage naturel
+            language: Code de langue de la question (détecté si absent)
+            on_token: Rappel recevant le SQL partiel pendant la génération en flux
+            cancel_handle: Poignée permettant d'interrompre l'appel LLM
+            on_poll: Rappel périodique pendant l'attente du LLM
             
         Returns:
             Dictionnaire avec la réponse générée
         """
+        # Span racine en API/lot, enfant du span de l'UI sinon
+        with tracer.span("sql_generation", question_chars=len(question)) as span:
+            response = self._respond(question, language, on_token, cancel_handle, on_poll)
+            span.set_attribute("response_type", response["response_type"])
+            return response
+    
+    def _respond(self, question: str, language: Optional[str],
+                 on_token: Optional[Callable[[str], None]],
+                 cancel_handle: Optional[CancellationHandle],
+                 on_poll: Optional[Callable[[], None]]) -> Dict[str, Any]:
+        """Réponse complète : caches, puis génération par le LLM"""
         start_time = time.time()
         
         try:
+            # Schéma de base de données (tables pertinentes pour la question)
+            with self._timed("schema_retrieval"):
+                schema = self._get_database_schema(question)
+            schema_version, model_name = self._cache_scope(schema)
+            namespace = f"{schema_version}|{model_name}"
+            cache_key = (
+                self.cache.question_key(question, language, schema_version, model_name)
+                if self.cache else None
+            )
+            
             # Vérifier le cache d'abord
             if self.cache:
-                cached_result = self.cache.get(question)
+                with self._timed("cache_lookup"):
+                    cached_result = self.cache.get(cache_key)
                 if cached_result:
                     if self.metrics:
                         self.metrics.record_cache_hit()
@@ -44,52 +85,79 @@ class SQLService:
                         "execution_time": time.time() - start_time,
                         "cached": True,
                         "result": cached_result.get("result"),
-                        "response_type": "sql_cached"
+                        "response_type": "sql_cached",
+                        "tables_used": cached_result.get("tables_used", [])
                     }
             
-            # Génération SQL avec LLM
             if self.metrics:
                 self.metrics.record_cache_miss()
-                self.metrics.record_sql_generation()
             
-            # Schéma de base de données
-            schema = self._get_database_schema()
+            # Cache sémantique : question reformulée déjà traitée
+            if self.semantic_cache:
+                with self._timed("cache_lookup"):
+                    match = self.semantic_cache.lookup(question, namespace, language)
+                if match:
+                    # Jamais recopié sous la clé exacte : un faux positif ne doit pas
+                    # se propager au cache exact ni au niveau persistant
+                    cached_result = match["value"]
+                    
+                    return {
+                        "success": True,
+                        "sql": cached_result["sql"],
+                        "execution_time": time.time() - start_time,
+                        "cached": True,
+                        "semantic": True,
+                        "similarity": match["similarity"],
+                        "response_type": "sql_cached",
+                        "tables_used": cached_result.get("tables_used", [])
+                    }
             
-            # Générer le SQL
-            sql_query = self._generate_sql_with_llm(question, schema)
+            # Génération SQL avec LLM, une seule fois pour les demandes concurrentes identiques
+            if self.single_flight and cache_key:
+                # Appel partagé détaché des sessions : il ne reçoit que sa propre poignée
+                # d'annulation et publie le SQL partiel, relayé à chaque appelant
+                def generate(shared_handle, publish):
+                    return self._generate_and_cache(question, language, schema, cache_key, namespace,
+                                                    publish if on_token else None, shared_handle)
+                llm_timeout = getattr(self.settings, "llm_timeout", None)
+                cache_entry, coalesced = self.single_flight.do(
+                    cache_key, generate,
+                    # Marge pour la sélection d'exemples et la validation autour de l'appel LLM
+                    timeout=llm_timeout * 2 if llm_timeout else None,
+                    cancel_handle=cancel_handle, on_poll=on_poll, on_progress=on_token
+                )
+            else:
+                cache_entry, coalesced = self._generate_and_cache(
+                    question, language, schema, cache_key, namespace, on_token, cancel_handle, on_poll
+                ), False
             
-            if not sql_query:
+            if not cache_entry:
                 return {
                     "success": False,
                     "error": "Impossible de générer la requête SQL pour cette question",
                     "response_type": "error"
                 }
             
-            # Analyser les tables utilisées
-            used_tables = self._extract_tables_from_sql(sql_query)
-            if used_tables:
-                st.session_state.used_tables = used_tables
-            
-            # Préparer la réponse
-            response_data = {
+            # Préparer la réponse (l'état de session est géré par l'UI)
+            return {
                 "success": True,
-                "sql": sql_query,
+                "sql": cache_entry["sql"],
                 "execution_time": time.time() - start_time,
                 "cached": False,
+                "coalesced": coalesced,
                 "response_type": "sql_generated",
-                "tables_used": used_tables
+                "tables_used": cache_entry.get("tables_used", []),
+                "validation_error": cache_entry.get("validation_error"),
+                "fallback": cache_entry.get("fallback", False)
             }
             
-            # Mettre en cache
-            if self.cache:
-                self.cache.set(question, {
-                    "sql": sql_query,
-                    "timestamp": time.time(),
-                    "tables_used": used_tables
-                })
-            
-            return response_data
-            
+        except OperationCancelledError:
+            return {
+                "success": False,
+                "error": "Génération SQL annulée",
+                "response_type": "cancelled",
+                "execution_time": time.time() - start_time
+            }
         except Exception as e:
             return {
                 "success": False,
@@ -98,8 +166,84 @@ class SQLService:
                 "execution_time": time.time() - start_time
             }
     
-    def _get_database_schema(self) -> str:
-        """Retourne le schéma de la base de données"""
+    def _generate_and_cache(self, question: str, language: Optional[str], schema: str,
+                            cache_key: Optional[str], namespace: str,
+                            on_token: Optional[Callable[[str], None]] = None,
+                            cancel_handle: Optional[CancellationHandle] = None,
+                            on_poll: Optional[Callable[[], None]] = None) -> Optional[Dict[str, Any]]:
+        """Génère le SQL et l'enregistre dans les caches ; retourne l'entrée de cache"""
+        # Un appel concurrent a pu terminer entre notre miss et notre tour
+        if self.cache and cache_key:
+            cache_entry = self.cache.get(cache_key)
+            if cache_entry:
+                return cache_entry
+        
+        if self.metrics:
+            self.metrics.record_sql_generation()
+        
+        # Paires validées les plus proches : exemples few-shot du prompt
+        with self._timed("example_selection"):
+            examples = (
+                [example.render() for example in
+                 self.example_store.select(question, language=language, namespace=namespace)]
+                if self.example_store else []
+            )
+        with tracer.span("llm", examples=len(examples), streaming=on_token is not None):
+            sql_query, fallback = self._generate_sql_with_llm(
+                question, schema, on_token, cancel_handle, on_poll, examples
+            )
+            sql_query = self._clean_sql(sql_query)
+        if not sql_query:
+            return None
+        
+        cache_entry = {
+            "sql": sql_query,
+            "timestamp": time.time(),
+            "tables_used": self._extract_tables_from_sql(sql_query)
+        }
+        
+        # Validation finale : un SQL invalide est renvoyé mais jamais mis en cache
+        with self._timed("validation"):
+            validation_error = self._validate_sql(sql_query)
+        if validation_error:
+            cache_entry["validation_error"] = validation_error
+            return cache_entry
+        
+        if fallback:
+            # SQL simulé (LLM indisponible ou en erreur) : renvoyé mais jamais mis
+            # en cache (aucun niveau) ni retenu comme exemple few-shot
+            cache_entry["fallback"] = True
+            return cache_entry
+        
+        if self.cache and cache_key:
+            self.cache.set(cache_key, cache_entry)
+        if self.semantic_cache:
+            self.semantic_cache.add(question, cache_entry, namespace, language)
+        if self.example_store:
+            self.example_store.add(question, sql_query, language, namespace=namespace)
+        return cache_entry
+    
+    @contextmanager
+    def _timed(self, stage: str) -> Iterator[None]:
+        """Étape tracée (span) et mesurée dans les histogrammes de latence (si les métriques sont actives)"""
+        with tracer.span(stage), (self.metrics.time_stage(stage) if self.metrics else nullcontext()):
+            yield
+    
+    def _cache_scope(self, schema: str) -> Tuple[str, str]:
+        """Version du schéma et nom du modèle qui délimitent les entrées de cache"""
+        if self.schema_index:
+            schema_version = self.schema_index.version
+        else:
+            schema_version = hashlib.md5(schema.encode()).hexdigest()[:12]
+        model_name = getattr(self.llm, "model_name", "mock") if self.llm else "mock"
+        return schema_version, model_name
+    
+    def _get_database_schema(self, question: str = "") -> str:
+        """Retourne le schéma utile : top-k tables de l'index, sinon le schéma d'exemple"""
+        if self.schema_index:
+            # Une ligne par table, de la plus pertinente à la moins pertinente
+            return self.schema_index.render(question)
+        
         return """
         Tables disponibles dans votre base de données :
         
@@ -118,17 +262,54 @@ class SQLService:
         - payments (id, order_id, amount, payment_date, method, status)
         """
     
-    def _generate_sql_with_llm(self, question: str, schema: str) -> Optional[str]:
-        """Génère le SQL avec le LLM"""
+    def _generate_sql_with_llm(self, question: str, schema: str,
+                               on_token: Optional[Callable[[str], None]] = None,
+                               cancel_handle: Optional[CancellationHandle] = None,
+                               on_poll: Optional[Callable[[], None]] = None,
+                               examples: Optional[List[str]] = None) -> Tuple[Optional[str], bool]:
+        """
+        Génère le SQL avec le LLM (en flux si un rappel on_token est fourni)
+        
+        Returns:
+            (sql, repli) où repli indique un SQL simulé à la place du LLM
+        """
         if not self.llm or not self.llm.is_available():
+            if not self.mock_fallback:
+                raise ValueError("LLM non disponible")
             # Fallback avec SQL simulé
-            return self._generate_mock_sql(question)
+            return self._generate_mock_sql(question), True
         
         try:
-            return self.llm.generate_sql(question, schema)
+            if on_token and hasattr(self.llm, "stream_sql"):
+                partial_sql = ""
+                for chunk in self.llm.stream_sql(question, schema, cancel_handle, on_poll,
+                                                 examples or ()):
+                    partial_sql += chunk
+                    on_token(partial_sql)
+                return partial_sql, False
+            return self.llm.generate_sql(question, schema, cancel_handle, on_poll, examples or ()), False
+        except OperationCancelledError:
+            # Pas de SQL de repli pour une génération annulée
+            raise
         except Exception as e:
-            st.error(f"Erreur LLM : {str(e)}")
-            return self._generate_mock_sql(question)
+            logger.error("LLM generation failed", error=str(e), fallback=self.mock_fallback)
+            if not self.mock_fallback:
+                raise
+            return self._generate_mock_sql(question), True
+    
+    @staticmethod
+    def _clean_sql(sql: Optional[str]) -> Optional[str]:
+        """Retire les balises de code markdown éventuellement renvoyées par le LLM"""
+        if not sql:
+            return sql
+        sql = sql.strip()
+        fenced = re.match(r"^```(?:sql)?\s*(.*?)\s*```$", sql, re.DOTALL | re.IGNORECASE)
+        return fenced.group(1).strip() if fenced else sql
+    
+    @staticmethod
+    def _validate_sql(sql: str) -> Optional[str]:
+        """Valide le SQL généré ; retourne un message d'erreur ou None"""
+        return validate_select(sql)
     
     def _generate_mock_sql(self, question: str) -> str:
         """Génère du SQL simulé pour les tests"""
@@ -225,12 +406,22 @@ WHERE created_at >= DATE_SUB(CURRENT_DATE, INTERVAL 30 DAY);"""
             'ja': "💡 **次に何をしますか？**"
         }
         
+        # Avertissement si la validation finale a échoué
+        warning = ""
+        if response_data.get("validation_error"):
+            warnings = {
+                'fr': "⚠️ **SQL à vérifier :**",
+                'en': "⚠️ **SQL needs review:**",
+                'ja': "⚠️ **SQLを確認してください：**"
+            }
+            warning = f"\n{warnings.get(language, warnings['fr'])} {response_data['validation_error']}\n"
+        
         return f"""{title}
 
 ```sql
 {sql}
 ```
-
+{warning}
 ⚡ *Généré en {execution_time:.2f}s*
 
 {next_actions.get(language, next_actions['fr'])}
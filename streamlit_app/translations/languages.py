@@ -20,6 +20,9 @@ class LanguageManager:
                 'ai_connected': '✅ IA connectée',
                 'ai_disconnected': '❌ IA non disponible',
                 'cache_active': '✅ Cache actif',
+                'db_connected': '✅ Base de données connectée',
+                'db_connecting': '⏳ Connexion à la base de données...',
+                'db_unavailable': '⚠️ Base de données indisponible (schéma d\'exemple)',
                 'session_stats': '📊 Statistiques de Session',
                 'questions': 'Questions',
                 'sql_generated': 'SQL générés',
@@ -40,7 +43,10 @@ class LanguageManager:
                 'next_actions': '💡 **Que souhaitez-vous faire maintenant ?**',
                 'copy_sql': '📋 Copier SQL',
                 'download': '💾 Télécharger',
-                'explain': '🔍 Expliquer'
+                'explain': '🔍 Expliquer',
+                'execute': '▶️ Exécuter',
+                'load_more': '⬇️ Charger plus',
+                'rows': 'lignes'
             },
             'en': {
                 'title': '🤖 Smart SQL Assistant',
@@ -51,6 +57,9 @@ class LanguageManager:
                 'ai_connected': '✅ AI connected',
                 'ai_disconnected': '❌ AI unavailable',
                 'cache_active': '✅ Cache active',
+                'db_connected': '✅ Database connected',
+                'db_connecting': '⏳ Connecting to the database...',
+                'db_unavailable': '⚠️ Database unavailable (sample schema)',
                 'session_stats': '📊 Session Statistics',
                 'questions': 'Questions',
                 'sql_generated': 'SQL generated',
@@ -71,7 +80,10 @@ class LanguageManager:
                 'next_actions': '💡 **What would you like to do next?**',
                 'copy_sql': '📋 Copy SQL',
                 'download': '💾 Download',
-                'explain': '🔍 Explain'
+                'explain': '🔍 Explain',
+                'execute': '▶️ Run',
+                'load_more': '⬇️ Load more',
+                'rows': 'rows'
             },
             'ja': {
                 'title': '🤖 スマートSQL アシスタント',
@@ -82,6 +94,9 @@ class LanguageManager:
                 'ai_connected': '✅ AI接続済み',
                 'ai_disconnected': '❌ AI利用不可',
                 'cache_active': '✅ キャッシュ有効',
+                'db_connected': '✅ データベース接続済み',
+                'db_connecting': '⏳ データベースに接続中...',
+                'db_unavailable': '⚠️ データベース利用不可（サンプルスキーマ）',
                 'session_stats': '📊 セッション統計',
                 'questions': '質問数',
                 'sql_generated': 'SQL生成数',
@@ -102,7 +117,10 @@ class LanguageManager:
                 'next_actions': '💡 **次に何をしますか？**',
                 'copy_sql': '📋 SQLをコピー',
                 'download': '💾 ダウンロード',
-                'explain': '🔍 説明'
+                'explain': '🔍 説明',
+                'execute': '▶️ 実行',
+                'load_more': '⬇️ さらに読み込む',
+                'rows': '行'
             }
         }
         
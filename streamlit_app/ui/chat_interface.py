@@ -4,23 +4,35 @@ Gère l'affichage et l'interaction des messages de chat
 """
 
 import streamlit as st
+import time
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable
+from infrastructure.cancellation import CancellationHandle, SessionOperations, run_cancellable
+from infrastructure.columnar import ColumnarResult
+from infrastructure.tracing import tracer
 from ..translations.languages import language_manager
 
 
 class ChatInterface:
     """Gestionnaire de l'interface de chat"""
     
-    def __init__(self, services=None):
+    def __init__(self, services=None, sql_service=None):
         self.services = services
+        self.sql_service = sql_service
+        self.query_executor = services.get("query_executor") if services else None
+        self.result_cache = (
+            services.get("cache")
+            if services and services["settings"].result_cache_enabled else None
+        )
         self.language_manager = language_manager
     
     def render(self):
         """Affiche l'interface de chat complète"""
-        self._render_header()
-        self._render_messages()
-        self._render_input()
+        # Un span par exécution du script : le coût du rerun apparaît dans la trace
+        with tracer.span("ui_render", messages=len(st.session_state.get('messages', []))):
+            self._render_header()
+            self._render_messages()
+            self._render_input()
     
     def _render_header(self):
         """En-tête de l'interface de chat"""
@@ -119,7 +131,7 @@ class ChatInterface:
         st.code(sql_code, language="sql")
         
         # Actions pour le SQL
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4 = st.columns(4)
         
         current_lang = st.session_state.get('language', 'fr')
         
@@ -144,15 +156,154 @@ class ChatInterface:
                 key=f"explain_{hash(sql_code)}"
             ):
                 self._explain_sql(sql_code)
+        
+        execute_clicked = False
+        if self.query_executor:
+            with col4:
+                execute_clicked = st.button(
+                    self.language_manager.get_text('execute', current_lang),
+                    key=f"execute_{hash(sql_code)}"
+                )
+        
+        self._render_query_result(sql_code, start=execute_clicked)
+    
+    def _render_query_result(self, sql_code: str, start: bool = False):
+        """Affiche le résultat d'une requête exécutée, page par page"""
+        results = st.session_state.setdefault('query_results', {})
+        result_key = f"result_{hash(sql_code)}"
+        current_lang = st.session_state.get('language', 'fr')
+        
+        if start:
+            # Nouvelle exécution : l'ancien curseur rend sa connexion au pool
+            previous = results.pop(result_key, None)
+            if previous and previous["cursor"]:
+                previous["cursor"].close()
+            
+            # Résultat complet déjà en cache : pas d'aller-retour vers Redshift
+            cached = self.result_cache.get_cached_sql_result(sql_code) if self.result_cache else None
+            if cached is not None:
+                results[result_key] = {"cursor": None, "data": cached, "cached": True}
+                start = False
+            else:
+                try:
+                    with tracer.span("ui_execute"), self._operations().track("query") as handle:
+                        cursor = run_cancellable(
+                            lambda: self.query_executor.execute(sql_code, cancel_handle=handle),
+                            handle, self._progress_indicator()
+                        )
+                except Exception as e:
+                    st.error(f"Erreur lors de l'exécution de la requête : {str(e)}")
+                    return
+                results[result_key] = {"cursor": cursor, "data": ColumnarResult()}
+        
+        result = results.get(result_key)
+        if not result:
+            return
+        
+        cursor = result["cursor"]
+        data = result["data"]
+        has_more = cursor is not None and cursor.has_more
+        table = st.empty()
+        if data.num_rows or not has_more:
+            # Table Arrow transmise directement (pas de DataFrame intermédiaire)
+            table.dataframe(data.table)
+        
+        caption = f"{data.num_rows}{'+' if has_more else ''} {self.language_manager.get_text('rows', current_lang)}"
+        if result.get("cached"):
+            caption += f" {self.language_manager.get_text('from_cache', current_lang)}"
+        guard = cursor.guard if cursor is not None else None
+        if guard and guard.limit_applied:
+            caption += f" · LIMIT {guard.limit_applied}"
+        st.caption(caption)
+        if guard:
+            for warning in guard.warnings:
+                st.warning(f"⚠️ {warning}")
+        
+        if data.num_rows:
+            # Exports générés uniquement au clic
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            csv_col, parquet_col = st.columns(2)
+            with csv_col:
+                st.download_button(
+                    label="📄 CSV",
+                    data=data.to_csv_bytes,
+                    file_name=f"result_{timestamp}.csv",
+                    mime="text/csv",
+                    key=f"csv_{hash(sql_code)}"
+                )
+            with parquet_col:
+                st.download_button(
+                    label="🧱 Parquet",
+                    data=data.to_parquet_bytes,
+                    file_name=f"result_{timestamp}.parquet",
+                    mime="application/vnd.apache.parquet",
+                    key=f"parquet_{hash(sql_code)}"
+                )
+        
+        load_more = has_more and not start and st.button(
+            self.language_manager.get_text('load_more', current_lang),
+            key=f"more_{hash(sql_code)}"
+        )
+        if (start or load_more) and self._fetch_page(sql_code, cursor, data, table):
+            st.rerun()
+    
+    def _fetch_page(self, sql_code: str, cursor, data: ColumnarResult, table) -> bool:
+        """Lit une page du curseur, affichée lot par lot dès réception"""
+        on_poll = self._progress_indicator()
+        try:
+            with tracer.span("ui_fetch_page") as span, self._operations().track("query") as handle:
+                handle.add_callback(cursor.cancel)
+                batches = cursor.fetch(self.services["settings"].query_page_size)
+                while True:
+                    # Lecture hors du thread du script : il reste interruptible
+                    batch = run_cancellable(lambda: next(batches, None), handle, on_poll)
+                    if batch is None:
+                        break
+                    data.append_rows(batch, cursor.columns)
+                    table.dataframe(data.table)
+                span.set_attribute("rows", data.num_rows)
+            data.columns = data.columns or list(cursor.columns)  # Résultat vide
+        except Exception as e:
+            cursor.close()
+            st.error(f"Erreur lors de la lecture des résultats : {str(e)}")
+            return False
+        
+        # Seuls les résultats lus en entier sont mis en cache
+        if cursor.exhausted and self.result_cache:
+            self.result_cache.cache_sql_result(sql_code, data)
+        return True
+    
+    @staticmethod
+    def _operations() -> SessionOperations:
+        """Opérations annulables de la session"""
+        if 'operations' not in st.session_state:
+            st.session_state.operations = SessionOperations()
+        return st.session_state.operations
+    
+    @staticmethod
+    def _progress_indicator() -> Callable[[], None]:
+        """
+        Durée d'attente rafraîchie pendant les opérations longues ; chaque
+        rafraîchissement permet à Streamlit d'interrompre le script (clic, nouvelle question)
+        """
+        status = st.empty()
+        started = time.perf_counter()
+        
+        def on_poll():
+            status.caption(f"⏳ {time.perf_counter() - started:.1f}s")
+        
+        return on_poll
     
     def _render_input(self):
         """Zone de saisie pour les nouvelles questions"""
         current_lang = st.session_state.get('language', 'fr')
         placeholder = self.language_manager.get_text('input_placeholder', current_lang)
         
-        # Input utilisateur
-        if user_input := st.chat_input(placeholder):
-            self._handle_user_input(user_input)
+        # Input utilisateur (ou question d'exemple choisie dans la sidebar)
+        user_input = st.chat_input(placeholder)
+        pending_question = st.session_state.pop('pending_question', None)
+        if user_input or pending_question:
+            self._handle_user_input(user_input or pending_question)
     
     def _handle_user_input(self, user_input: str):
         """Traite une nouvelle question utilisateur"""
@@ -163,52 +314,64 @@ class ChatInterface:
             "timestamp": datetime.now()
         })
         
-        # Générer la réponse
-        if self.services:
-            try:
-                response = self._generate_response(user_input)
+        # Générer la réponse (une opération encore en cours est abandonnée)
+        if self.sql_service:
+            with tracer.span("ui_question", question_chars=len(user_input)):
+                operations = self._operations()
+                operations.cancel_all()
+                try:
+                    with operations.track("llm") as handle:
+                        response_data = self._generate_streaming(user_input, handle)
+                    metrics = self.services.get("metrics") if self.services else None
+                    if metrics:
+                        metrics.record_request(response_data.get("execution_time", 0.0),
+                                               response_data.get("success", False))
+                    current_lang = st.session_state.get('language', 'fr')
+                    response = self.sql_service.format_sql_response(response_data, current_lang)
                 
-                # Ajouter la réponse de l'assistant
-                st.session_state.messages.append({
-                    "role": "assistant",
-                    "content": response,
-                    "timestamp": datetime.now()
-                })
+                    # Ajouter la réponse de l'assistant
+                    st.session_state.messages.append({
+                        "role": "assistant",
+                        "content": response,
+                        "timestamp": datetime.now()
+                    })
                 
-                # Mettre à jour les statistiques
-                self._update_stats()
+                    # Mettre à jour l'état de session
+                    if response_data.get("tables_used"):
+                        st.session_state.used_tables = response_data["tables_used"]
+                    self._update_stats(response_data)
                 
-            except Exception as e:
-                st.error(f"Erreur lors de la génération de la réponse : {str(e)}")
+                except Exception as e:
+                    st.error(f"Erreur lors de la génération de la réponse : {str(e)}")
         
         st.rerun()
     
-    def _generate_response(self, question: str) -> str:
-        """Génère une réponse SQL pour la question"""
-        # Cette méthode devrait être connectée au service SQL
-        # Pour l'instant, on retourne une réponse simulée
-        current_lang = st.session_state.get('language', 'fr')
+    def _generate_streaming(self, question: str,
+                            cancel_handle: Optional[CancellationHandle] = None) -> Dict[str, Any]:
+        """Génère la réponse en affichant le SQL partiel au fil du flux"""
+        # Affiche immédiatement la question (l'historique n'est redessiné qu'au rerun)
+        self._render_user_message(question, datetime.now())
         
-        sql_title = self.language_manager.get_text('sql_query_title', current_lang)
-        next_actions = self.language_manager.get_text('next_actions', current_lang)
-        
-        # SQL simulé
-        sql_query = f"""
-SELECT COUNT(*) as total_users
-FROM users
-WHERE status = 'active'
-  AND created_at >= DATE_TRUNC('month', CURRENT_DATE);
-"""
-        
-        return f"""
-{sql_title}
-
-```sql
-{sql_query.strip()}
-```
-
-{next_actions}
-"""
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            placeholder.markdown("⏳ ...")
+            started = time.perf_counter()
+            partial = {"sql": None}
+            
+            def on_token(partial_sql: str):
+                partial["sql"] = partial_sql
+                placeholder.code(partial_sql + " ▌", language="sql")
+            
+            def on_poll():
+                # Rafraîchissement pendant l'attente : point d'interruption du script
+                if partial["sql"] is None:
+                    placeholder.markdown(f"⏳ {time.perf_counter() - started:.1f}s")
+                else:
+                    placeholder.code(partial["sql"] + " ▌", language="sql")
+            
+            return self.sql_service.generate_sql_response(
+                question, on_token=on_token, cancel_handle=cancel_handle, on_poll=on_poll
+            )
     
     def _explain_sql(self, sql_code: str):
         """Explique le code SQL"""
@@ -259,7 +422,7 @@ This query allows you to:
         explanation = explanations.get(current_lang, explanations['fr'])
         st.markdown(explanation)
     
-    def _update_stats(self):
+    def _update_stats(self, response_data: Dict[str, Any]):
         """Met à jour les statistiques de session"""
         if 'chat_stats' not in st.session_state:
             st.session_state.chat_stats = {
@@ -269,5 +432,9 @@ This query allows you to:
                 "session_start": datetime.now()
             }
         
-        st.session_state.chat_stats["total_questions"] += 1
-        st.session_state.chat_stats["sql_generated"] += 1
+        stats = st.session_state.chat_stats
+        stats["total_questions"] += 1
+        if response_data.get("success", False):
+            stats["sql_generated"] += 1
+            if response_data.get("cached", False):
+                stats["cache_hits"] += 1
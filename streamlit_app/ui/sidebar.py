@@ -65,6 +65,17 @@ class SidebarManager:
             st.error(self.language_manager.get_text('ai_disconnected', st.session_state.language))
         
         st.success(self.language_manager.get_text('cache_active', st.session_state.language))
+        
+        # État de la connexion (préchauffée en arrière-plan, sans bloquer l'affichage)
+        database = self.services.get("database") if self.services else None
+        if database is not None:
+            state = database.status()["state"]
+            if state == "ready":
+                st.success(self.language_manager.get_text('db_connected', st.session_state.language))
+            elif state == "connecting":
+                st.info(self.language_manager.get_text('db_connecting', st.session_state.language))
+            else:
+                st.warning(self.language_manager.get_text('db_unavailable', st.session_state.language))
     
     def _render_session_stats(self):
         """Statistiques de session"""
@@ -141,15 +152,8 @@ class SidebarManager:
         
         for i, example in enumerate(current_examples):
             if st.button(f"💡 {example}", key=f"example_{i}"):
-                # Ajouter l'exemple au chat
-                if 'messages' not in st.session_state:
-                    st.session_state.messages = []
-                
-                st.session_state.messages.append({
-                    "role": "user",
-                    "content": example,
-                    "timestamp": datetime.now()
-                })
+                # L'exemple est traité comme une question saisie (voir ChatInterface)
+                st.session_state.pending_question = example
                 st.rerun()
     
     def _render_actions(self):
@@ -183,6 +187,13 @@ class SidebarManager:
     
     def _clear_conversation(self):
         """Efface la conversation et démarre une nouvelle session"""
+        # Interrompt les générations et requêtes en cours, libère les curseurs ouverts
+        if 'operations' in st.session_state:
+            st.session_state.operations.cancel_all()
+        for result in st.session_state.pop('query_results', {}).values():
+            if result["cursor"]:
+                result["cursor"].close()
+        
         st.session_state.messages = [{
             "role": "assistant", 
             "content": self.language_manager.get_welcome_with_examples(st.session_state.language),
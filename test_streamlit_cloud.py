@@ -117,6 +117,1358 @@ def test_streamlit_entry():
         print(f"❌ Erreur point d'entrée: {e}")
         return False
 
+def test_cache_bounds():
+    """Test que le cache mémoire reste borné et évince selon la politique"""
+    try:
+        print("🗄️ Test du cache borné...")
+        
+        from infrastructure.cache import CacheManager
+        
+        for policy in ['lru', 'lfu', 'tinylfu']:
+            cache = CacheManager(max_entries=10, max_bytes=10_000, policy=policy)
+            for i in range(50):
+                cache.set(f"key_{i}", {"sql": f"SELECT {i}"})
+            stats = cache.stats()
+            if stats['entries'] > 10 or stats['evictions'] != 40:
+                print(f"❌ Cache non borné ({policy}): {stats}")
+                return False
+            cache.close()
+        
+        # Limite en octets
+        cache = CacheManager(max_entries=100, max_bytes=500, policy='lru')
+        for i in range(20):
+            cache.set(f"key_{i}", "x" * 100)
+        if cache.stats()['bytes'] > 500 or cache.get("key_19") is None:
+            print(f"❌ Limite en octets non respectée: {cache.stats()}")
+            return False
+        cache.close()
+        
+        print("✅ Cache borné OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur cache: {e}")
+        return False
+
+def test_persistent_cache():
+    """Test du cache persistant (SQLite) : suppressions, connexions et SQL de repli"""
+    try:
+        print("💾 Test du cache persistant...")
+        
+        import os
+        import tempfile
+        import threading
+        import time
+        from infrastructure.cache import CacheManager
+        from infrastructure.persistent_cache import PersistentCache
+        from infrastructure.semantic_cache import SemanticCache
+        from streamlit_app.services.sql_service import SQLService
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.db")
+            persistent = PersistentCache(path=path, flush_interval=0.05)
+            
+            # Survit à un redémarrage ; une suppression n'est pas réécrite par un lot ultérieur
+            persistent.set("kept", {"sql": "SELECT 1"})
+            persistent.set("deleted", {"sql": "SELECT 2"})
+            persistent.flush()
+            persistent.set("deleted", {"sql": "SELECT 3"})
+            persistent.delete("deleted")
+            persistent.flush()
+            if persistent.get("deleted") is not None or persistent.get("kept") != {"sql": "SELECT 1"}:
+                print("❌ Suppression perdue")
+                return False
+            
+            # Les connexions des threads terminés sont fermées
+            workers = [threading.Thread(target=persistent.get, args=("kept",)) for _ in range(5)]
+            for worker in workers:
+                worker.start()
+                worker.join()
+            time.sleep(0.2)  # Passage du thread d'écriture
+            if any(not thread.is_alive() for thread in persistent._connections):
+                print(f"❌ Connexions non fermées: {len(persistent._connections)}")
+                return False
+            persistent.close()
+            if persistent._connections:
+                print("❌ Connexions ouvertes après l'arrêt")
+                return False
+            
+            reopened = PersistentCache(path=path, flush_interval=60)
+            if reopened.get("kept") != {"sql": "SELECT 1"}:
+                print("❌ Entrée non persistée")
+                return False
+            
+            # SQL simulé (aucun LLM) : aucun niveau de cache ne le conserve
+            cache = CacheManager(max_entries=10, max_bytes=100_000, persistent=reopened)
+            semantic = SemanticCache(max_entries=10)
+            service = SQLService({"cache": cache, "semantic_cache": semantic})
+            response = service.generate_sql_response("Combien d'utilisateurs actifs ?")
+            reopened.flush()
+            if not response.get("fallback") or cache.stats()["entries"] != 0 \
+                    or reopened.stats()["entries"] != 1 or semantic.stats()["entries"] != 0:
+                print(f"❌ Repli mis en cache: {cache.stats()} / {semantic.stats()}")
+                return False
+            cache.close()
+        
+        print("✅ Cache persistant OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur cache persistant: {e}")
+        return False
+
+def test_question_normalization():
+    """Test que les variantes d'une même question partagent une clé de cache"""
+    try:
+        print("🔤 Test de normalisation des questions...")
+        
+        from infrastructure.normalization import normalize_question
+        
+        variants = [
+            ("Combien d'utilisateurs ?", "combien d'utilisateurs"),
+            ("Combien d’utilisateurs ?", "ＣＯＭＢＩＥＮ  d'utilisateurs"),
+            ("What are this week's sales?", "what are this week's sales"),
+            ("ユーザー総数は？", "ユーザー総数"),
+            ("Orders with amount>100?", "orders with amount > 100"),
+        ]
+        for left, right in variants:
+            if normalize_question(left) != normalize_question(right):
+                print(f"❌ Normalisation différente: {left!r} / {right!r}")
+                return False
+        
+        # Opérateurs et signes portent le sens : jamais la même clé
+        distinct = [
+            ("orders with amount > 100", "orders with amount < 100"),
+            ("orders with amount >= 100", "orders with amount > 100"),
+            ("balance of -5", "balance of 5"),
+            ("marge de 10% ?", "marge de 10 ?"),
+            ("status != 'paid'", "status = 'paid'"),
+        ]
+        for left, right in distinct:
+            if normalize_question(left) == normalize_question(right):
+                print(f"❌ Normalisation confondue: {left!r} / {right!r}")
+                return False
+        
+        print("✅ Normalisation OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur normalisation: {e}")
+        return False
+
+def test_semantic_cache():
+    """Test que le cache sémantique rejette les questions proches mais différentes"""
+    try:
+        print("🧭 Test du cache sémantique...")
+        
+        from infrastructure.cache import CacheManager
+        from infrastructure.semantic_cache import SemanticCache
+        from streamlit_app.services.sql_service import SQLService
+        
+        # Seuil nul : seule la vérification des littéraux et négations décide
+        near_misses = [
+            ("Chiffre d'affaires par mois en 2023", "Chiffre d'affaires par mois en 2024"),
+            ("top 10 des produits les plus vendus", "top 3 des produits les plus vendus"),
+            ("nombre d'utilisateurs actifs", "nombre d'utilisateurs inactifs"),
+            ("commandes du client 'ACME'", "commandes du client 'Globex'"),
+            ("clients ayant commandé", "clients n'ayant pas commandé"),
+            ("produits les plus vendus", "produits les moins vendus"),
+            ("paid orders by month", "unpaid orders by month"),
+        ]
+        for stored, asked in near_misses:
+            cache = SemanticCache(threshold=0.0, max_entries=10)
+            cache.add(stored, {"sql": "SELECT 1"})
+            if cache.lookup(asked) is not None:
+                print(f"❌ Faux positif: {stored!r} / {asked!r}")
+                return False
+        
+        # Une reformulation reste servie, dans son espace de noms seulement
+        cache = SemanticCache(max_entries=10)
+        cache.add("nombre total d'utilisateurs actifs par pays et par mois depuis le lancement",
+                  {"sql": "SELECT 1"}, namespace="v1")
+        paraphrase = "nombre total des utilisateurs actifs par pays et par mois depuis le lancement du produit"
+        if cache.lookup(paraphrase, namespace="v1") is None or cache.lookup(paraphrase, namespace="v2"):
+            print("❌ Reformulation mal servie")
+            return False
+        
+        # Un résultat sémantique n'est jamais recopié dans le cache exact
+        exact = CacheManager(max_entries=10, max_bytes=100_000)
+        service = SQLService({"cache": exact, "semantic_cache": cache})
+        schema_version, model_name = service._cache_scope(service._get_database_schema())
+        cache.add("ventes par mois et par région", {"sql": "SELECT 2"},
+                  namespace=f"{schema_version}|{model_name}")
+        response = service.generate_sql_response("Quelles sont les ventes par mois et par région ?")
+        if not response.get("semantic") or exact.stats()["entries"] != 0:
+            print(f"❌ Résultat sémantique promu: {response} / {exact.stats()}")
+            return False
+        exact.close()
+        
+        print("✅ Cache sémantique OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur cache sémantique: {e}")
+        return False
+
+def test_example_store():
+    """Test que les exemples few-shot sont cloisonnés et jamais issus d'un repli"""
+    try:
+        print("📚 Test du magasin d'exemples...")
+        
+        import os
+        import tempfile
+        from infrastructure.example_store import ExampleStore
+        from streamlit_app.services.sql_service import SQLService
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "examples.db")
+            store = ExampleStore(path=path, max_examples=10, min_similarity=0.0)
+            store.add("ventes par région", "SELECT region, SUM(amount) FROM sales GROUP BY region",
+                      namespace="v1|model")
+            
+            # Un autre schéma ou un autre modèle ne voit pas cet exemple, y compris après rechargement
+            if not store.select("ventes par pays", namespace="v1|model"):
+                print("❌ Exemple du même espace de noms non proposé")
+                return False
+            reloaded = ExampleStore(path=path, max_examples=10, min_similarity=0.0)
+            if reloaded.select("ventes par pays", namespace="v2|model") or \
+                    not reloaded.select("ventes par pays", namespace="v1|model"):
+                print("❌ Exemples non cloisonnés par espace de noms")
+                return False
+            
+            # SQL simulé (aucun LLM) : marqué comme repli et jamais enregistré
+            service = SQLService({"example_store": store})
+            response = service.generate_sql_response("Quelles sont les ventes des 7 derniers jours ?")
+            if not response.get("fallback") or store.stats()["examples"] != 1:
+                print(f"❌ Repli enregistré comme exemple: {response} / {store.stats()}")
+                return False
+        
+        print("✅ Magasin d'exemples OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur magasin d'exemples: {e}")
+        return False
+
+def test_async_llm():
+    """Test du chemin LLM asynchrone avec un LLM factice (sans appel Gemini)"""
+    try:
+        print("⚡ Test du LLM asynchrone...")
+        
+        import asyncio
+        from infrastructure.llm import LLMManager, create_fake_llm
+        
+        manager = LLMManager(llm=create_fake_llm(responses=["SELECT 1;"], sleep=0.05))
+        manager.max_concurrency = 2
+        
+        async def generate_many():
+            return await asyncio.gather(*[
+                manager.agenerate_sql(f"question {i}") for i in range(6)
+            ])
+        
+        results = asyncio.run(generate_many())
+        if results != ["SELECT 1;"] * 6:
+            print(f"❌ Résultats inattendus: {results}")
+            return False
+        
+        # Chemin synchrone via la boucle partagée
+        if manager.generate_sql("question") != "SELECT 1;":
+            print("❌ Génération synchrone incorrecte")
+            return False
+        
+        print("✅ LLM asynchrone OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur LLM asynchrone: {e}")
+        return False
+
+def test_single_flight_cancellation():
+    """Test que l'annulation d'un appelant n'interrompt pas les autres attendants"""
+    try:
+        print("🔀 Test de la coalescence annulable...")
+        
+        import threading
+        import time
+        from infrastructure.cancellation import CancellationHandle, OperationCancelledError
+        from infrastructure.singleflight import SingleFlight
+        
+        flight = SingleFlight()
+        started = threading.Event()
+        shared_handles = []
+        
+        def generate(handle, publish):
+            shared_handles.append(handle)
+            started.set()
+            publish("SELECT")
+            time.sleep(0.6)
+            handle.raise_if_cancelled()
+            return "SELECT 1"
+        
+        results, progress = {}, []
+        leader_handle = CancellationHandle("leader")
+        
+        def leader():
+            try:
+                results["leader"] = flight.do("k", generate, cancel_handle=leader_handle)
+            except OperationCancelledError:
+                results["leader"] = "cancelled"
+        
+        def follower():
+            results["follower"] = flight.do("k", generate, on_progress=progress.append)
+        
+        threads = [threading.Thread(target=leader)]
+        threads[0].start()
+        started.wait(2)
+        threads.append(threading.Thread(target=follower))
+        threads[1].start()
+        time.sleep(0.3)
+        leader_handle.cancel()
+        for thread in threads:
+            thread.join(5)
+        
+        if results.get("leader") != "cancelled" or results.get("follower") != ("SELECT 1", True):
+            print(f"❌ Annulation propagée au suivant: {results}")
+            return False
+        if progress != ["SELECT"] or len(shared_handles) != 1 or shared_handles[0].cancelled:
+            print(f"❌ Appel partagé incorrect: {progress} / {shared_handles}")
+            return False
+        
+        # Dernier attendant parti : l'appel partagé est annulé
+        started.clear()
+        alone = CancellationHandle("alone")
+        threading.Timer(0.2, alone.cancel).start()
+        try:
+            flight.do("k2", generate, cancel_handle=alone)
+        except OperationCancelledError:
+            pass
+        if not shared_handles[-1].cancelled or flight.in_flight() != 0:
+            print("❌ Appel abandonné non annulé")
+            return False
+        flight.close()
+        
+        print("✅ Coalescence annulable OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur coalescence: {e}")
+        return False
+
+def test_query_limit():
+    """Test de l'injection et du plafonnement de LIMIT / TOP / FETCH FIRST"""
+    try:
+        print("🛡️ Test du plafonnement des requêtes...")
+        
+        from infrastructure.query_guard import apply_limit
+        
+        cases = [
+            ("SELECT a FROM t", "SELECT a FROM t\nLIMIT 100", 100),
+            ("SELECT a FROM t LIMIT 5000;", "SELECT a FROM t LIMIT 100", 100),
+            ("SELECT a FROM t LIMIT 10", "SELECT a FROM t LIMIT 10", None),
+            ("SELECT TOP 100000 * FROM t", "SELECT TOP 100 * FROM t", 100),
+            ("select distinct top (5000) a from t", "select distinct top (100) a from t", 100),
+            ("SELECT TOP 10 a FROM t", "SELECT TOP 10 a FROM t", None),
+            ("SELECT a FROM t ORDER BY a FETCH FIRST 100000 ROWS ONLY",
+             "SELECT a FROM t ORDER BY a FETCH FIRST 100 ROWS ONLY", 100),
+            ("SELECT a FROM t OFFSET 5 ROWS FETCH NEXT 20 ROWS ONLY",
+             "SELECT a FROM t OFFSET 5 ROWS FETCH NEXT 20 ROWS ONLY", None),
+            ("SELECT a FROM t FETCH FIRST ROW ONLY", "SELECT a FROM t FETCH FIRST ROW ONLY", None),
+            ("WITH c AS (SELECT TOP 3 a FROM t) SELECT TOP 5000 * FROM c",
+             "WITH c AS (SELECT TOP 3 a FROM t) SELECT TOP 100 * FROM c", 100),
+            ("SELECT * FROM (SELECT TOP 5000 a FROM t) s",
+             "SELECT * FROM (SELECT TOP 5000 a FROM t) s\nLIMIT 100", 100),
+            ("SELECT a FROM t UNION SELECT TOP 5 a FROM u",
+             "SELECT * FROM (\nSELECT a FROM t UNION SELECT TOP 5 a FROM u\n) AS limited_query\nLIMIT 100", 100),
+            ("SELECT TOP 10 PERCENT a FROM t",
+             "SELECT * FROM (\nSELECT TOP 10 PERCENT a FROM t\n) AS limited_query\nLIMIT 100", 100),
+        ]
+        for sql, expected_sql, expected_limit in cases:
+            result = apply_limit(sql, 100)
+            if result != (expected_sql, expected_limit):
+                print(f"❌ {sql!r} -> {result!r}")
+                return False
+        
+        print("✅ Plafonnement des requêtes OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur plafonnement des requêtes: {e}")
+        return False
+
+def test_api_execute():
+    """Test de /execute : jeton d'API exigé et troncature détectée sans faux positif"""
+    try:
+        print("🔐 Test de l'API /execute...")
+        
+        from starlette.requests import Request
+        from api.app import APIError, _require_api_key, _run_query
+        from infrastructure.settings import settings
+        
+        class StubCursor:
+            def __init__(self, total):
+                self.total, self.columns, self.guard, self.exhausted = total, ["id"], None, False
+            def fetch(self, max_rows):
+                rows = [(i,) for i in range(min(self.total, max_rows))]
+                self.exhausted = len(rows) < max_rows
+                yield rows
+            def close(self):
+                pass
+        
+        class StubExecutor:
+            def __init__(self, total):
+                self.total = total
+            def execute(self, sql):
+                return StubCursor(self.total)
+        
+        # Exactement max_rows lignes : résultat complet ; une de plus : tronqué
+        for total, expected in ((10, False), (11, True)):
+            data, _, truncated = _run_query(StubExecutor(total), None, "SELECT id FROM t", 10)
+            if truncated != expected:
+                print(f"❌ Troncature de {total} lignes: {truncated}")
+                return False
+        
+        def status(headers):
+            scope = {"type": "http", "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]}
+            try:
+                _require_api_key(Request(scope))
+                return 200
+            except APIError as e:
+                return e.status_code
+        
+        previous = settings.api_key
+        try:
+            settings.api_key = ""
+            disabled = status({"Authorization": "Bearer x"})
+            settings.api_key = "secret"
+            statuses = [status({}), status({"Authorization": "Bearer wrong"}),
+                        status({"Authorization": "Bearer secret"}), status({"X-API-Key": "secret"})]
+        finally:
+            settings.api_key = previous
+        if disabled != 403 or statuses != [401, 401, 200, 200]:
+            print(f"❌ Authentification: {disabled} {statuses}")
+            return False
+        
+        print("✅ API /execute OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur API /execute: {e}")
+        return False
+
+def test_columnar_result():
+    """Test du résultat colonnaire Arrow et de ses exports"""
+    try:
+        print("🧱 Test du résultat colonnaire...")
+        
+        import io
+        import pyarrow.parquet as pq
+        from infrastructure.columnar import ColumnarResult
+        
+        result = ColumnarResult()
+        # Premier lot entièrement NULL : le type est promu au lot suivant
+        result.append_rows([(1, None), (2, None)], ["id", "amount"])
+        result.append_rows([(3, 9.5)])
+        
+        if result.num_rows != 3 or result.table.column("amount").to_pylist() != [None, None, 9.5]:
+            print(f"❌ Table inattendue: {result.table}")
+            return False
+        
+        if not result.to_csv_bytes().startswith(b'"id","amount"'):
+            print("❌ Export CSV incorrect")
+            return False
+        
+        if pq.read_table(io.BytesIO(result.to_parquet_bytes())).num_rows != 3:
+            print("❌ Export Parquet incorrect")
+            return False
+        
+        print("✅ Résultat colonnaire OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur résultat colonnaire: {e}")
+        return False
+
+def test_prompt_budget():
+    """Test du budget de tokens du prompt"""
+    try:
+        print("📏 Test du budget du prompt...")
+        
+        from infrastructure.prompt_builder import PromptBuilder, count_tokens
+        
+        builder = PromptBuilder(max_tokens=150)
+        schema = [f"- table_{i}(id integer, name varchar, amount numeric)" for i in range(20)]
+        examples = ["Question : combien ?\nSQL : SELECT COUNT(*) FROM users;"] * 5
+        prompt = builder.build("Chiffre d'affaires par mois " * 40, schema, examples)
+        
+        if prompt.tokens > 150 or count_tokens(prompt.text) > 150:
+            print(f"❌ Plafond dépassé: {prompt.tokens} tokens")
+            return False
+        
+        # Tables les plus pertinentes conservées en premier
+        if not prompt.truncated or "- table_0(" not in prompt.text or "- table_19(" in prompt.text:
+            print("❌ Troncature du schéma incorrecte")
+            return False
+        
+        print(f"✅ Budget du prompt OK ({prompt.tokens} tokens)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur budget du prompt: {e}")
+        return False
+
+def test_latency_histogram():
+    """Test des percentiles de l'histogramme de latence"""
+    try:
+        print("⏱️ Test des histogrammes de latence...")
+        
+        from infrastructure.latency import LatencyHistogram
+        
+        histogram = LatencyHistogram()
+        for i in range(1, 1001):
+            histogram.record(i / 1000)  # 1 ms à 1 s
+        summary = histogram.percentiles(60)
+        
+        # Précision relative des seaux logarithmiques : quelques pourcents
+        expected = {"p50": 0.5, "p90": 0.9, "p99": 0.99, "p999": 0.999}
+        for name, value in expected.items():
+            if abs(summary[name] - value) / value > 0.05:
+                print(f"❌ {name} inattendu: {summary[name]:.4f} (attendu {value})")
+                return False
+        
+        if summary["count"] != 1000 or summary["max"] != 1.0:
+            print(f"❌ Résumé incorrect: {summary}")
+            return False
+        
+        print("✅ Histogrammes de latence OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur histogrammes de latence: {e}")
+        return False
+
+def test_service_registry():
+    """Test que les services sont construits une fois par processus et arrêtés proprement"""
+    try:
+        print("🏗️ Test du registre de services...")
+        
+        import threading
+        from infrastructure.registry import ServiceRegistry
+        
+        class Service:
+            built = 0
+            def __init__(self):
+                Service.built += 1
+                self.closed = False
+            def close(self):
+                self.closed = True
+        
+        registry = ServiceRegistry()
+        registry.register("service", Service)
+        
+        # Accès concurrents (reruns de plusieurs sessions) : une seule construction
+        instances = []
+        threads = [threading.Thread(target=lambda: instances.append(registry.get("service"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if Service.built != 1 or any(instance is not instances[0] for instance in instances):
+            print(f"❌ Service construit {Service.built} fois")
+            return False
+        if registry.as_dict()["service"] is not instances[0]:
+            print("❌ as_dict ne renvoie pas l'instance partagée")
+            return False
+        
+        # Arrêt : close() appelé, puis reconstruction au prochain accès
+        registry.shutdown()
+        if not instances[0].closed or registry.get("service") is instances[0]:
+            print("❌ Arrêt du registre incorrect")
+            return False
+        
+        try:
+            registry.get("inconnu")
+            print("❌ Service inconnu accepté")
+            return False
+        except KeyError:
+            pass
+        
+        print("✅ Registre de services OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur registre de services: {e}")
+        return False
+
+def test_single_flight_coalescing():
+    """Test que des générations identiques simultanées ne lancent qu'un appel"""
+    try:
+        print("🔀 Test de la coalescence des requêtes...")
+        
+        import threading
+        import time
+        from infrastructure.singleflight import SingleFlight
+        
+        class Metrics:
+            coalesced = 0
+            def record_coalesced_request(self):
+                Metrics.coalesced += 1
+        
+        flight = SingleFlight(metrics=Metrics())
+        calls = []
+        
+        def generate(handle, publish):
+            calls.append(threading.current_thread().name)
+            time.sleep(0.3)
+            return "SELECT COUNT(*) FROM users"
+        
+        results = []
+        def ask():
+            results.append(flight.do("question-key", generate, timeout=5))
+        
+        threads = [threading.Thread(target=ask) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        shared = sorted(coalesced for _, coalesced in results)
+        if len(calls) != 1 or {sql for sql, _ in results} != {"SELECT COUNT(*) FROM users"} \
+                or shared != [False] + [True] * 5 or Metrics.coalesced != 5:
+            print(f"❌ Coalescence: {len(calls)} appels, {results}")
+            return False
+        
+        # Appel terminé : la clé est libérée, une nouvelle demande relance la fonction
+        if flight.in_flight() != 0 or flight.do("question-key", generate)[1] or len(calls) != 2:
+            print("❌ Clé non libérée après l'appel")
+            return False
+        flight.close()
+        
+        print("✅ Coalescence des requêtes OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur coalescence des requêtes: {e}")
+        return False
+
+def test_sql_streaming():
+    """Test du SQL généré en flux : fragments successifs puis SQL final validé"""
+    try:
+        print("🌊 Test de la génération en flux...")
+        
+        from infrastructure.llm import LLMManager, create_fake_llm
+        from streamlit_app.services.sql_service import SQLService
+        
+        sql = "SELECT region, SUM(amount) FROM sales GROUP BY region;"
+        manager = LLMManager(llm=create_fake_llm(responses=[sql]))
+        chunks = list(manager.stream_sql("ventes par région"))
+        if len(chunks) < 2 or "".join(chunks) != sql:
+            print(f"❌ Flux incomplet: {chunks}")
+            return False
+        
+        # Le rappel reçoit le SQL partiel croissant ; la réponse finale est nettoyée et validée
+        partials = []
+        service = SQLService({"llm": LLMManager(llm=create_fake_llm(responses=[sql]))})
+        response = service.generate_sql_response("ventes par région", on_token=partials.append)
+        if len(partials) < 2 or any(not later.startswith(earlier) for earlier, later in zip(partials, partials[1:])):
+            print(f"❌ SQL partiel non croissant: {partials}")
+            return False
+        if not response.get("success") or response.get("validation_error") or "SUM(amount)" not in response["sql"]:
+            print(f"❌ Réponse finale incorrecte: {response}")
+            return False
+        
+        print("✅ Génération en flux OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur génération en flux: {e}")
+        return False
+
+def test_schema_retrieval():
+    """Test que seules les tables pertinentes sont envoyées au LLM"""
+    try:
+        print("🗂️ Test de la sélection des tables...")
+        
+        from infrastructure.schema_index import ColumnInfo, SchemaIndex, TableInfo
+        
+        # Entrepôt simulé : quelques tables métier noyées parmi des centaines
+        tables = [
+            TableInfo("orders", [ColumnInfo("id", "int"), ColumnInfo("customer_id", "int"),
+                                 ColumnInfo("amount", "numeric"), ColumnInfo("order_date", "date")],
+                      comment="Commandes clients"),
+            TableInfo("customers", [ColumnInfo("id", "int"), ColumnInfo("country", "varchar")],
+                      comment="Clients"),
+        ] + [
+            TableInfo(f"staging_log_{i}", [ColumnInfo("id", "int"), ColumnInfo(f"payload_{i}", "varchar")])
+            for i in range(300)
+        ]
+        index = SchemaIndex(tables)
+        found = [table.name for table, _ in index.search("montant des orders par country des customers", k=3)]
+        if found[:2] != ["orders", "customers"] and found[:2] != ["customers", "orders"]:
+            print(f"❌ Tables retenues: {found}")
+            return False
+        
+        prompt = index.render("amount des orders", k=2)
+        if "orders(" not in prompt or "staging_log" in prompt or len(prompt.splitlines()) > 2:
+            print(f"❌ Schéma du prompt: {prompt}")
+            return False
+        
+        # Table très large : colonnes citées et clés d'abord, le reste résumé
+        wide = TableInfo("events", [ColumnInfo("id", "int"), ColumnInfo("user_id", "int")] +
+                         [ColumnInfo(f"attr_{i}", "varchar") for i in range(50)] + [ColumnInfo("revenue", "numeric")])
+        columns = [column.name for column in SchemaIndex([wide]).select_columns(wide, "revenue par user", max_columns=3)]
+        rendered = SchemaIndex([wide]).render("revenue", k=1)
+        if set(columns) != {"id", "user_id", "revenue"} or "(+" not in rendered:
+            print(f"❌ Colonnes retenues: {columns}")
+            return False
+        
+        print("✅ Sélection des tables OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur sélection des tables: {e}")
+        return False
+
+def test_schema_snapshot():
+    """Test de l'instantané du schéma : rafraîchissement incrémental et source vérifiée"""
+    try:
+        print("📸 Test de l'instantané du schéma...")
+        
+        import os
+        import tempfile
+        from infrastructure.schema_index import ColumnInfo, TableInfo
+        from infrastructure.schema_snapshot import SchemaCatalog
+        from infrastructure.settings import settings
+        
+        class FakeCatalogDB:
+            """Catalogue Redshift simulé : empreintes par table"""
+            def __init__(self):
+                self.hashes = {"orders": "v1", "users": "v1", "legacy": "v1"}
+                self.inspected = []
+            def start_warmup(self):
+                return self
+            def wait_until_ready(self, timeout=None):
+                return True
+            def get_catalog_signatures(self):
+                return dict(self.hashes)
+            def get_schema_metadata(self, names=None):
+                names = list(names or self.hashes)
+                self.inspected.append(names)
+                return [TableInfo(name, [ColumnInfo("id", "int"), ColumnInfo(f"col_{self.hashes[name]}", "int")])
+                        for name in names]
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "schema.json")
+            db = FakeCatalogDB()
+            catalog = SchemaCatalog(path=path, db_manager=db)
+            
+            # Première introspection, même rafraîchissement périodique désactivé
+            catalog.start_background_refresh(0)
+            catalog._refresh_thread.join(5)
+            if sorted(t.name for t in catalog.tables) != ["legacy", "orders", "users"]:
+                print(f"❌ Introspection initiale: {[t.name for t in catalog.tables]}")
+                return False
+            
+            # Seules les tables modifiées sont ré-inspectées ; les tables supprimées disparaissent
+            db.hashes["orders"] = "v2"
+            del db.hashes["legacy"]
+            notified = []
+            catalog.add_listener(notified.append)
+            changed = catalog.refresh()
+            columns = {t.name: [c.name for c in t.columns] for t in catalog.tables}
+            if sorted(changed) != ["legacy", "orders"] or db.inspected[-1] != ["orders"] \
+                    or "col_v2" not in columns["orders"] or "legacy" in columns or notified != [changed]:
+                print(f"❌ Rafraîchissement incrémental: {changed} / {db.inspected}")
+                return False
+            if catalog.refresh() != []:
+                print("❌ Rafraîchissement sans changement")
+                return False
+            
+            # Instantané rechargé pour la même base, ignoré pour une autre
+            reloaded = SchemaCatalog(path=path, db_manager=db).load_snapshot()
+            if reloaded is None or reloaded.version != catalog.version:
+                print("❌ Instantané non rechargé")
+                return False
+            previous = settings.redshift_db
+            try:
+                settings.redshift_db = "other_db"
+                if SchemaCatalog(path=path, db_manager=db).load_snapshot() is not None:
+                    print("❌ Instantané d'une autre base accepté")
+                    return False
+            finally:
+                settings.redshift_db = previous
+        
+        print("✅ Instantané du schéma OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur instantané du schéma: {e}")
+        return False
+
+def test_database_warmup():
+    """Test du préchauffage de la connexion : états, attente bornée et échec immédiat"""
+    try:
+        print("🔌 Test du préchauffage de la base...")
+        
+        import threading
+        import time
+        from infrastructure.database import DatabaseManager
+        from infrastructure.settings import settings
+        
+        # Connexion lente puis réussie : l'état passe par "connecting" sans bloquer
+        release = threading.Event()
+        manager = DatabaseManager()
+        manager._connect = lambda: release.wait(5)
+        if manager.status()["state"] != "idle" or manager.is_ready:
+            print("❌ État initial")
+            return False
+        manager.start_warmup()
+        if manager.status()["state"] != "connecting":
+            print(f"❌ État pendant le préchauffage: {manager.status()}")
+            return False
+        
+        previous = settings.db_ready_wait
+        settings.db_ready_wait = 0.2
+        try:
+            start = time.perf_counter()
+            try:
+                manager.get_db()
+                print("❌ Requête servie avant la connexion")
+                return False
+            except ConnectionError:
+                pass
+            if time.perf_counter() - start > 1.0:
+                print("❌ Attente non bornée pendant le préchauffage")
+                return False
+            release.set()
+            if not manager.wait_until_ready(2) or manager.status()["state"] != "ready":
+                print(f"❌ Préchauffage non terminé: {manager.status()}")
+                return False
+            
+            # Échec : la requête échoue tout de suite avec l'erreur, une nouvelle tentative part en arrière-plan
+            attempts = []
+            failing = DatabaseManager()
+            def refuse():
+                attempts.append(time.perf_counter())
+                raise OSError("connection refused")
+            failing._connect = refuse
+            failing.start_warmup()
+            failing._settled.wait(2)
+            if failing.status() != {"state": "failed", "ready": False, "error": "connection refused",
+                                    "connect_time": None}:
+                print(f"❌ État après échec: {failing.status()}")
+                return False
+            start = time.perf_counter()
+            try:
+                failing.get_db()
+                print("❌ Connexion en échec acceptée")
+                return False
+            except ConnectionError as e:
+                if "connection refused" not in str(e) or time.perf_counter() - start > 0.5:
+                    print(f"❌ Échec non immédiat: {e}")
+                    return False
+            failing._settled.wait(2)
+            if len(attempts) != 2:
+                print(f"❌ Nouvelle tentative non relancée: {len(attempts)}")
+                return False
+        finally:
+            settings.db_ready_wait = previous
+        
+        print("✅ Préchauffage de la base OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur préchauffage de la base: {e}")
+        return False
+
+def test_query_pagination():
+    """Test de l'exécution par curseur serveur : pages, « charger plus » et transaction en lecture seule"""
+    try:
+        print("📄 Test de la pagination des résultats...")
+        
+        from infrastructure.query_executor import QueryExecutor
+        from infrastructure.query_guard import QueryGuard
+        
+        class FakeConnection:
+            """Connexion psycopg2 simulée : curseur nommé sur `total` lignes"""
+            def __init__(self, total):
+                self.total, self.statements, self.fetches, self.closed = total, [], [], False
+                self.position, self.description = 0, None
+            def cursor(self, name=None):
+                return FakeCursor(self, name)
+            def rollback(self):
+                pass
+            def close(self):
+                self.closed = True
+        
+        class FakeCursor:
+            def __init__(self, connection, name):
+                self.connection, self.name, self.itersize, self.description = connection, name, 0, None
+            def __enter__(self):
+                return self
+            def __exit__(self, *args):
+                pass
+            def execute(self, sql):
+                self.connection.statements.append(sql)
+            def fetchall(self):
+                return []  # EXPLAIN sans estimation
+            def fetchmany(self, size):
+                connection = self.connection
+                self.description = [("id",)]
+                rows = [(i,) for i in range(connection.position, min(connection.total, connection.position + size))]
+                connection.position += len(rows)
+                connection.fetches.append(size)
+                return rows
+            def close(self):
+                pass
+        
+        class FakeDatabase:
+            def __init__(self, total):
+                self.connections = []
+                self.total = total
+                self.engine = self
+            def get_db(self):
+                return None
+            def raw_connection(self):
+                self.connections.append(FakeConnection(self.total))
+                return self.connections[-1]
+        
+        database = FakeDatabase(25)
+        executor = QueryExecutor(database, guard=QueryGuard(max_rows=1000))
+        cursor = executor.execute("SELECT id FROM users", batch_size=10)
+        connection = database.connections[0]
+        if connection.statements[:2] != ["SET TRANSACTION READ ONLY", "SET LOCAL statement_timeout TO "
+                                         f"{int(executor.guard.statement_timeout * 1000)}"] \
+                or not connection.statements[-1].endswith("LIMIT 1000"):
+            print(f"❌ Préparation de la transaction: {connection.statements}")
+            return False
+        
+        # Première page seulement : rien d'autre n'est rapatrié
+        first = [row for batch in cursor.fetch(10) for row in batch]
+        if len(first) != 10 or not cursor.has_more or connection.position != 10:
+            print(f"❌ Première page: {len(first)} lignes, {connection.position} lues")
+            return False
+        
+        # « Charger plus » : le curseur est retrouvé par son identifiant
+        more = executor.get_cursor(cursor.id)
+        second = [row for batch in more.fetch(10) for row in batch]
+        last = [row for batch in more.fetch(10) for row in batch]
+        if [r[0] for r in first + second + last] != list(range(25)) or more.has_more:
+            print("❌ Pages suivantes incorrectes")
+            return False
+        # Résultat épuisé : connexion rendue au pool, curseur oublié
+        if not connection.closed or executor.get_cursor(cursor.id) is not None or executor.open_cursors():
+            print("❌ Curseur épuisé non libéré")
+            return False
+        
+        # Effets de bord refusés avant toute connexion
+        for sql in ("SELECT * INTO copy FROM users", "SELECT pg_terminate_backend(123)", "DELETE FROM users"):
+            try:
+                executor.execute(sql)
+                print(f"❌ Requête acceptée: {sql}")
+                return False
+            except ValueError:
+                pass
+        if len(database.connections) != 1:
+            print("❌ Connexion ouverte pour une requête refusée")
+            return False
+        
+        print("✅ Pagination des résultats OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur pagination des résultats: {e}")
+        return False
+
+def test_result_cache_invalidation():
+    """Test du cache de résultats : clé SQL canonique et invalidation par table"""
+    try:
+        print("🧹 Test de l'invalidation du cache de résultats...")
+        
+        from infrastructure.cache import CacheManager
+        from infrastructure.sql_analysis import extract_tables
+        
+        cache = CacheManager(max_entries=20, max_bytes=1_000_000)
+        joined = "SELECT o.id, u.name FROM analytics.orders o JOIN users u ON u.id = o.user_id"
+        cache.cache_sql_result(joined, {"rows": [[1, "a"]]})
+        cache.cache_sql_result("SELECT COUNT(*) FROM products", {"rows": [[3]]})
+        cache.cache_sql_result(
+            "WITH recent AS (SELECT * FROM orders WHERE day > '2024-01-01') SELECT COUNT(*) FROM recent",
+            {"rows": [[2]]}
+        )
+        
+        # Mise en forme, casse et commentaires ignorés ; littéraux conservés
+        variant = "select o.id,  u.name\n-- jointure\nFROM ANALYTICS.ORDERS o join USERS u on u.id = o.user_id;"
+        if cache.get_cached_sql_result(variant) != {"rows": [[1, "a"]]}:
+            print("❌ Variante de mise en forme non servie")
+            return False
+        if cache.get_cached_sql_result("SELECT COUNT(*) FROM products WHERE id = 2") is not None:
+            print("❌ Requête différente servie")
+            return False
+        if sorted(extract_tables(joined)) != ["orders", "users"]:
+            print(f"❌ Tables lues: {extract_tables(joined)}")
+            return False
+        
+        # Une modification de « orders » retire les deux résultats qui la lisent, pas les autres
+        removed = cache.invalidate_tables(["ORDERS"])
+        if removed != 2 or cache.get_cached_sql_result(joined) is not None \
+                or cache.get_cached_sql_result("SELECT COUNT(*) FROM products") is None:
+            print(f"❌ Invalidation par table: {removed}")
+            return False
+        if cache.invalidate_tables(["users"]) != 0 or cache.stats()["tagged_tables"] != 1:
+            print(f"❌ Étiquettes restantes: {cache.stats()['tagged_tables']}")
+            return False
+        cache.close()
+        
+        print("✅ Invalidation du cache de résultats OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur invalidation du cache de résultats: {e}")
+        return False
+
+def test_batch_generation():
+    """Test du mode lot : lecture JSONL/CSV, reprise et nouvelle tentative après quota"""
+    try:
+        print("📦 Test de la génération en lot...")
+        
+        import json
+        import os
+        import tempfile
+        from batch_generate import BatchGenerator, load_checkpoint, read_questions
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            jsonl = os.path.join(tmp, "questions.jsonl")
+            with open(jsonl, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"id": "a", "question": "Combien de clients ?"}) + "\n\n")
+                f.write(json.dumps("Ventes par mois") + "\n")
+                f.write(json.dumps({"id": "c", "question": "  "}) + "\n")
+            csv_path = os.path.join(tmp, "questions.csv")
+            with open(csv_path, "w", encoding="utf-8") as f:
+                f.write("id,question,language\nx,Top produits,en\n")
+            
+            items = list(read_questions(jsonl)) + list(read_questions(csv_path))
+            if [(item["id"], item["question"]) for item in items] != \
+                    [("a", "Combien de clients ?"), ("2", "Ventes par mois"), ("x", "Top produits")] \
+                    or items[2]["language"] != "en":
+                print(f"❌ Lecture des questions: {items}")
+                return False
+            
+            # Reprise : seules les réussites comptent, une ligne tronquée est ignorée
+            output = os.path.join(tmp, "results.jsonl")
+            with open(output, "w", encoding="utf-8") as f:
+                f.write(json.dumps({"id": "a", "success": True}) + "\n")
+                f.write(json.dumps({"id": "2", "success": False}) + "\n")
+                f.write('{"id": "x", "succ')
+            if load_checkpoint(output) != {"a"}:
+                print(f"❌ Point de reprise: {load_checkpoint(output)}")
+                return False
+        
+        class Service:
+            calls = 0
+            def generate_sql_response(self, question, language=None):
+                Service.calls += 1
+                if Service.calls == 1:
+                    return {"success": False, "error": "429 Resource exhausted"}
+                return {"success": True, "sql": "SELECT 1", "cached": False}
+        
+        class Limiter:
+            def __init__(self):
+                self.acquired, self.pauses = 0, []
+            def acquire(self):
+                self.acquired += 1
+            def pause(self, seconds):
+                self.pauses.append(seconds)
+        
+        # Quota dépassé : pause commune puis nouvelle tentative réussie
+        limiter = Limiter()
+        record = BatchGenerator(Service(), limiter, max_retries=3).process(items[0])
+        if not record["success"] or record["attempts"] != 2 or limiter.acquired != 2 or limiter.pauses != [1.0]:
+            print(f"❌ Nouvelle tentative: {record} / {limiter.pauses}")
+            return False
+        
+        print("✅ Génération en lot OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur génération en lot: {e}")
+        return False
+
+def test_openmetrics_export():
+    """Test de l'exposition OpenMetrics (compteurs, histogramme de latence, fichier)"""
+    try:
+        print("📈 Test de l'export OpenMetrics...")
+        
+        import os
+        import tempfile
+        from infrastructure.metrics_export import MetricsExporter, MetricsRegistry, counter
+        from infrastructure.monitoring import MetricsCollector
+        
+        collector = MetricsCollector()
+        collector.record_request(0.2)
+        collector.record_cache_hit()
+        for seconds in (0.003, 0.04, 0.04, 2.0):
+            collector.record_latency("llm", seconds)
+        
+        def broken():
+            raise RuntimeError("collecteur en panne")
+        
+        registry = MetricsRegistry()
+        registry.register("app", collector.openmetrics_families)
+        registry.register("broken", broken)  # Ignoré sans casser l'exposition
+        registry.register("extra", lambda: [counter("jobs", 'Jobs "lot"', 3, queue="a\nb")])
+        text = registry.render()
+        lines = text.splitlines()
+        
+        buckets = [line for line in lines if line.startswith('texttosql_stage_latency_seconds_bucket{stage="llm"')]
+        counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+        expected = [
+            "# TYPE texttosql_stage_latency_seconds histogram",
+            "# UNIT texttosql_stage_latency_seconds seconds",
+            "texttosql_requests_total 1",
+            "texttosql_cache_hits_total 1",
+            'texttosql_stage_latency_seconds_bucket{stage="llm",le="+Inf"} 4',
+            'texttosql_stage_latency_seconds_count{stage="llm"} 4',
+            '# HELP texttosql_jobs Jobs \\"lot\\"',
+            'texttosql_jobs_total{queue="a\\nb"} 3',
+        ]
+        missing = [line for line in expected if line not in lines]
+        if missing or not text.endswith("# EOF\n"):
+            print(f"❌ Lignes absentes de l'exposition: {missing}")
+            return False
+        # Seaux cumulés et croissants, borne +Inf en dernier
+        if counts != sorted(counts) or counts[0] != 1 or not buckets[-1].startswith(
+                'texttosql_stage_latency_seconds_bucket{stage="llm",le="+Inf"}'):
+            print(f"❌ Seaux de l'histogramme: {buckets}")
+            return False
+        total = next(line for line in lines if line.startswith('texttosql_stage_latency_seconds_sum{stage="llm"}'))
+        if abs(float(total.rsplit(" ", 1)[1]) - 2.083) > 1e-6:
+            print(f"❌ Somme de l'histogramme: {total}")
+            return False
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "metrics", "texttosql.prom")
+            MetricsExporter(registry, port=0, dump_path=path).dump()
+            with open(path, encoding="utf-8") as f:
+                dumped = f.read()
+            if "texttosql_requests_total 1" not in dumped or not dumped.endswith("# EOF\n") \
+                    or os.path.exists(f"{path}.tmp"):
+                print("❌ Fichier d'export incorrect")
+                return False
+        
+        print("✅ Export OpenMetrics OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur export OpenMetrics: {e}")
+        return False
+
+def test_system_sampler():
+    """Test de l'échantillonnage système : historique borné, fenêtre glissante, santé par tendance"""
+    try:
+        print("🖥️ Test de l'échantillonnage système...")
+        
+        import time
+        from infrastructure.monitoring import MetricsCollector
+        from infrastructure.system_sampler import SystemSample, SystemSampler
+        
+        # Intervalle nul : pas de thread, relevés à la demande uniquement
+        sampler = SystemSampler(interval=0, history_size=3)
+        if sampler.latest() is not None or sampler.openmetrics_families():
+            print("❌ Relevé présent avant le premier échantillon")
+            return False
+        for _ in range(5):
+            current = sampler.sample()
+        if len(sampler.history()) != 3 or sampler.latest() is not current or not 0 <= current.memory_percent <= 100:
+            print("❌ Historique non borné ou dernier relevé incorrect")
+            return False
+        names = {family.name for family in sampler.openmetrics_families()}
+        if not {"system_cpu_percent", "system_memory_percent", "system_sample_age_seconds"} <= names:
+            print(f"❌ Familles OpenMetrics: {names}")
+            return False
+        
+        # Fenêtre glissante : un relevé ancien est exclu, un pic isolé ne dégrade pas la santé
+        now = time.time()
+        sampler = SystemSampler(interval=0, history_size=10)
+        samples = [
+            SystemSample(now - 600, 99.0, 99.0, 10.0, 50.0, 100.0),
+            SystemSample(now - 20, 10.0, 40.0, 4000.0, 50.0, 100.0),
+            SystemSample(now - 10, 20.0, 45.0, 3800.0, 50.0, 100.0),
+            SystemSample(now, 95.0, 50.0, 3600.0, 50.0, 100.0),
+        ]
+        sampler._history.extend(samples)
+        sampler._latest = samples[-1]
+        trend = sampler.rolling(60)
+        if trend["samples"] != 3 or trend["cpu_max"] != 95.0 or abs(trend["cpu_avg"] - 125.0 / 3) > 1e-9 \
+                or trend["memory_trend"] != 10.0:
+            print(f"❌ Moyennes glissantes: {trend}")
+            return False
+        
+        health = MetricsCollector(sampler).health_check()
+        if health["status"] != "healthy" or health["checks"]["cpu"]["usage_percent"] != 95.0:
+            print(f"❌ Santé par tendance: {health}")
+            return False
+        
+        print("✅ Échantillonnage système OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur échantillonnage système: {e}")
+        return False
+
+def test_tracing():
+    """Test du traçage : spans imbriqués, propagation du contexte, statut d'erreur, export"""
+    try:
+        print("🧵 Test du traçage des requêtes...")
+        
+        import contextvars
+        import json
+        import os
+        import tempfile
+        import threading
+        import structlog
+        from infrastructure.tracing import JsonlSpanExporter, OTLPSpanExporter, Tracer, current_span
+        
+        class MemoryExporter:
+            def __init__(self):
+                self.spans = []
+            def export(self, spans):
+                self.spans.extend(spans)
+        
+        exporter = MemoryExporter()
+        tracer = Tracer(exporter=exporter, queue_size=100)
+        seen = {}
+        
+        def worker():
+            # Thread lancé avec une copie du contexte : reste dans la trace de la requête
+            with tracer.span("execution", rows=3) as span:
+                seen["thread"] = span
+        
+        with tracer.span("request", question="Combien ?") as root:
+            seen["logs"] = dict(structlog.contextvars.get_contextvars())
+            with tracer.span("llm") as child:
+                seen["current"] = current_span()
+            context = contextvars.copy_context()
+            thread = threading.Thread(target=context.run, args=(worker,))
+            thread.start()
+            thread.join()
+            try:
+                with tracer.span("validation"):
+                    raise ValueError("SQL invalide")
+            except ValueError:
+                pass
+        
+        if current_span() is not None or "trace_id" in structlog.contextvars.get_contextvars():
+            print("❌ Contexte non restauré après le span racine")
+            return False
+        if seen["logs"].get("trace_id") != root.trace_id or seen["logs"].get("span_id") != root.span_id:
+            print(f"❌ Identifiants absents des logs: {seen['logs']}")
+            return False
+        if seen["current"] is not child or child.parent_id != root.span_id or root.parent_id is not None:
+            print("❌ Imbrication des spans incorrecte")
+            return False
+        if seen["thread"].trace_id != root.trace_id or seen["thread"].parent_id != root.span_id:
+            print("❌ Contexte non propagé au thread")
+            return False
+        
+        tracer.close()
+        spans = {span.name: span for span in exporter.spans}
+        if set(spans) != {"request", "llm", "execution", "validation"}:
+            print(f"❌ Spans exportés: {sorted(spans)}")
+            return False
+        if spans["validation"].status != "error" or spans["validation"].error != "SQL invalide" \
+                or spans["request"].status != "ok" or spans["execution"].attributes != {"rows": 3}:
+            print("❌ Statut ou attributs des spans incorrects")
+            return False
+        if len({span.trace_id for span in exporter.spans}) != 1:
+            print("❌ Les spans de la requête n'ont pas la même trace")
+            return False
+        
+        payload = json.loads(OTLPSpanExporter("http://localhost:4318/v1/traces")._encode(
+            [spans["llm"], spans["validation"]]))
+        otlp = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        if otlp[0]["parentSpanId"] != root.span_id or otlp[1]["status"] != {"code": 2, "message": "SQL invalide"}:
+            print(f"❌ Encodage OTLP: {otlp}")
+            return False
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "traces", "spans.jsonl")
+            JsonlSpanExporter(path, max_bytes=0).export(exporter.spans)
+            with open(path, encoding="utf-8") as f:
+                lines = [json.loads(line) for line in f]
+            if len(lines) != 4 or any(line["trace_id"] != root.trace_id for line in lines):
+                print("❌ Export JSONL incorrect")
+                return False
+        
+        print("✅ Traçage des requêtes OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur traçage: {e}")
+        return False
+
+def test_async_logging():
+    """Test des logs asynchrones : échantillonnage par trace, file bornée, écriture par lots"""
+    try:
+        print("📝 Test des logs asynchrones...")
+        
+        import io
+        import logging
+        import queue
+        import structlog
+        from infrastructure.logging import AsyncQueueHandler, EventSampler, LogWriter
+        
+        sampler = EventSampler(0.5, ["Cache hit"])
+        kept = {"event": "Cache hit", "trace_id": "00000000" + "0" * 24}
+        sampler(None, "info", kept)
+        try:
+            sampler(None, "info", {"event": "Cache hit", "trace_id": "ffffffff" + "0" * 24})
+            print("❌ Événement fréquent non échantillonné")
+            return False
+        except structlog.DropEvent:
+            pass
+        # Avertissements et événements non listés : toujours conservés
+        sampler(None, "warning", {"event": "Cache hit", "trace_id": "ffffffff" + "0" * 24})
+        sampler(None, "info", {"event": "Query executed", "trace_id": "ffffffff" + "0" * 24})
+        
+        def record(level, message):
+            return logging.LogRecord("test", level, __file__, 0, message, None, None)
+        
+        # File pleine : les INFO sont abandonnés et comptés
+        handler = AsyncQueueHandler(queue.Queue(maxsize=2))
+        for index in range(3):
+            handler.handle(record(logging.INFO, f"info {index}"))
+        if handler.dropped != 1 or handler.queue.qsize() != 2:
+            print(f"❌ Abandon en file pleine: {handler.dropped}")
+            return False
+        
+        stream = io.StringIO()
+        writer = LogWriter(handler, logging.Formatter("%(levelname)s %(message)s"), stream, batch_size=10)
+        writer.start()
+        writer.stop()
+        lines = stream.getvalue().splitlines()
+        if lines != ["INFO info 0", "INFO info 1", "WARNING Log queue full, 1 events dropped"] or handler.dropped:
+            print(f"❌ Écriture du lot: {lines}")
+            return False
+        
+        # File pleine : un avertissement attend une place au lieu d'être perdu
+        handler = AsyncQueueHandler(queue.Queue(maxsize=1))
+        handler.handle(record(logging.INFO, "info"))
+        stream = io.StringIO()
+        writer = LogWriter(handler, logging.Formatter("%(levelname)s %(message)s"), stream, batch_size=10)
+        writer.start()
+        handler.handle(record(logging.WARNING, "alerte"))
+        writer.stop()
+        if "WARNING alerte" not in stream.getvalue().splitlines() or handler.dropped:
+            print(f"❌ Avertissement perdu: {stream.getvalue()!r}")
+            return False
+        
+        print("✅ Logs asynchrones OK")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur logs asynchrones: {e}")
+        return False
+
 def run_all_tests():
     """Lance tous les tests"""
     print("🧪 === TESTS CI/CD STREAMLIT CLOUD ===\n")
@@ -125,7 +1477,32 @@ def run_all_tests():
         test_requirements,
         test_streamlit_entry,
         test_imports,
-        test_configuration
+        test_configuration,
+        test_service_registry,
+        test_cache_bounds,
+        test_persistent_cache,
+        test_result_cache_invalidation,
+        test_question_normalization,
+        test_semantic_cache,
+        test_example_store,
+        test_async_llm,
+        test_sql_streaming,
+        test_single_flight_coalescing,
+        test_single_flight_cancellation,
+        test_query_limit,
+        test_query_pagination,
+        test_api_execute,
+        test_batch_generation,
+        test_columnar_result,
+        test_prompt_budget,
+        test_schema_retrieval,
+        test_schema_snapshot,
+        test_database_warmup,
+        test_latency_histogram,
+        test_openmetrics_export,
+        test_system_sampler,
+        test_tracing,
+        test_async_logging
     ]
     
     passed = 0